@@ -0,0 +1,167 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+from analysis.detectors.statistical_anomaly_detection import sample_rows
+
+# Neighbors per account (LOF's MinPts)
+KNN_DEFAULT_K = 20
+# Default reference set: accounts are scored against a random subsample of this many rows,
+# which bounds index size and query cost independently of the month's size
+KNN_REFERENCE_SIZE = 200_000
+# Rows per index query (bounds the n x (k + 1) distance / index temporaries)
+KNN_QUERY_CHUNK_ROWS = 65_536
+# Added to mean reachability distances (as scikit-learn's LOF), so duplicates do not divide by zero
+LRD_EPSILON = 1e-10
+
+
+def fit_knn_index(X: np.ndarray, feature_cols: list[str], k: int = KNN_DEFAULT_K,
+                  reference_size: int = KNN_REFERENCE_SIZE, random_state: int = 42,
+                  n_jobs: int = -1) -> dict:
+    """
+    Build the neighbor index of the local-density detector.
+
+    A KD-tree is built over a reference set (a random subsample of `reference_size` rows, or all
+    rows), and the reference points' own k-distance and local reachability density (lrd) are
+    precomputed, so scoring any row is a single k-NN query. Constant / all-NaN columns are
+    dropped and rows with a missing feature are left out of the reference.
+
+    Parameters:
+        X (np.ndarray): n x p standardized features (float32 or float64)
+        feature_cols (list[str]): Column names (for the dropped-column message)
+        k (int): Neighbors per point
+        reference_size (int): Reference subsample size (None: all rows)
+        random_state (int): Random seed for the subsample
+        n_jobs (int): Query threads while precomputing the reference densities
+
+    Returns:
+        dict: keep (column mask), tree, reference (positions in X), k_distance, lrd, k
+    """
+    with np.errstate(invalid="ignore"):
+        spread = np.fmax.reduce(X, axis=0, initial=-np.inf) - np.fmin.reduce(X, axis=0, initial=np.inf)
+    keep = spread > 0
+    if not keep.all():
+        print(f"[Info] k-NN: dropping zero-variance features: {[c for c, z in zip(feature_cols, keep) if not z]}")
+
+    complete = np.flatnonzero(~np.isnan(X[:, keep]).any(axis=1))
+    reference = complete[sample_rows(len(complete), reference_size, random_state=random_state)]
+    k = min(k, len(reference) - 1)
+    if k < 1:
+        raise ValueError(f"k-NN detector needs at least 2 complete rows, got {len(reference)}")
+
+    t0 = time.perf_counter()
+    index = {
+        "keep": keep,
+        "tree": KDTree(np.asarray(X[np.ix_(reference, keep)], dtype=np.float64)),
+        "reference": reference,
+        "k": k,
+    }
+    # Reference densities: each reference point against the others (itself excluded)
+    self_position = np.arange(len(reference))
+    distances, neighbors = query_neighbors(index, X[reference], self_position, n_jobs=n_jobs)
+    index["k_distance"] = distances[:, -1]
+    reach = np.maximum(distances, index["k_distance"][neighbors])
+    index["lrd"] = 1.0 / (reach.mean(axis=1) + LRD_EPSILON)
+    print(f"⏱️ k-NN index ({len(reference):,} reference rows, k={k}): {time.perf_counter() - t0:.2f}s")
+    return index
+
+
+def query_neighbors(index: dict, X: np.ndarray, self_position: np.ndarray = None,
+                    chunk_rows: int = KNN_QUERY_CHUNK_ROWS, n_jobs: int = -1) -> tuple[np.ndarray, np.ndarray]:
+    """
+    k nearest reference points of every row, in parallel batched queries.
+
+    `self_position` gives, per row, its own position in the reference set (-1 if it is not a
+    reference point); a row never counts itself as a neighbor. Rows with a missing feature get
+    NaN distances and neighbor 0.
+
+    Returns:
+        (distances, neighbors): n x k arrays, nearest first (neighbors index the reference set)
+    """
+    k = index["k"]
+    n = len(X)
+    distances = np.full((n, k), np.nan)
+    neighbors = np.zeros((n, k), dtype=np.int64)
+    self_position = np.full(n, -1) if self_position is None else self_position
+
+    def query_chunk(start):
+        block = np.asarray(X[start:start + chunk_rows][:, index["keep"]], dtype=np.float64)
+        valid = ~np.isnan(block).any(axis=1)
+        if not valid.any():
+            return
+        dist, ind = index["tree"].query(block[valid], k=k + 1)
+        # Drop the row itself where it was found, the (k+1)-th neighbor otherwise
+        drop = ind == self_position[start:start + chunk_rows][valid, None]
+        drop[~drop.any(axis=1), -1] = True
+        rows = start + np.flatnonzero(valid)
+        distances[rows] = dist[~drop].reshape(-1, k)
+        neighbors[rows] = ind[~drop].reshape(-1, k)
+
+    starts = range(0, n, chunk_rows)
+    workers = min(len(starts), (os.cpu_count() or 1) if n_jobs == -1 else n_jobs)
+    if workers <= 1:
+        for start in starts:
+            query_chunk(start)
+    else:
+        # KD-tree queries run without the GIL; threads share the tree instead of copying it
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(query_chunk, starts))
+    return distances, neighbors
+
+
+def score_knn(index: dict, X: np.ndarray, self_position: np.ndarray = None,
+              chunk_rows: int = KNN_QUERY_CHUNK_ROWS, n_jobs: int = -1) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Local-density anomaly scores of every row against a fitted index (see fit_knn_index).
+
+        knn_distance: distance to the k-th nearest reference point (higher -> more isolated)
+        lof_score:    local outlier factor, mean lrd of the neighbors / the row's own lrd
+                      (≈ 1 inside a cluster, > 1 for points sparser than their neighborhood)
+
+    Parameters:
+        self_position (np.ndarray): Per row, its position in the reference set or -1
+            (see reference_positions); needed when X contains the reference rows
+
+    Returns:
+        (knn_distance, lof_score): float64 arrays (NaN for rows with a missing feature)
+    """
+    t0 = time.perf_counter()
+    distances, neighbors = query_neighbors(index, X, self_position, chunk_rows=chunk_rows, n_jobs=n_jobs)
+    reach = np.maximum(distances, index["k_distance"][neighbors])
+    lrd = 1.0 / (reach.mean(axis=1) + LRD_EPSILON)
+    lof = index["lrd"][neighbors].mean(axis=1) / lrd
+    print(f"⏱️ k-NN / LOF scoring ({len(X):,} rows): {time.perf_counter() - t0:.2f}s")
+    return distances[:, -1], lof
+
+
+def reference_positions(index: dict, n_rows: int) -> np.ndarray:
+    """Per row of the matrix the index was fitted on: its position in the reference set, or -1."""
+    position = np.full(n_rows, -1, dtype=np.int64)
+    position[index["reference"]] = np.arange(len(index["reference"]))
+    return position
+
+
+def knn_index_to_arrays(index: dict) -> dict:
+    """Arrays that rebuild the index elsewhere (e.g. in a scoring bundle): reference points and densities."""
+    return {
+        "knn_keep": index["keep"],
+        "knn_points": np.asarray(index["tree"].data),
+        "knn_k_distance": index["k_distance"],
+        "knn_lrd": index["lrd"],
+        "knn_k": np.asarray(index["k"]),
+    }
+
+
+def knn_index_from_arrays(arrays: dict) -> dict:
+    """Index for scoring new rows (reference positions are not kept, so no self-exclusion)."""
+    return {
+        "keep": np.asarray(arrays["knn_keep"], dtype=bool),
+        "tree": KDTree(np.asarray(arrays["knn_points"], dtype=np.float64)),
+        "reference": None,
+        "k": int(arrays["knn_k"]),
+        "k_distance": np.asarray(arrays["knn_k_distance"]),
+        "lrd": np.asarray(arrays["knn_lrd"]),
+    }
@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+import warnings
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import sklearn
+
+METADATA_NAME = "metadata.json"
+MODEL_NAME = "model.joblib"
+# joblib compression level: ~3.5x smaller forests for a few seconds of save time
+MODEL_COMPRESS = 3
+
+
+def get_registry_dir(base_dir: str, chain: str, model_type: str = "iforest") -> str:
+    """
+    Registry of one model type:
+        data/output/models/<chain>/<model_type>/<model_id>/{model.joblib, metadata.json}
+    """
+    return os.path.join(base_dir, "data", "output", "models", chain, model_type)
+
+
+def fingerprint_training_data(X: np.ndarray, features: list[str]) -> str:
+    """
+    SHA-256 of the training matrix (values, shape, dtype) and its feature names.
+    """
+    X = np.ascontiguousarray(X)
+    h = hashlib.sha256()
+    h.update(json.dumps({"features": list(features), "shape": X.shape, "dtype": str(X.dtype)}).encode())
+    h.update(X.tobytes())
+    return h.hexdigest()
+
+
+def save_model(model, registry_dir: str, features: list[str], X: np.ndarray, year: int, month: int,
+               params: dict = None, extra: dict = None) -> str:
+    """
+    Save a fitted model with its metadata (feature list, training-data fingerprint, sklearn version).
+
+    The model ID is "<YYYY>_<MM>-<fingerprint prefix>", so refitting on identical data
+    overwrites the same entry instead of piling up copies.
+
+    Parameters:
+        model: Fitted estimator
+        registry_dir (str): See get_registry_dir
+        features (list[str]): Feature columns, in the order the model expects
+        X (np.ndarray): Training matrix (fingerprinted, not stored)
+        year, month (int): Training period
+        params (dict): Hyperparameters to record
+        extra (dict): Additional metadata (e.g. preprocessing parameters needed to score)
+
+    Returns:
+        str: Model ID
+    """
+    fingerprint = fingerprint_training_data(X, features)
+    model_id = f"{year:04d}_{month:02d}-{fingerprint[:12]}"
+    model_dir = os.path.join(registry_dir, model_id)
+    os.makedirs(model_dir, exist_ok=True)
+
+    metadata = {
+        "model_id": model_id,
+        "model_class": type(model).__name__,
+        "features": list(features),
+        "training_period": {"year": year, "month": month},
+        "n_train_rows": int(X.shape[0]),
+        "fingerprint": fingerprint,
+        "sklearn_version": sklearn.__version__,
+        "params": params or {},
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **(extra or {}),
+    }
+
+    # Model first, metadata last: an entry without metadata.json is incomplete and ignored
+    model_path = os.path.join(model_dir, MODEL_NAME)
+    joblib.dump(model, model_path + ".tmp", compress=MODEL_COMPRESS)
+    os.replace(model_path + ".tmp", model_path)
+    metadata_path = os.path.join(model_dir, METADATA_NAME)
+    with open(metadata_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(metadata_path + ".tmp", metadata_path)
+
+    print(f"💾 Saved model {model_id} ({metadata['n_train_rows']:,} training rows) to {model_dir}")
+    return model_id
+
+
+def list_models(registry_dir: str) -> list[dict]:
+    """
+    Metadata of all complete registry entries, oldest training period (then creation) first.
+    """
+    if not os.path.isdir(registry_dir):
+        return []
+    entries = []
+    for model_id in os.listdir(registry_dir):
+        metadata_path = os.path.join(registry_dir, model_id, METADATA_NAME)
+        if os.path.exists(metadata_path):
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                entries.append(json.load(f))
+    return sorted(entries, key=lambda m: (m["training_period"]["year"], m["training_period"]["month"], m["created_at"]))
+
+
+def load_model(registry_dir: str, model_id: str = None, year: int = None, month: int = None):
+    """
+    Load a model and its metadata.
+
+    Without `model_id`, picks the most recent model trained on a period up to (year, month)
+    — or the most recent one overall when no period is given.
+
+    Returns:
+        (model, metadata)
+    """
+    entries = list_models(registry_dir)
+    if model_id is not None:
+        entries = [m for m in entries if m["model_id"] == model_id]
+    elif year is not None and month is not None:
+        entries = [m for m in entries if (m["training_period"]["year"], m["training_period"]["month"]) <= (year, month)]
+    if not entries:
+        target = model_id or (f"trained up to {year}-{month:02d}" if year is not None else "any")
+        raise FileNotFoundError(f"No registered model ({target}) in {registry_dir} — run without --score-only first")
+
+    metadata = entries[-1]
+    if metadata["sklearn_version"] != sklearn.__version__:
+        warnings.warn(
+            f"Model {metadata['model_id']} was saved with scikit-learn {metadata['sklearn_version']}, "
+            f"loading with {sklearn.__version__}"
+        )
+    model = joblib.load(os.path.join(registry_dir, metadata["model_id"], MODEL_NAME))
+    print(f"📦 Loaded model {metadata['model_id']} (trained on "
+          f"{metadata['training_period']['year']}-{metadata['training_period']['month']:02d}, "
+          f"{metadata['n_train_rows']:,} rows)")
+    return model, metadata
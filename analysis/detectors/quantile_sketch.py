@@ -0,0 +1,144 @@
+import os
+import json
+
+import numpy as np
+
+# Compactor size parameter: normalized rank error is roughly 1.7 / k, so 0.99 thresholds stay
+# within ~0.1 percentile rank; a sketch holds about 3k values regardless of the stream length
+KLL_DEFAULT_K = 2000
+# Capacity decay per level below the top (standard KLL choice)
+KLL_DECAY = 2 / 3
+
+
+class KLLSketch:
+    """
+    Mergeable KLL quantile sketch (Karnin, Lang & Liberty, 2016) for one numeric column.
+
+    Values enter level 0; a full level is sorted and every other value (random offset) is
+    promoted to the next level with twice the weight. Level capacities shrink geometrically
+    below the top level, so the sketch stays O(k) for any stream length, and two sketches
+    merge by concatenating their levels and compacting again.
+
+    NaN values are ignored, as in pandas' quantile. Until the first compaction (n up to k)
+    the sketch is exact.
+
+    Attributes:
+        k (int): Size parameter (accuracy / memory trade-off)
+        n (int): Number of values seen
+        levels (list[np.ndarray]): Retained values per level (weight 2**level)
+    """
+
+    def __init__(self, k: int = KLL_DEFAULT_K, random_state: int = 42):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self._rng = np.random.default_rng(random_state)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * KLL_DECAY ** depth)))
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def _compress(self) -> None:
+        while sum(len(level) for level in self.levels) > self._max_size():
+            for h in range(len(self.levels)):
+                if len(self.levels[h]) < self._capacity(h):
+                    continue
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+
+                values = np.sort(self.levels[h])
+                # An odd value out stays on its level
+                keep = values[-1:] if len(values) % 2 else values[:0]
+                paired = values[:len(values) - len(keep)]
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                break
+
+    def update(self, values) -> "KLLSketch":
+        """Add a chunk of values (in place)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Fold another sketch in (in place)."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for h, values in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], values])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _sorted_weights(self) -> tuple[np.ndarray, np.ndarray]:
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h, dtype=np.int64) for h, level in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantile(self, q: float) -> float:
+        """
+        Approximate q-quantile: smallest retained value whose weighted rank reaches q (NaN if empty).
+        Before the first compaction the sketch holds every value, and the exact quantile is
+        returned with pandas' linear interpolation.
+        """
+        if self.n == 0:
+            return np.nan
+        if len(self.levels) == 1:
+            return float(np.quantile(self.levels[0], q))
+        values, cum_weight = self._sorted_weights()
+        target = q * cum_weight[-1]
+        return float(values[min(np.searchsorted(cum_weight, target), len(values) - 1)])
+
+    def rank(self, value: float) -> float:
+        """Approximate fraction of values ≤ value."""
+        if self.n == 0:
+            return np.nan
+        values, cum_weight = self._sorted_weights()
+        pos = np.searchsorted(values, value, side="right")
+        return float(cum_weight[pos - 1] / cum_weight[-1]) if pos else 0.0
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "n": int(self.n), "levels": [level.tolist() for level in self.levels]}
+
+    @classmethod
+    def from_dict(cls, state: dict, random_state: int = 42) -> "KLLSketch":
+        sketch = cls(k=state["k"], random_state=random_state)
+        sketch.n = int(state["n"])
+        sketch.levels = [np.asarray(level, dtype=np.float64) for level in state["levels"]]
+        return sketch
+
+
+def save_sketches(path: str, sketches: dict[str, KLLSketch]) -> None:
+    """Write per-column sketches as one JSON file (write-then-rename)."""
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({col: sketch.to_dict() for col, sketch in sketches.items()}, f)
+    os.replace(path + ".tmp", path)
+
+
+def load_sketches(path: str) -> dict[str, KLLSketch]:
+    with open(path, "r", encoding="utf-8") as f:
+        return {col: KLLSketch.from_dict(state) for col, state in json.load(f).items()}
+
+
+def merge_sketches(parts: list[dict[str, KLLSketch]]) -> dict[str, KLLSketch]:
+    """
+    Merge per-column sketches (e.g. one dict per month of a rolling window) into new sketches.
+    Columns missing from some parts are merged over the parts that have them.
+    """
+    merged = {}
+    for part in parts:
+        for col, sketch in part.items():
+            if col not in merged:
+                merged[col] = KLLSketch(k=sketch.k)
+            merged[col].merge(sketch)
+    return merged
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from analysis.detectors.quantile_sketch import KLLSketch, KLL_DEFAULT_K
 
 def compute_thresholds(df: pd.DataFrame, columns: list[str], ignore_zeros_columns: list[str] = None, quantile: float = 0.99) -> dict:
     """
@@ -27,234 +28,244 @@ def compute_thresholds(df: pd.DataFrame, columns: list[str], ignore_zeros_column
     return thresholds
 
 
-def apply_H1_rule(df: pd.DataFrame, thresholds: dict) -> pd.DataFrame:
+def update_threshold_sketches(df: pd.DataFrame, columns: list[str], ignore_zeros_columns: list[str] = None,
+                              sketches: dict = None, k: int = KLL_DEFAULT_K) -> dict:
     """
-    Apply H1 anomaly rule: 'Multi-source inflow aggregation account with limited outflow'
+    Feed one chunk of rows into per-column quantile sketches (the streaming counterpart of
+    compute_thresholds: same columns, same zero exclusion).
 
-    Criteria:
-        - in_degree ≥ top 1%          
-        - out_degree ≤ 3              
-        - |total_input_amount - total_output_amount| / total_input_amount ≤ 0.05
+    Parameters:
+        df (pd.DataFrame): A chunk of rows (or the whole frame).
+        columns (list[str]): Columns to sketch.
+        ignore_zeros_columns (list[str]): Columns whose zero values are left out.
+        sketches (dict): Sketches to update in place (default: new ones).
+        k (int): KLL size parameter for new sketches.
 
     Returns:
-        DataFrame with new cols of H1_flag and H1_description.
+        dict: Column name → KLLSketch.
     """
-    # Uses threshold on unique inbound degree
-    in_deg_threshold = thresholds["in_degree"]
-
-    # Safe computation of relative difference; NaN when total_input_amount == 0 yields no flag.
-    safe_ratio = np.where(
-        df["total_input_amount"] > 0,
-        np.abs(df["total_input_amount"] - df["total_output_amount"]) / df["total_input_amount"],
-        np.nan
-    )
-
-    # Apply rule logic
-    df["H1_flag"] = (
-        (df["in_degree"] >= in_deg_threshold) &
-        (df["out_degree"] <= 3) &
-        (safe_ratio <= 0.05)
-    ).astype(int)
-
-    # Attach explanation only if flagged
-    df["H1_description"] = df["H1_flag"].apply(
-        lambda x: (
-            "H1: Aggregates from many sources and forwards almost unchanged to few addresses. May indicate ransomware or scam fund routing."
-        ) if x == 1 else ""
-    )
-
-    return df
+    sketches = {} if sketches is None else sketches
+    ignore_zeros_columns = ignore_zeros_columns or []
 
+    for col in columns:
+        values = df[col].to_numpy(dtype=np.float64)
+        if col in ignore_zeros_columns:
+            values = values[values > 0]
+        sketches.setdefault(col, KLLSketch(k=k)).update(values)
 
-def apply_H2_rule(df: pd.DataFrame, thresholds: dict) -> pd.DataFrame:
-    """
-    Apply H2 anomaly rule: 'Multi-source inflow aggregation account with zero outflow'
+    return sketches
 
-    Criteria:
-        - in_degree ≥ top 1%
-        - out_degree == 0
 
-    Returns:
-        DataFrame with H2_flag and H2_description added.
+def thresholds_from_sketches(sketches: dict, quantile: float = 0.99) -> dict:
     """
-    in_deg_threshold = thresholds["in_degree"]
-
-    df["H2_flag"] = (
-        (df["in_degree"] >= in_deg_threshold) &
-        (df["out_degree"] == 0)
-    ).astype(int)
-
-    df["H2_description"] = df["H2_flag"].apply(
-        lambda x: (
-            "H2: Aggregates from many sources but shows no outgoing transfers. May indicate scam fund storage or ransomware holding address."
-        ) if x == 1 else ""
-    )
-
-    return df
+    Read the quantile thresholds off per-column sketches (e.g. merged over a rolling window).
+    """
+    return {col: sketch.quantile(quantile) for col, sketch in sketches.items()}
 
 
-def apply_H3_rule(df: pd.DataFrame, thresholds: dict) -> pd.DataFrame:
+def report_threshold_accuracy(df: pd.DataFrame, sketches: dict, ignore_zeros_columns: list[str] = None,
+                              quantile: float = 0.99) -> pd.DataFrame:
     """
-    Apply H3 anomaly rule: 'Single-inflow account with high-diversity outflow'
-
-    Criteria:
-        - in_degree == 1
-        - out_degree ≥ top 1%
+    Compare sketch thresholds with the exact quantiles of df (see compute_thresholds).
 
     Returns:
-        DataFrame with H3_flag and H3_description added.
+        pd.DataFrame per column: exact, sketch, relative error of the value, and rank error
+        (fraction of values ≤ the sketch threshold minus the target quantile)
     """
-    out_deg_threshold = thresholds["out_degree"]
-
-    df["H3_flag"] = (
-        (df["in_degree"] == 1) &
-        (df["out_degree"] >= out_deg_threshold)
-    ).astype(int)
-
-    df["H3_description"] = df["H3_flag"].apply(
-        lambda x: (
-            "H3: Receives funds from a single source and distributes to many addresses. May indicate laundering or scam profit distribution."
-        ) if x == 1 else ""
-    )
-
-    return df
-
-
-def apply_H4_rule(df: pd.DataFrame, thresholds: dict) -> pd.DataFrame:
+    exact = compute_thresholds(df, list(sketches), ignore_zeros_columns, quantile)
+    rows = []
+    for col, sketch in sketches.items():
+        series = df[col][df[col] > 0] if col in (ignore_zeros_columns or []) else df[col]
+        n = int(series.notna().sum())
+        approx = sketch.quantile(quantile)
+        rows.append({
+            "column": col,
+            "n": n,
+            "exact": exact[col],
+            "sketch": approx,
+            "rel_error": abs(approx - exact[col]) / abs(exact[col]) if exact[col] else abs(approx - exact[col]),
+            "rank_error": (series <= approx).sum() / n - quantile if n else np.nan,
+        })
+    report = pd.DataFrame(rows).set_index("column")
+
+    print(f"\n📏 Sketch threshold accuracy at q={quantile}:")
+    print(report)
+    return report
+
+
+# === Declarative rule spec
+# Each rule is flagged when every condition of "when" holds. A condition is
+# (operand, op, value) or {"any": [conditions]}; operands are feature columns or shared terms
+# (RULE_TERMS), and THRESHOLD stands for the operand's quantile threshold. "bit" is the
+# rule's position in the packed rule_flags column — never reuse a bit for a different rule.
+THRESHOLD = "threshold"
+
+RULE_TERMS = {
+    # |in - out| / in, NaN when total_input_amount == 0 (which yields no flag)
+    "retention_ratio": lambda df: (
+        np.abs(df["total_input_amount"] - df["total_output_amount"]) / df["total_input_amount"].where(df["total_input_amount"] > 0)
+    ),
+}
+
+RULE_SPECS = [
+    {
+        "id": "H1", "bit": 0, "name": "Single-point aggregation",
+        "when": [("in_degree", ">=", THRESHOLD), ("out_degree", "<=", 3), ("retention_ratio", "<=", 0.05)],
+        "description": "H1: Aggregates from many sources and forwards almost unchanged to few addresses. May indicate ransomware or scam fund routing.",
+    },
+    {
+        "id": "H2", "bit": 1, "name": "Aggregation with zero outflow",
+        "when": [("in_degree", ">=", THRESHOLD), ("out_degree", "==", 0)],
+        "description": "H2: Aggregates from many sources but shows no outgoing transfers. May indicate scam fund storage or ransomware holding address.",
+    },
+    {
+        "id": "H3", "bit": 2, "name": "Single-inflow with high outflow diversity",
+        "when": [("in_degree", "==", 1), ("out_degree", ">=", THRESHOLD)],
+        "description": "H3: Receives funds from a single source and distributes to many addresses. May indicate laundering or scam profit distribution.",
+    },
+    {
+        "id": "H4", "bit": 3, "name": "High inflow/outflow diversity with minimal retention",
+        "when": [("in_degree", ">=", THRESHOLD), ("out_degree", ">=", THRESHOLD), ("retention_ratio", "<=", 0.05)],
+        "description": "H4: Receives from many sources and distributes to many others with minimal balance retained. Possible mixer or laundering relay.",
+    },
+    {
+        "id": "H5", "bit": 4, "name": "Two-node cyclic transfer accounts",
+        "when": [
+            ("two_node_loop_count", ">=", 1),
+            {"any": [("two_node_loop_amount", ">=", THRESHOLD), ("two_node_loop_tx_count", ">=", THRESHOLD)]},
+        ],
+        "description": "H5: Participates in closed two-node loops with high value or frequent transfers. May indicate wash trading or self-laundering.",
+    },
+    {
+        "id": "H6", "bit": 5, "name": "Triangle cyclic transfer accounts",
+        "when": [
+            ("triangle_loop_count", ">=", 1),
+            {"any": [("triangle_loop_amount", ">=", THRESHOLD), ("triangle_loop_tx_count", ">=", THRESHOLD)]},
+        ],
+        "description": "H6: Participates in closed triangle-shaped loops with high value or frequent transfers. May indicate self-laundering or obfuscation.",
+    },
+]
+
+COMPARISONS = {
+    ">=": np.greater_equal, ">": np.greater,
+    "<=": np.less_equal, "<": np.less,
+    "==": np.equal, "!=": np.not_equal,
+}
+
+
+def compile_rules(specs: list[dict] = RULE_SPECS):
     """
-    Apply H4 anomaly rule: 'High-diversity inflow and outflow with minimal retention'
+    Compile a rule spec into a single vectorized evaluation.
 
-    Criteria:
-        - in_degree ≥ top 1%
-        - out_degree ≥ top 1%
-        - |total_input_amount - total_output_amount| / total_input_amount ≤ 0.05
+    Every distinct operand (column or shared term) and every distinct predicate
+    (operand, op, value) is evaluated once, however many rules use it (e.g. in_degree ≥ q99
+    serves H1, H2 and H4; retention_ratio serves H1 and H4).
 
     Returns:
-        DataFrame with H4_flag and H4_description added.
+        evaluate(df, thresholds, rows=None) -> (rule_flags, flags): packed bitmask per
+        evaluated row (smallest unsigned dtype holding all bits) and a dict rule ID → bool
+        array; `rows` restricts evaluation to those row positions of df (default: all rows)
     """
-    in_deg_threshold = thresholds["in_degree"]
-    out_deg_threshold = thresholds["out_degree"]
-
-    # Safe computation of relative difference
-    safe_ratio = np.where(
-        df["total_input_amount"] > 0,
-        np.abs(df["total_input_amount"] - df["total_output_amount"]) / df["total_input_amount"],
-        np.nan
-    )
-
-    # Apply rule logic
-    df["H4_flag"] = (
-        (df["in_degree"] >= in_deg_threshold) &
-        (df["out_degree"] >= out_deg_threshold) &
-        (safe_ratio <= 0.05)
-    ).astype(int)
-
-    # Attach explanation only if flagged
-    df["H4_description"] = df["H4_flag"].apply(
-        lambda x: (
-            "H4: Receives from many sources and distributes to many others with minimal balance retained. Possible mixer or laundering relay."
-        ) if x == 1 else ""
-    )
-
-    return df
-
-
-def apply_H5_rule(df: pd.DataFrame, thresholds: dict) -> pd.DataFrame:
+    def walk(conditions):
+        for cond in conditions:
+            if isinstance(cond, dict):
+                yield from walk(cond["any"])
+            else:
+                yield cond
+
+    predicates = []
+    for spec in specs:
+        for operand, op, value in walk(spec["when"]):
+            if op not in COMPARISONS:
+                raise ValueError(f"{spec['id']}: unknown comparison {op!r}")
+            if (operand, op, value) not in predicates:
+                predicates.append((operand, op, value))
+
+    bits = [spec["bit"] for spec in specs]
+    if len(set(bits)) != len(bits):
+        raise ValueError(f"Duplicate rule bits: {bits}")
+    mask_dtype = np.uint8 if max(bits) < 8 else np.uint16 if max(bits) < 16 else np.uint32
+
+    def evaluate(df: pd.DataFrame, thresholds: dict, rows: np.ndarray = None) -> tuple[np.ndarray, dict]:
+        operands = {}
+        for operand, _, _ in predicates:
+            if operand not in operands:
+                source = RULE_TERMS[operand](df) if operand in RULE_TERMS else df[operand]
+                operands[operand] = np.asarray(source, dtype=np.float64)
+                if rows is not None:
+                    operands[operand] = operands[operand][rows]
+
+        # Comparisons with NaN (missing values or thresholds) are False, as in pandas
+        with np.errstate(invalid="ignore"):
+            results = {
+                (operand, op, value): COMPARISONS[op](operands[operand], thresholds[operand] if value == THRESHOLD else value)
+                for operand, op, value in predicates
+            }
+
+        def holds(conditions, combine):
+            out = None
+            for cond in conditions:
+                r = holds(cond["any"], np.logical_or) if isinstance(cond, dict) else results[tuple(cond)]
+                out = r if out is None else combine(out, r)
+            return out
+
+        rule_flags = np.zeros(len(df) if rows is None else len(rows), dtype=mask_dtype)
+        flags = {}
+        for spec in specs:
+            flags[spec["id"]] = holds(spec["when"], np.logical_and)
+            rule_flags |= flags[spec["id"]].astype(mask_dtype) << mask_dtype(spec["bit"])
+        return rule_flags, flags
+
+    return evaluate
+
+
+def rule_catalog(specs: list[dict] = RULE_SPECS) -> list[dict]:
     """
-    Apply H5 anomaly rule: 'Two-node cyclic accounts with abnormal transfer volume or frequency'
-    Criteria:
-        - two_node_loop_count ≥ 1
-        - AND (
-            two_node_loop_amount ≥ top 1%
-            OR
-            two_node_loop_tx_count ≥ top 1%
-        )
-
-    Returns:
-        DataFrame with H5_flag and H5_description added.
+    Description lookup table of the rules (stored once with the results instead of per row).
     """
-    amount_threshold = thresholds["two_node_loop_amount"]
-    tx_count_threshold = thresholds["two_node_loop_tx_count"]
-
-    df["H5_flag"] = (
-        (df["two_node_loop_count"] >= 1) &
-        (
-            (df["two_node_loop_amount"] >= amount_threshold) |
-            (df["two_node_loop_tx_count"] >= tx_count_threshold)
-        )
-    ).astype(int)
-
-    df["H5_description"] = df["H5_flag"].apply(
-        lambda x: (
-            "H5: Participates in closed two-node loops with high value or frequent transfers. May indicate wash trading or self-laundering."
-        ) if x == 1 else ""
-    )
-
-    return df
+    return [{"id": spec["id"], "bit": spec["bit"], "name": spec["name"], "description": spec["description"]}
+            for spec in specs]
 
 
-def apply_H6_rule(df: pd.DataFrame, thresholds: dict) -> pd.DataFrame:
+def describe_rule_flags(rule_flags: int, catalog: list[dict] = None) -> list[dict]:
     """
-    Apply H6 anomaly rule: 'Triangle cyclic transfer accounts with abnormal transfer volume or frequency'
+    Triggered rules of one packed rule_flags value, as {"rule", "description"} items.
+    """
+    catalog = rule_catalog() if catalog is None else catalog
+    return [{"rule": r["id"], "description": r["description"]} for r in catalog if int(rule_flags) >> r["bit"] & 1]
 
-    Criteria:
-        - triangle_loop_count ≥ 1
-        - AND (
-            triangle_loop_amount ≥ top 1%
-            OR
-            triangle_loop_tx_count ≥ top 1%
-        )
 
-    Returns:
-        DataFrame with H6_flag and H6_description added.
+def apply_all_rules(df: pd.DataFrame, thresholds: dict, specs: list[dict] = RULE_SPECS,
+                    rows: np.ndarray = None) -> pd.DataFrame:
     """
-    amount_threshold = thresholds["triangle_loop_amount"]
-    tx_count_threshold = thresholds["triangle_loop_tx_count"]
-
-    df["H6_flag"] = (
-        (df["triangle_loop_count"] >= 1) &
-        (
-            (df["triangle_loop_amount"] >= amount_threshold) |
-            (df["triangle_loop_tx_count"] >= tx_count_threshold)
-        )
-    ).astype(int)
-
-    df["H6_description"] = df["H6_flag"].apply(
-        lambda x: (
-            "H6: Participates in closed triangle-shaped loops with high value or frequent transfers. May indicate self-laundering or obfuscation."
-        ) if x == 1 else ""
-    )
+    Evaluate all heuristic rules in one vectorized pass.
 
-    return df
+    Adds:
+        - rule_flags: packed bitmask (bit per rule, see RULE_SPECS)
+        - H*_flag: int8 0/1 per rule (used by scoring and SQL filters)
+    Descriptions are not stored per row; see rule_catalog / describe_rule_flags.
 
-def apply_all_rules(df: pd.DataFrame, thresholds: dict) -> pd.DataFrame:
-    total_nodes = len(df)
+    With `rows`, only those row positions are evaluated and the columns are still full-length:
+    the other rows get no rule bits and a missing (NaN, float64) H*_flag.
+    """
+    total_nodes = len(df) if rows is None else len(rows)
     print(f"📊 Total nodes: {total_nodes}\n")
 
-    print("🧠 Applying H1 rule (Single-point aggregation)...")
-    df = apply_H1_rule(df, thresholds)
-    print(f"➡️  H1 flagged accounts: {df['H1_flag'].sum()}")
-
-    print("🧠 Applying H2 rule (Aggregation with zero outflow)...")
-    df = apply_H2_rule(df, thresholds)
-    print(f"➡️  H2 flagged accounts: {df['H2_flag'].sum()}")
-
-    print("🧠 Applying H3 rule (Single-inflow with high outflow diversity)...")
-    df = apply_H3_rule(df, thresholds)
-    print(f"➡️  H3 flagged accounts: {df['H3_flag'].sum()}")
-
-    print("🧠 Applying H4 rule (High inflow/outflow diversity with minimal retention)...")
-    df = apply_H4_rule(df, thresholds)
-    print(f"➡️  H4 flagged accounts: {df['H4_flag'].sum()}")
-
-    print("🧠 Applying H5 rule (Two-node cyclic transfer accounts)...")
-    df = apply_H5_rule(df, thresholds)
-    print(f"➡️  H5 flagged accounts: {df['H5_flag'].sum()}")
-
-    print("🧠 Applying H6 rule (Triangle cyclic transfer accounts)...")
-    df = apply_H6_rule(df, thresholds)
-    print(f"➡️  H6 flagged accounts: {df['H6_flag'].sum()}")
+    rule_flags, flags = compile_rules(specs)(df, thresholds, rows)
+    if rows is None:
+        df["rule_flags"] = rule_flags
+    else:
+        column = np.zeros(len(df), dtype=rule_flags.dtype)
+        column[rows] = rule_flags
+        df["rule_flags"] = column
+    for spec in specs:
+        if rows is None:
+            df[f"{spec['id']}_flag"] = flags[spec["id"]].astype(np.int8)
+        else:
+            column = np.full(len(df), np.nan)
+            column[rows] = flags[spec["id"]]
+            df[f"{spec['id']}_flag"] = column
+        print(f"🧠 {spec['id']} rule ({spec['name']}) ➡️  flagged accounts: {int(flags[spec['id']].sum())}")
 
     print("✅ All heuristic rules applied.\n")
     return df
-
@@ -1,7 +1,21 @@
+import time
+
 import pandas as pd
 import numpy as np
-from scipy.spatial.distance import mahalanobis
-from scipy.linalg import inv
+from scipy.linalg import cholesky, solve_triangular, LinAlgError
+from sklearn.covariance import MinCovDet, LedoitWolf
+
+# Rows scored per block in the batched Mahalanobis computation (bounds temporary memory)
+MAHALANOBIS_CHUNK_ROWS = 1_000_000
+# Covariances whose condition number exceeds this are treated as singular
+MAX_COVARIANCE_CONDITION = 1e10
+# Shrinkage fallback: weight of the scaled identity target, (1 - a) * cov + a * tr(cov)/p * I
+SHRINKAGE_ALPHA = 0.01
+
+# Location / covariance estimators for the Mahalanobis detector
+COVARIANCE_ESTIMATORS = ("empirical", "mcd", "ledoit_wolf")
+# Default fitting subsample of the robust estimators (full-data MCD does not scale)
+ROBUST_SAMPLE_SIZE = 100_000
 
 def zscore(series: pd.Series) -> pd.Series:
     """
@@ -15,90 +29,299 @@ def zscore(series: pd.Series) -> pd.Series:
     return (series - mean) / std
 
 
-def preprocess_features(df: pd.DataFrame) -> pd.DataFrame:
+# Skewed count / amount columns transformed with log(x+1)
+BASE_LOG_FEATURES = [
+    'in_degree', 'out_degree',
+    'total_input_amount', 'total_output_amount',
+    'two_node_loop_count', 'triangle_loop_count'
+]
+
+# Transformed columns that get z-scored ("<col>_z")
+TRANSFORMED_FEATURES = [f'{col}_log' for col in BASE_LOG_FEATURES] + [
+    'log_degree_ratio',
+    'log_amount_ratio',
+    'egonet_density'
+]
+
+
+# Transformed feature → function of its source columns (`get[col]` on a DataFrame or a dict of arrays)
+FEATURE_TRANSFORMS = {
+    **{f'{col}_log': (lambda col: lambda get: np.log1p(get[col]))(col) for col in BASE_LOG_FEATURES},
+    'log_degree_ratio': lambda get: np.log((get['in_degree'] + 1) / (get['out_degree'] + 1)),
+    'log_amount_ratio': lambda get: np.log((get['total_input_amount'] + 1) / (get['total_output_amount'] + 1)),
+    'egonet_density': lambda get: get['egonet_density'],
+}
+
+# Feature-table columns the transforms read
+FEATURE_SOURCE_COLUMNS = BASE_LOG_FEATURES + ['egonet_density']
+
+
+def transform_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the log(x+1) and log-ratio columns of TRANSFORMED_FEATURES.
+    Row-wise only, so it can be applied chunk by chunk.
+    """
+    # === Steps 1–2: Log(x+1) and log-ratio features
+    for col in TRANSFORMED_FEATURES:
+        if col not in FEATURE_SOURCE_COLUMNS:
+            df[col] = FEATURE_TRANSFORMS[col](df)
+
+    return df
+
+
+def compute_zscore_params(df: pd.DataFrame) -> dict[str, list[float]]:
+    """
+    z-score parameters {column: [mean, std]} of the transformed features, as used by zscore.
+    Saved with fitted models so that score-only runs standardize like the training run.
+    """
+    return {col: [float(df[col].mean()), float(df[col].std())] for col in TRANSFORMED_FEATURES}
+
+
+def build_working_matrix(df: pd.DataFrame, rows: np.ndarray = None,
+                         zscore_params: dict = None) -> tuple[np.ndarray, dict]:
     """
-    Preprocess features:
-    - Apply log1p transform to skewed count/amount columns
-    - Create log-ratio features
-    - Apply z-score to all transformed columns
+    The z-scored transformed features ("<col>_z", in TRANSFORMED_FEATURES order) of the
+    selected rows as one float32 matrix, without adding any column to df.
+
+    Each feature is transformed and standardized in float64 one column at a time (same
+    values as zscore over transform_features), then stored as float32 — half the memory of float64 and
+    the dtype the Isolation Forest compares in.
 
-    Expected input columns (renamed):
-        - in_degree, out_degree            
-        - total_input_amount, total_output_amount
-        - two_node_loop_count, triangle_loop_count
-        - egonet_density          
+    Parameters:
+        df (pd.DataFrame): Feature table (missing counts / amounts already filled).
+        rows (np.ndarray): Row positions to use (default: all rows).
+        zscore_params (dict): Fixed {column: [mean, std]}; default: the rows' own mean / std.
 
     Returns:
-        DataFrame with added processed feature columns.
-    """
-    
-    # === Step 1: Log(x+1) transformed features
-    base_log_features = [
-        'in_degree', 'out_degree',
-        'total_input_amount', 'total_output_amount',
-        'two_node_loop_count', 'triangle_loop_count'
-    ]
-    for col in base_log_features:
-        df[f'{col}_log'] = np.log1p(df[col])
-    
-    # === Step 2: Log-ratio features
-    df['log_degree_ratio'] = np.log((df['in_degree'] + 1) / (df['out_degree'] + 1))
-    df['log_amount_ratio'] = np.log((df['total_input_amount'] + 1) / (df['total_output_amount'] + 1))
-
-    # === Step 3: Features to apply z-score
-    transformed_features = [f'{col}_log' for col in base_log_features] + [
-        'log_degree_ratio',
-        'log_amount_ratio',
-        'egonet_density'
+        (Z, zscore_params): n x p float32 matrix and the parameters used
+    """
+    source = {col: df[col].to_numpy(dtype=np.float64) for col in FEATURE_SOURCE_COLUMNS}
+    if rows is not None:
+        source = {col: values[rows] for col, values in source.items()}
+
+    n = len(next(iter(source.values())))
+    Z = np.empty((n, len(TRANSFORMED_FEATURES)), dtype=np.float32)
+    params = {}
+    for j, col in enumerate(TRANSFORMED_FEATURES):
+        values = pd.Series(FEATURE_TRANSFORMS[col](source))
+        mean, std = zscore_params[col] if zscore_params is not None else (values.mean(), values.std())
+        # Constant columns (std 0) get NaN z-scores, as with pandas
+        with np.errstate(invalid="ignore", divide="ignore"):
+            Z[:, j] = (values.to_numpy() - mean) / std
+        params[col] = [float(mean), float(std)]
+
+    return Z, params
+
+
+def factor_covariance(cov_matrix: np.ndarray, singular: str = "pinv") -> tuple[str, np.ndarray]:
+    """
+    Factor a covariance matrix for batched Mahalanobis distances.
+
+    Well-conditioned covariances use a Cholesky factor. Near-singular ones (e.g. collinear
+    log in/out features) fall back to a pseudo-inverse or to shrinkage, instead of an
+    explicit inverse that would be mostly rounding noise.
+
+    Parameters:
+        cov_matrix (np.ndarray): p x p covariance
+        singular (str): Fallback for near-singular covariances: "pinv" or "shrinkage"
+
+    Returns:
+        (method, factor):
+            - ("cholesky", L): cov = L Lᵀ, and d² = ||L⁻¹ (x - mean)||²
+            - ("pinv", W): W = Λ^(-1/2) Vᵀ over the non-null eigen-directions, and d² = ||W (x - mean)||²
+    """
+    eigvals = np.linalg.eigvalsh(cov_matrix)
+    well_conditioned = eigvals[0] > 0 and eigvals[-1] / eigvals[0] <= MAX_COVARIANCE_CONDITION
+
+    if not well_conditioned and singular == "shrinkage":
+        p = cov_matrix.shape[0]
+        cov_matrix = (1 - SHRINKAGE_ALPHA) * cov_matrix + SHRINKAGE_ALPHA * np.trace(cov_matrix) / p * np.eye(p)
+        print(f"[Info] Near-singular covariance: shrinking towards the identity (alpha={SHRINKAGE_ALPHA})")
+        well_conditioned = True
+
+    if well_conditioned:
+        try:
+            return "cholesky", cholesky(cov_matrix, lower=True)
+        except LinAlgError:
+            pass
+
+    # Pseudo-inverse: whiten along the eigen-directions that carry variance
+    eigvals, eigvecs = np.linalg.eigh(cov_matrix)
+    keep = eigvals > eigvals[-1] / MAX_COVARIANCE_CONDITION
+    print(f"[Info] Near-singular covariance: using the pseudo-inverse ({int(keep.sum())} of {len(eigvals)} directions)")
+    return "pinv", (eigvecs[:, keep] / np.sqrt(eigvals[keep])).T
+
+
+def mahalanobis_squared(data: np.ndarray, mean_vec: np.ndarray, method: str, factor: np.ndarray,
+                        chunk_rows: int = MAHALANOBIS_CHUNK_ROWS) -> np.ndarray:
+    """
+    Squared Mahalanobis distances of all rows, computed in vectorized blocks of `chunk_rows`.
+    """
+    d2 = np.empty(len(data), dtype=np.float64)
+    for start in range(0, len(data), chunk_rows):
+        centered = data[start:start + chunk_rows] - mean_vec
+        if method == "cholesky":
+            whitened = solve_triangular(factor, centered.T, lower=True, check_finite=False)
+            d2[start:start + chunk_rows] = np.einsum("ij,ij->j", whitened, whitened)
+        else:
+            whitened = centered @ factor.T
+            d2[start:start + chunk_rows] = np.einsum("ij,ij->i", whitened, whitened)
+    return d2
+
+
+def sample_rows(n_rows: int, sample_size: int, strata: np.ndarray = None, random_state: int = 42) -> np.ndarray:
+    """
+    Row positions of a random subsample, optionally stratified.
+
+    With `strata`, each stratum gets a share of the sample proportional to its size
+    (at least one row), so rare strata such as high-degree buckets stay represented.
+
+    Returns:
+        np.ndarray: sorted row positions (all rows if sample_size >= n_rows)
+    """
+    if sample_size is None or sample_size >= n_rows:
+        return np.arange(n_rows)
+
+    rng = np.random.default_rng(random_state)
+    if strata is None:
+        return np.sort(rng.choice(n_rows, size=sample_size, replace=False))
+
+    labels, inverse, counts = np.unique(strata, return_inverse=True, return_counts=True)
+    quota = np.minimum(counts, np.maximum(1, np.round(counts * sample_size / n_rows).astype(np.int64)))
+    picked = [
+        rng.choice(np.flatnonzero(inverse == i), size=quota[i], replace=False)
+        for i in range(len(labels))
     ]
-    for col in transformed_features:
-        df[f'{col}_z'] = zscore(df[col])
+    return np.sort(np.concatenate(picked))
 
-    return df
 
+def fit_location_covariance(sample: np.ndarray, estimator: str = "empirical",
+                            random_state: int = 42) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fit the mean vector and covariance the Mahalanobis distances are measured against.
+
+    Parameters:
+        sample (np.ndarray): n x p feature matrix to fit on
+        estimator (str): "empirical" (sample mean / np.cov), "mcd" (Minimum Covariance Determinant,
+            robust to the heavy tails being detected) or "ledoit_wolf" (shrinkage)
+        random_state (int): Random seed for MCD
 
-def compute_mahalanobis_distance(df: pd.DataFrame, feature_cols: list[str]) -> pd.DataFrame:
+    Returns:
+        (mean_vec, cov_matrix)
     """
-    Compute Mahalanobis distance for each row based on selected feature columns.
+    if estimator == "mcd":
+        model = MinCovDet(random_state=random_state).fit(sample)
+        return model.location_, model.covariance_
+    if estimator == "ledoit_wolf":
+        model = LedoitWolf().fit(sample)
+        return model.location_, model.covariance_
+    if estimator == "empirical":
+        return np.mean(sample, axis=0), np.atleast_2d(np.cov(sample, rowvar=False))
+    raise ValueError(f"Unknown covariance estimator: {estimator}. Available: {COVARIANCE_ESTIMATORS}")
+
+
+def mahalanobis_distances(data: np.ndarray, feature_cols: list[str], singular: str = "pinv",
+                          chunk_rows: int = MAHALANOBIS_CHUNK_ROWS, estimator: str = "empirical",
+                          sample_size: int = None, strata: np.ndarray = None, random_state: int = 42,
+                          index=None, return_model: bool = False):
+    """
+    Mahalanobis distance of every row of a feature matrix (float32 or float64; blocks are
+    promoted to float64 one at a time, so the matrix itself is never copied).
     Skip zero-variance (all-zero or constant) features.
 
+    Distances are computed in row blocks through a Cholesky solve (no explicit inverse);
+    near-singular covariances fall back to a pseudo-inverse or shrinkage (see factor_covariance).
+    The mean / covariance can come from a robust estimator fitted on a (stratified) subsample,
+    while every row is scored; fit and scoring times are reported separately.
+
     Parameters:
-        df (pd.DataFrame): Input DataFrame with standardized features.
-        feature_cols (list[str]): List of column names to be used in Mahalanobis computation.
+        data (np.ndarray): n x p matrix of standardized features.
+        feature_cols (list[str]): Column names of data (for the dropped-feature report).
+        singular (str): Fallback for near-singular covariances: "pinv" or "shrinkage".
+        chunk_rows (int): Rows per block.
+        estimator (str): "empirical", "mcd" or "ledoit_wolf" (see fit_location_covariance).
+        sample_size (int): Rows used to fit the mean / covariance (None: estimator default).
+        strata (np.ndarray): Optional stratum label per row for stratified fitting.
+        random_state (int): Random seed for subsampling / MCD.
+        index: Row labels of the top-10 summary.
+        return_model (bool): Also return the fitted model.
 
     Returns:
-        pd.DataFrame: The original DataFrame with an added 'mahalanobis_distance' column.
+        np.ndarray: float64 distances, or (distances, model) with `return_model`, where
+        model = {"keep", "mean", "method", "factor"} scores new rows (see score_mahalanobis)
     """
-    X = df[feature_cols].copy()
+    # Identify and drop zero-variance (all-zero or constant) features; all-NaN columns
+    # (z-scores of a constant column) count as constant too
+    with np.errstate(invalid="ignore"):
+        spread = np.fmax.reduce(data, axis=0, initial=-np.inf) - np.fmin.reduce(data, axis=0, initial=np.inf)
+    constant = ~(spread > 0)
+    if constant.any():
+        print(f"[Info] Dropping zero-variance features: {[c for c, z in zip(feature_cols, constant) if z]}")
+        data = data[:, ~constant]
 
-    # Identify and drop zero-variance (all-zero or constant) features
-    zero_var_cols = [c for c in X.columns if X[c].nunique(dropna=True) <= 1]
-    if zero_var_cols:
-        print(f"[Info] Dropping zero-variance features: {zero_var_cols}")
-        X = X.drop(columns=zero_var_cols)
-    
-    if X.shape[1] == 0:
+    if data.shape[1] == 0:
         # If all features have zero variance, nothing can be computed
-        df["mahalanobis_distance"] = 0.0
-        return df
-
-    # Extract data matrix
-    data = X.values
+        model = {"keep": ~constant, "mean": None, "method": None, "factor": None}
+        return (np.zeros(len(data)), model) if return_model else np.zeros(len(data))
 
     # Mean and covariance of the selected features.
-    mean_vec = np.mean(data, axis=0)
-    cov_matrix = np.cov(data, rowvar=False)
-    inv_cov = inv(cov_matrix)
+    # Robust estimators fit on a subsample by default; scoring always covers every row
+    if sample_size is None and estimator != "empirical":
+        sample_size = ROBUST_SAMPLE_SIZE
+    rows = sample_rows(len(data), sample_size, strata, random_state)
+    sample = data if len(rows) == len(data) else data[rows]
+
+    t0 = time.perf_counter()
+    mean_vec, cov_matrix = fit_location_covariance(sample, estimator, random_state)
+    method, factor = factor_covariance(cov_matrix, singular=singular)
+    t1 = time.perf_counter()
 
-    # Compute Mahalanobis distance for each row relative to the mean.
-    dists = [mahalanobis(row, mean_vec, inv_cov) for row in data]
-    df["mahalanobis_distance"] = dists
+    # Compute Mahalanobis distance for each row relative to the mean, block by block.
+    distances = np.sqrt(mahalanobis_squared(data, mean_vec, method, factor, chunk_rows))
+    t2 = time.perf_counter()
+
+    sampling = ", stratified" if strata is not None and len(rows) < len(data) else ""
+    print(f"⏱️ Covariance fit ({estimator}, {len(rows):,} rows{sampling}): {t1 - t0:.2f}s")
+    print(f"⏱️ Mahalanobis scoring ({len(data):,} rows): {t2 - t1:.2f}s")
 
     # === Summary of Mahalanobis
+    summary = pd.Series(distances, index=index, name="mahalanobis_distance")
     print("\n📐 Mahalanobis Distance Summary:")
-    print(df["mahalanobis_distance"].describe())
+    print(summary.describe())
 
     print("\n🚨 Top 10 accounts by Mahalanobis distance:")
-    print(df[["mahalanobis_distance"]].sort_values(by="mahalanobis_distance", ascending=False).head(10))
+    print(summary.nlargest(10).to_frame())
+
+    if return_model:
+        return distances, {"keep": ~constant, "mean": mean_vec, "method": method, "factor": factor}
+    return distances
+
+
+def score_mahalanobis(data: np.ndarray, model: dict, chunk_rows: int = MAHALANOBIS_CHUNK_ROWS) -> np.ndarray:
+    """
+    Mahalanobis distances of new rows against a fitted model (see mahalanobis_distances).
+    """
+    if model["mean"] is None:
+        return np.zeros(len(data))
+    data = data[:, model["keep"]] if not model["keep"].all() else data
+    return np.sqrt(mahalanobis_squared(data, model["mean"], model["method"], model["factor"], chunk_rows))
+
+
+def mahalanobis_model_to_dict(model: dict) -> dict:
+    """JSON-serializable form of a fitted Mahalanobis model (e.g. for model registry metadata)."""
+    return {
+        "keep": [bool(k) for k in model["keep"]],
+        "mean": None if model["mean"] is None else np.asarray(model["mean"]).tolist(),
+        "method": model["method"],
+        "factor": None if model["factor"] is None else np.asarray(model["factor"]).tolist(),
+    }
+
+
+def mahalanobis_model_from_dict(state: dict) -> dict:
+    return {
+        "keep": np.asarray(state["keep"], dtype=bool),
+        "mean": None if state["mean"] is None else np.asarray(state["mean"], dtype=np.float64),
+        "method": state["method"],
+        "factor": None if state["factor"] is None else np.asarray(state["factor"], dtype=np.float64),
+    }
 
-    return df
\ No newline at end of file
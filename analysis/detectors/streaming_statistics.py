@@ -0,0 +1,162 @@
+import os
+import json
+
+import numpy as np
+
+
+class MomentAccumulator:
+    """
+    Mergeable mean / variance / covariance of p feature columns.
+
+    Chunks are reduced on their own (mean and centered second moments) and folded in with the
+    parallel update of Chan et al., the chunked form of Welford's algorithm, so accumulators
+    built per chunk, per partition or per month combine exactly — no raw values are kept.
+
+    Two sets of statistics are tracked:
+      - per column, over that column's non-NaN values: count, mean, M2 = Σ (x - mean)²
+        (what pandas' NaN-skipping mean / std use)
+      - jointly, over complete rows (no NaN in any column): count, mean vector and
+        co-moment matrix C = Σ (x - mean)(x - mean)ᵀ
+
+    Attributes:
+        columns (list[str]): Feature names, in column order
+        col_count / col_mean / col_m2 (np.ndarray): Per-column statistics
+        count (int), mean (np.ndarray), comoment (np.ndarray): Complete-row statistics
+    """
+
+    def __init__(self, columns: list[str]):
+        p = len(columns)
+        self.columns = list(columns)
+        self.col_count = np.zeros(p, dtype=np.int64)
+        self.col_mean = np.zeros(p)
+        self.col_m2 = np.zeros(p)
+        self.count = 0
+        self.mean = np.zeros(p)
+        self.comoment = np.zeros((p, p))
+
+    @classmethod
+    def from_array(cls, columns: list[str], data: np.ndarray) -> "MomentAccumulator":
+        """
+        Statistics of one chunk (n x p float array, NaN = missing).
+        """
+        acc = cls(columns)
+        data = np.asarray(data, dtype=np.float64)
+        if len(data) == 0:
+            return acc
+
+        missing = np.isnan(data)
+        acc.col_count = (~missing).sum(axis=0).astype(np.int64)
+        with np.errstate(invalid="ignore"):
+            acc.col_mean = np.where(acc.col_count > 0, np.nansum(data, axis=0) / np.maximum(acc.col_count, 1), 0.0)
+        acc.col_m2 = np.nansum((data - acc.col_mean) ** 2, axis=0)
+
+        complete = data[~missing.any(axis=1)]
+        acc.count = len(complete)
+        if acc.count:
+            acc.mean = complete.mean(axis=0)
+            centered = complete - acc.mean
+            acc.comoment = centered.T @ centered
+        return acc
+
+    def update(self, data: np.ndarray) -> "MomentAccumulator":
+        """Fold a chunk of rows in (in place)."""
+        return self.merge(MomentAccumulator.from_array(self.columns, data))
+
+    def merge(self, other: "MomentAccumulator") -> "MomentAccumulator":
+        """
+        Fold another accumulator over the same columns in (in place).
+
+        Chan et al.: for parts a, b with n = n_a + n_b and δ = mean_b - mean_a,
+            mean = mean_a + δ · n_b / n
+            M2   = M2_a + M2_b + δ² · n_a · n_b / n      (C likewise with δ δᵀ)
+        """
+        if other.columns != self.columns:
+            raise ValueError(f"Cannot merge moments over different columns: {self.columns} vs {other.columns}")
+
+        # === Per-column moments
+        n = self.col_count + other.col_count
+        delta = other.col_mean - self.col_mean
+        safe_n = np.maximum(n, 1)
+        self.col_mean = self.col_mean + delta * other.col_count / safe_n
+        self.col_m2 = self.col_m2 + other.col_m2 + delta ** 2 * self.col_count * other.col_count / safe_n
+        self.col_count = n
+
+        # === Complete-row moments
+        n = self.count + other.count
+        if other.count:
+            delta = other.mean - self.mean
+            self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * self.count * other.count / n
+            self.mean = self.mean + delta * other.count / n
+        self.count = n
+        return self
+
+    def column_std(self) -> np.ndarray:
+        """Per-column sample standard deviation (ddof=1, NaN below two values), as pandas' std."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.col_count > 1, np.sqrt(self.col_m2 / (self.col_count - 1)), np.nan)
+
+    def covariance(self) -> np.ndarray:
+        """Sample covariance over complete rows (ddof=1), as np.cov."""
+        if self.count < 2:
+            return np.full_like(self.comoment, np.nan)
+        return self.comoment / (self.count - 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "columns": self.columns,
+            "col_count": self.col_count.tolist(),
+            "col_mean": self.col_mean.tolist(),
+            "col_m2": self.col_m2.tolist(),
+            "count": int(self.count),
+            "mean": self.mean.tolist(),
+            "comoment": self.comoment.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "MomentAccumulator":
+        acc = cls(state["columns"])
+        acc.col_count = np.asarray(state["col_count"], dtype=np.int64)
+        acc.col_mean = np.asarray(state["col_mean"], dtype=np.float64)
+        acc.col_m2 = np.asarray(state["col_m2"], dtype=np.float64)
+        acc.count = int(state["count"])
+        acc.mean = np.asarray(state["mean"], dtype=np.float64)
+        acc.comoment = np.asarray(state["comoment"], dtype=np.float64).reshape(len(acc.columns), len(acc.columns))
+        return acc
+
+    def save(self, path: str) -> None:
+        # JSON floats are written with repr, so a save / load round trip is exact
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "MomentAccumulator":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def merge_moments(parts: list[MomentAccumulator]) -> MomentAccumulator:
+    """Combine accumulators (e.g. one per month of a rolling window) into a new one."""
+    if not parts:
+        raise ValueError("No moments to merge")
+    merged = MomentAccumulator(parts[0].columns)
+    for part in parts:
+        merged.merge(part)
+    return merged
+
+
+def zscore_covariance(moments: MomentAccumulator) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    z-score parameters and the mean / covariance of the z-scored features, derived from the
+    moments of the features before z-scoring (z = (x - mean) / std is affine, so the z-space
+    statistics need no extra pass over the data).
+
+    Returns:
+        (col_mean, col_std, z_mean, z_cov): z_mean / z_cov are over complete rows
+    """
+    std = moments.column_std()
+    # Zero-variance columns get NaN z-statistics (left for the caller to drop)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z_mean = (moments.mean - moments.col_mean) / std
+        z_cov = moments.covariance() / np.outer(std, std)
+    return moments.col_mean, std, z_mean, z_cov
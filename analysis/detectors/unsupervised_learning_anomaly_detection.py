@@ -1,34 +1,33 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-import pandas as pd
 from sklearn.ensemble import IsolationForest
 
-def fit_iforest_and_score(
-    df: pd.DataFrame,
-    features: list[str],
-    max_samples: int | float = 100_000,   # Number of subsamples for training
+# Rows per Isolation Forest scoring call: bounds the per-call temporaries (tree depths per
+# row x tree) and gives the worker pool independent pieces of work
+IFOREST_CHUNK_ROWS = 262_144
+
+def fit_iforest(
+    X: np.ndarray,
+    max_samples: int | float = 100_000,
     n_estimators: int = 300,
     random_state: int = 42,
     n_jobs: int = -1
-) -> pd.DataFrame:
+) -> IsolationForest:
     """
-    Apply Isolation Forest to compute anomaly scores.
+    Fit an Isolation Forest on a feature matrix.
 
     Parameters:
-        df (pd.DataFrame): Input DataFrame.
-        features (list[str]): List of feature column names to use for training.
+        X (np.ndarray): n x p training matrix.
         max_samples (int | float): Subsample size for training.
         n_estimators (int): Number of trees in the forest.
         random_state (int): Random seed for reproducibility.
         n_jobs (int): Number of parallel jobs (-1 to use all cores).
 
     Returns:
-        pd.DataFrame: A copy of the input DataFrame with an additional column:
-            - iforest_score: Continuous anomaly score (higher -> more anomalous).
+        IsolationForest: Fitted model (score it with score_iforest).
     """
-    work = df.copy()
-    X = work[features].to_numpy() 
-
-    # --- Fit model ---
     print("🚀 Training Isolation Forest...")
     iforest = IsolationForest(
         n_estimators=n_estimators,
@@ -37,11 +36,42 @@ def fit_iforest_and_score(
         n_jobs=n_jobs,
         random_state=random_state
     )
-    iforest.fit(X)
-    print("✅ Training done. Scoring...")
-
-    # sklearn: decision_function higher = more normal
-    work["iforest_score"] = -iforest.decision_function(X)
-    print("✅ Scoring done.")
-    
-    return work
\ No newline at end of file
+    return iforest.fit(X)
+
+def score_iforest(iforest: IsolationForest, X: np.ndarray, chunk_rows: int = IFOREST_CHUNK_ROWS,
+                  n_jobs: int = -1, out: np.ndarray = None) -> np.ndarray:
+    """
+    Anomaly scores of a fitted (or loaded) Isolation Forest: higher -> more anomalous.
+
+    Rows are scored in chunks of `chunk_rows` by a thread pool (the tree traversal runs
+    outside the GIL, and threads share the model instead of copying it), each chunk writing
+    its slice of a preallocated output array. Input is cast to float32 once — the dtype the
+    trees compare in — so scores equal a single decision_function call on the full matrix.
+
+    Parameters:
+        iforest (IsolationForest): Fitted model.
+        X (np.ndarray): n x p feature matrix.
+        chunk_rows (int): Rows per scoring call.
+        n_jobs (int): Worker threads (-1 to use all cores).
+        out (np.ndarray): Optional preallocated float64 array of length n to fill.
+
+    Returns:
+        np.ndarray: Scores (out, if given).
+    """
+    X = np.asarray(X, dtype=np.float32)
+    n = len(X)
+    out = np.empty(n, dtype=np.float64) if out is None else out
+
+    def score_chunk(start):
+        # sklearn: decision_function higher = more normal
+        out[start:start + chunk_rows] = -iforest.decision_function(X[start:start + chunk_rows])
+
+    starts = range(0, n, chunk_rows)
+    workers = min(len(starts), (os.cpu_count() or 1) if n_jobs == -1 else n_jobs)
+    if workers <= 1:
+        for start in starts:
+            score_chunk(start)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(score_chunk, starts))
+    return out
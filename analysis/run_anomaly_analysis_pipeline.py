@@ -1,17 +1,102 @@
 import os
+import json
 import argparse
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-from analysis.detectors.rule_based_anomaly_detection import compute_thresholds, apply_all_rules
-from analysis.detectors.statistical_anomaly_detection import preprocess_features, compute_mahalanobis_distance
-from analysis.detectors.unsupervised_learning_anomaly_detection import fit_iforest_and_score  
-from analysis.scoring.scoring import score_rule_based, score_statistical_percentile,score_iforest_percentile, combine_scores
+from analysis.detectors.rule_based_anomaly_detection import (
+    compute_thresholds, apply_all_rules, update_threshold_sketches, thresholds_from_sketches, report_threshold_accuracy,
+    rule_catalog
+)
+from analysis.detectors.quantile_sketch import save_sketches, load_sketches, merge_sketches
+from analysis.detectors.statistical_anomaly_detection import (
+    build_working_matrix, mahalanobis_distances, score_mahalanobis, mahalanobis_model_from_dict,
+    TRANSFORMED_FEATURES, COVARIANCE_ESTIMATORS
+)
+from analysis.detectors.unsupervised_learning_anomaly_detection import fit_iforest, score_iforest
+from analysis.detectors.local_density_anomaly_detection import (
+    fit_knn_index, score_knn, reference_positions, KNN_DEFAULT_K, KNN_REFERENCE_SIZE
+)
+from analysis.detectors.model_registry import get_registry_dir, save_model, load_model
+from analysis.scoring.scoring import (
+    score_rule_based, score_statistical_percentile, score_iforest_percentile, score_lof_percentile, combine_scores,
+    expand_rows, score_columns, RULE_FLAG_COLUMNS, SCORE_COMPONENTS, KNN_SCORE_COMPONENT
+)
+from analysis.scoring.scoring_bundle import ScoringBundle, get_bundle_path
+from analysis.scoring.serving_table import (
+    build_serving_table, write_serving_table, get_serving_path, build_top_table, write_top_table, get_top_path
+)
+
+# Feature-table columns used by the detectors or carried into the result table
+FEATURE_COLUMNS = [
+    "node", "address", "is_infra", "chain_id", "year", "month",
+    "in_degree", "out_degree", "in_transfer_count", "out_transfer_count",
+    "total_input_amount", "total_output_amount", "balance_proxy",
+    "self_loop_count", "two_node_loop_count", "two_node_loop_amount", "two_node_loop_tx_count",
+    "triangle_loop_count", "triangle_loop_amount", "triangle_loop_tx_count",
+    "egonet_node_count", "egonet_edge_count", "egonet_density",
+]
+
+# Count / amount columns whose missing values mean "none" for non-infra accounts
+FILL_ZERO_COLUMNS = [
+    "total_input_amount", "total_output_amount",
+    "in_degree", "out_degree",
+    "two_node_loop_amount", "two_node_loop_tx_count",
+    "triangle_loop_amount", "triangle_loop_tx_count"
+]
+
+# Rule thresholds: 0.99 quantile per column, zeros excluded for heavy-tailed amount/count metrics
+THRESHOLD_COLUMNS = [
+    "in_degree", "out_degree",
+    "two_node_loop_amount", "two_node_loop_tx_count",
+    "triangle_loop_amount", "triangle_loop_tx_count"
+]
+IGNORE_ZERO_THRESHOLD_COLUMNS = [
+    "two_node_loop_amount", "two_node_loop_tx_count",
+    "triangle_loop_amount", "triangle_loop_tx_count"
+]
+
+# Model inputs: z-scored transformed features (columns of the working matrix)
+STATISTICAL_FEATURES = [f"{col}_z" for col in TRANSFORMED_FEATURES]
+
+# Isolation Forest hyperparameters
+IFOREST_PARAMS = {"max_samples": 100_000, "n_estimators": 300, "random_state": 42}
 
 def get_input_path(base_dir, chain, year, month):
-    return os.path.join(
+    """
+    Path of the monthly feature table: the typed Parquet file, or the legacy CSV if only that exists.
+    """
+    path = os.path.join(
         base_dir, "data", "output", "graph", chain, f"{year:04d}", f"{month:02d}",
-        f"{chain}__features__{year}_{month:02d}.csv"
+        f"{chain}__features__{year}_{month:02d}.parquet"
     )
+    legacy_csv = path.replace(".parquet", ".csv")
+    return legacy_csv if not os.path.exists(path) and os.path.exists(legacy_csv) else path
+
+def load_features(input_path: str, columns: list[str] = FEATURE_COLUMNS) -> pd.DataFrame:
+    """
+    Load only the needed columns of the monthly feature table.
+
+    The Parquet table is already typed (int32 counts, float32 densities, float64 amounts,
+    nulls for infra rows), so it is read as plain numpy dtypes without any re-coercion.
+    Legacy CSV tables still go through pd.to_numeric.
+    """
+    if input_path.endswith(".parquet"):
+        available = set(pq.read_schema(input_path).names)
+        table = pq.read_table(input_path, columns=[c for c in columns if c in available])
+        # ignore_metadata: nullable int columns come back as float64 with NaN for infra rows
+        df = table.to_pandas(ignore_metadata=True)
+        # Detectors compute in float64; float32 storage columns are widened once here
+        float32_cols = df.columns[df.dtypes == "float32"]
+        df[float32_cols] = df[float32_cols].astype("float64")
+        return df
+
+    df = pd.read_csv(input_path, usecols=lambda c: c in columns)
+    numeric = [c for c in columns if c in df.columns and c != "address"]
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors="coerce")
+    return df
 
 def get_output_path(base_dir, chain, year, month):
     return os.path.join(
@@ -19,95 +104,232 @@ def get_output_path(base_dir, chain, year, month):
         f"{chain}__analysis_result__{year}_{month:02d}.csv"
     )
 
-def run_anomaly_analysis_pipeline(chain: str, year: int, month: int):
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+def get_sketch_path(base_dir, chain, year, month):
+    """
+    Per-month quantile sketches of the rule threshold columns (merged for rolling windows).
+    """
+    return os.path.join(
+        base_dir, "data", "output", "graph", chain, f"{year:04d}", f"{month:02d}",
+        f"{chain}__threshold_sketches__{year}_{month:02d}.json"
+    )
+
+def get_window_months(year: int, month: int, window: int) -> list[tuple[int, int]]:
+    """
+    The `window` months ending at (year, month), oldest first.
+    """
+    months = []
+    for _ in range(window):
+        months.append((year, month))
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return months[::-1]
+
+def compute_sketch_thresholds(df: pd.DataFrame, base_dir: str, chain: str, year: int, month: int,
+                              window: int = 1) -> dict:
+    """
+    Rule thresholds from quantile sketches: this month's sketches are built in one pass, saved
+    next to the month's artifacts, and merged with the saved sketches of the previous
+    `window - 1` months (missing months are skipped).
+    """
+    sketches = update_threshold_sketches(df, THRESHOLD_COLUMNS, IGNORE_ZERO_THRESHOLD_COLUMNS)
+    save_sketches(get_sketch_path(base_dir, chain, year, month), sketches)
+    report_threshold_accuracy(df, sketches, IGNORE_ZERO_THRESHOLD_COLUMNS)
+
+    parts = []
+    for y, m in get_window_months(year, month, window)[:-1]:
+        path = get_sketch_path(base_dir, chain, y, m)
+        if os.path.exists(path):
+            parts.append(load_sketches(path))
+        else:
+            print(f"⚠️ No threshold sketches for {y}-{m:02d}, left out of the window")
+    if parts:
+        print(f"🪟 Thresholds over {len(parts) + 1} months")
+        sketches = merge_sketches(parts + [sketches])
+
+    return thresholds_from_sketches(sketches)
+
+def degree_strata(df: pd.DataFrame) -> np.ndarray:
+    """
+    Stratum per account for stratified covariance fitting: log2 bucket of the total degree,
+    so the few high-degree accounts are not lost in a uniform subsample.
+    """
+    return np.floor(np.log2(df["in_degree"].to_numpy() + df["out_degree"].to_numpy() + 1)).astype(np.int64)
+
+def run_anomaly_analysis_pipeline(chain: str, year: int, month: int, cov_estimator: str = "empirical",
+                                  cov_sample_size: int = None, cov_stratify: bool = False,
+                                  threshold_method: str = "exact", threshold_window: int = 1,
+                                  score_only: bool = False, model_id: str = None, knn: bool = False,
+                                  knn_k: int = KNN_DEFAULT_K, knn_reference_size: int = KNN_REFERENCE_SIZE,
+                                  base_dir: str = None):
+    """
+    Monthly anomaly analysis: rule-based flags, Mahalanobis distance, Isolation Forest, scoring.
+
+    Rule thresholds are exact quantiles of this month (`threshold_method="exact"`) or read off
+    mergeable quantile sketches (`"sketch"`), optionally over a rolling `threshold_window` of months.
+
+    The Mahalanobis detector's mean / covariance use `cov_estimator` ("empirical", "mcd" or
+    "ledoit_wolf"), fitted on `cov_sample_size` rows (random, or stratified by degree bucket
+    with `cov_stratify`); every account is scored.
+
+    The Isolation Forest is fitted and saved to the model registry, or with `score_only`
+    loaded from it (`model_id`, default: latest model trained up to this month) and only used
+    for scoring; features are then standardized with the training run's z-score parameters.
+    Models trained on a pooled multi-month sample (analysis/run_batch.py) also carry the
+    Mahalanobis mean / covariance, which is then used instead of refitting on the month.
+
+    With `knn`, a fourth detector scores local density: k-NN distance and LOF of every account
+    against a KD-tree over `knn_reference_size` reference accounts (`knn_k` neighbors); its
+    percentile joins the final score average.
+
+    The run's frozen statistics are saved as a scoring bundle, against which new or updated
+    accounts can be scored without rerunning the month (see ScoringBundle.score_batch).
+
+    Besides the full-fidelity result table (CSV + Parquet archive), a compact serving table
+    sorted by address is written for the API (see build_serving_table), together with its
+    pre-ranked top rows for /v1/top (see build_top_table).
+
+    All inputs and outputs live under `base_dir`'s data/ tree (default: the repository root).
+    """
+    if base_dir is None:
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     input_path = get_input_path(base_dir, chain, year, month)
     output_path = get_output_path(base_dir, chain, year, month)
 
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Feature file not found: {input_path}")
 
-    # === Load data and preserve original index ===
-    df = pd.read_csv(input_path)
-    df["original_index"] = df.index
+    # === Load data; non-infra rows are evaluated, infra rows carried through unscored ===
+    df = load_features(input_path)
+    non_infra = df["is_infra"].to_numpy() == 0
+    rows = np.flatnonzero(non_infra)
 
-    # === Split infra and non-infra ===
-    df_infra = df[df["is_infra"] == 1].copy()
-    df_non_infra = df[df["is_infra"] == 0].copy()
+    for col in FILL_ZERO_COLUMNS:
+        if col in df.columns:
+            df.loc[non_infra & df[col].isna().to_numpy(), col] = 0
 
-    num_cols = [
-    "total_input_amount", "total_output_amount",
-    "in_degree", "out_degree",
-    "two_node_loop_amount", "two_node_loop_tx_count",
-    "triangle_loop_amount", "triangle_loop_tx_count"
-    ]
-    present = [c for c in num_cols if c in df_non_infra.columns]
-    df_non_infra[present] = df_non_infra[present].apply(pd.to_numeric, errors="coerce").fillna(0)
-    
     # === 1: Rule-based anomaly detection ===
-    thresholds = compute_thresholds(df_non_infra, [
-        "in_degree", "out_degree",
-        "two_node_loop_amount", "two_node_loop_tx_count",
-        "triangle_loop_amount", "triangle_loop_tx_count"
-    ], ignore_zeros_columns=[
-        # Excluding zeros for heavy-tailed amount/count metrics
-        "two_node_loop_amount", "two_node_loop_tx_count",
-        "triangle_loop_amount", "triangle_loop_tx_count"
-    ])
-
-    df_non_infra = apply_all_rules(df_non_infra, thresholds)
+    threshold_input = df.loc[non_infra, THRESHOLD_COLUMNS]
+    if threshold_method == "sketch":
+        thresholds = compute_sketch_thresholds(threshold_input, base_dir, chain, year, month, window=threshold_window)
+    else:
+        thresholds = compute_thresholds(threshold_input, THRESHOLD_COLUMNS, ignore_zeros_columns=IGNORE_ZERO_THRESHOLD_COLUMNS)
+    del threshold_input
 
-    # === 2: Statistical anomaly detection ===
-    df_non_infra = preprocess_features(df_non_infra)
+    df = apply_all_rules(df, thresholds, rows=rows)
 
-    statistical_features = [
-        "in_degree_log_z", "out_degree_log_z",
-        "total_input_amount_log_z", "total_output_amount_log_z",
-        "two_node_loop_count_log_z", "triangle_loop_count_log_z",
-        "log_degree_ratio_z", "log_amount_ratio_z",
-        "egonet_density_z"
-    ]
+    # === 2: Statistical anomaly detection ===
+    # One float32 working matrix of the z-scored features feeds both detectors
+    registry_dir = get_registry_dir(base_dir, chain)
+    iforest, model_meta = load_model(registry_dir, model_id, year, month) if score_only else (None, None)
+    Z, zscore_params = build_working_matrix(df, rows, zscore_params=model_meta["zscore_params"] if score_only else None)
+    statistical_features = STATISTICAL_FEATURES
 
-    df_non_infra = compute_mahalanobis_distance(df_non_infra, statistical_features)
+    if score_only and "mahalanobis" in model_meta:
+        # Model trained on a pooled multi-month sample: score against its frozen mean / covariance
+        mahalanobis_model = mahalanobis_model_from_dict(model_meta["mahalanobis"])
+        distances = score_mahalanobis(Z, mahalanobis_model)
+        print(f"📐 Mahalanobis distances against model {model_meta['model_id']}")
+    else:
+        distances, mahalanobis_model = mahalanobis_distances(
+            Z, statistical_features,
+            estimator=cov_estimator,
+            sample_size=cov_sample_size,
+            strata=degree_strata(df)[rows] if cov_stratify else None,
+            index=df.index[rows],
+            return_model=True
+        )
 
     # === 3: Isolation Forest ===
-    df_non_infra = fit_iforest_and_score(
-        df_non_infra,
-        features=statistical_features,
-        max_samples=100_000,
-        n_estimators=300
-    )
+    if score_only:
+        if model_meta["features"] != statistical_features:
+            raise ValueError(f"Model {model_meta['model_id']} expects features {model_meta['features']}")
+        iforest_id = model_meta["model_id"]
+    else:
+        iforest = fit_iforest(Z, **IFOREST_PARAMS)
+        iforest_id = save_model(iforest, registry_dir, statistical_features, Z, year, month, params=IFOREST_PARAMS,
+                                extra={"zscore_params": zscore_params})
+    iforest_scores = score_iforest(iforest, Z, out=np.empty(len(Z), dtype=np.float64))
+    print("✅ Isolation Forest scoring done.")
+
+    # === 3b: Local density (k-NN / LOF), optional ===
+    knn_index = None
+    if knn:
+        knn_index = fit_knn_index(Z, statistical_features, k=knn_k, reference_size=knn_reference_size)
+        knn_distances, lof_scores = score_knn(knn_index, Z, reference_positions(knn_index, len(Z)))
+    del Z
 
     # === 4: Scoring (0–100) ===
-    df_non_infra = score_rule_based(df_non_infra)
-    df_non_infra = score_statistical_percentile(df_non_infra)   # uses 'mahalanobis_distance'
-    df_non_infra = score_iforest_percentile(df_non_infra)       # uses 'iforest_score'
-    df_non_infra = combine_scores(df_non_infra)                 # makes 'final_score_0_100'
-
-    # === 5: Merge and restore original order ===
-    df_combined = pd.concat([df_non_infra, df_infra], axis=0)
-    df_combined = df_combined.sort_values("original_index").drop(columns=["original_index"])
-
-    # === Drop *_log, *_z, and *_ratio columns unless needed ===
-    drop_cols = [
-        col for col in df_combined.columns
-        if col.endswith("_log") or col.endswith("_z") or col.endswith("_ratio")
-    ]
-    df_combined = df_combined.drop(columns=drop_cols)
+    # Score inputs of the evaluated rows only, then scattered into full-length columns
+    scores = pd.DataFrame({col: df[col].to_numpy()[rows] for col in RULE_FLAG_COLUMNS})
+    scores["mahalanobis_distance"] = distances
+    scores["iforest_score"] = iforest_scores
+    scores = score_rule_based(scores)
+    scores = score_statistical_percentile(scores)   # uses 'mahalanobis_distance'
+    scores = score_iforest_percentile(scores)       # uses 'iforest_score'
+    components = SCORE_COMPONENTS
+    if knn:
+        scores["knn_distance"] = knn_distances
+        scores["lof_score"] = lof_scores
+        scores = score_lof_percentile(scores)       # uses 'lof_score'
+        components = SCORE_COMPONENTS + [KNN_SCORE_COMPONENT]
+    scores = combine_scores(scores, components)     # makes 'final_score_0_100'
+    for col in score_columns(knn):
+        df[col] = expand_rows(scores[col].to_numpy(), rows, len(df))
+
+    # === Scoring bundle: frozen statistics for online scoring of new accounts ===
+    bundle = ScoringBundle.from_run(
+        chain, year, month, thresholds, zscore_params, mahalanobis_model, iforest, iforest_id, scores,
+        FILL_ZERO_COLUMNS, knn_index=knn_index
+    )
+    bundle.save(get_bundle_path(base_dir, chain, year, month))
+    del scores
 
     # === Save to CSV & Parquet ===
-    df_combined.to_csv(output_path, index=False)
+    df.to_csv(output_path, index=False)
     output_parquet_path = output_path.replace(".csv", ".parquet")
-    df_combined.to_parquet(output_parquet_path, index=False)
+    # Rule descriptions travel once in the file metadata (rule_flags bit → description)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata, b"rule_catalog": json.dumps(rule_catalog())})
+    pq.write_table(table, output_parquet_path)
+    del table
 
     print(f"✅ Saved CSV to: {output_path}")
     print(f"✅ Saved Parquet to: {output_parquet_path}")
 
+    # === Serving table: API columns only, narrow types, sorted by address; Top-K ranking ===
+    serving = build_serving_table(df, chain, year, month, knn=knn)
+    write_serving_table(serving, get_serving_path(base_dir, chain, year, month))
+    write_top_table(build_top_table(serving), get_top_path(base_dir, chain, year, month))
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--chain", type=str, default="ethereum", help="Target blockchain (default: ethereum)")
     parser.add_argument("--year", type=int, required=True, help="Target year (e.g., 2024)")
     parser.add_argument("--month", type=int, required=True, help="Target month (1–12)")
+    parser.add_argument("--cov-estimator", choices=COVARIANCE_ESTIMATORS, default="empirical",
+                        help="Mean / covariance estimator of the Mahalanobis detector (default: empirical)")
+    parser.add_argument("--cov-sample-size", type=int, default=None,
+                        help="Rows used to fit the covariance (default: all for empirical, 100,000 for robust estimators)")
+    parser.add_argument("--cov-stratify", action="store_true",
+                        help="Stratify the covariance fitting sample by degree bucket")
+    parser.add_argument("--threshold-method", choices=["exact", "sketch"], default="exact",
+                        help="Rule thresholds from exact quantiles or from mergeable KLL sketches (default: exact)")
+    parser.add_argument("--threshold-window", type=int, default=1,
+                        help="Months of saved sketches merged for the thresholds (sketch method, default: 1)")
+    parser.add_argument("--score-only", action="store_true",
+                        help="Score with a registered Isolation Forest instead of refitting")
+    parser.add_argument("--model-id", type=str, default=None,
+                        help="Registered model to use with --score-only (default: latest trained up to this month)")
+
+    parser.add_argument("--knn", action="store_true",
+                        help="Add the k-NN / LOF local-density detector to the scores")
+    parser.add_argument("--knn-k", type=int, default=KNN_DEFAULT_K,
+                        help=f"Neighbors per account for k-NN / LOF (default: {KNN_DEFAULT_K})")
+    parser.add_argument("--knn-reference-size", type=int, default=KNN_REFERENCE_SIZE,
+                        help=f"Reference accounts in the k-NN index (default: {KNN_REFERENCE_SIZE:,})")
 
     args = parser.parse_args()
-    run_anomaly_analysis_pipeline(args.chain, args.year, args.month)
+    run_anomaly_analysis_pipeline(args.chain, args.year, args.month, cov_estimator=args.cov_estimator,
+                                  cov_sample_size=args.cov_sample_size, cov_stratify=args.cov_stratify,
+                                  threshold_method=args.threshold_method, threshold_window=args.threshold_window,
+                                  score_only=args.score_only, model_id=args.model_id, knn=args.knn,
+                                  knn_k=args.knn_k, knn_reference_size=args.knn_reference_size)
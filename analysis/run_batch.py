@@ -0,0 +1,294 @@
+import os
+import sys
+import time
+import argparse
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from analysis.run_statistical_window import iter_months, parse_period, get_month_dir
+from analysis.run_anomaly_analysis_pipeline import (
+    run_anomaly_analysis_pipeline, get_input_path, load_features, FILL_ZERO_COLUMNS, STATISTICAL_FEATURES,
+    IFOREST_PARAMS
+)
+from analysis.detectors.statistical_anomaly_detection import (
+    build_working_matrix, mahalanobis_distances, mahalanobis_model_to_dict, sample_rows
+)
+from analysis.detectors.unsupervised_learning_anomaly_detection import fit_iforest
+from analysis.detectors.model_registry import get_registry_dir, save_model
+
+STAGES = ("graph", "features", "analysis")
+# Rows drawn (evenly over the months) to train the shared models
+POOLED_SAMPLE_SIZE = 1_000_000
+# Default per-worker memory budget
+DEFAULT_MEMORY_BUDGET_GB = 4.0
+
+
+def physical_memory_bytes() -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def plan_workers(workers: int, memory_budget_gb: float) -> int:
+    """
+    Worker count that fits the machine: at most `workers`, and no more than physical memory
+    divided by the per-worker budget (at least one).
+    """
+    total = physical_memory_bytes()
+    if total and memory_budget_gb:
+        fitting = max(1, int(total // (memory_budget_gb * 1024 ** 3)))
+        if fitting < workers:
+            print(f"[Info] {workers} workers x {memory_budget_gb:g} GB exceed {total / 1024 ** 3:.1f} GB of RAM: "
+                  f"using {fitting}")
+            workers = fitting
+    return workers
+
+
+def limit_worker_memory(memory_budget_gb: float) -> None:
+    """
+    Pool initializer: cap the worker's allocated memory, so a month that outgrows its budget
+    fails with a MemoryError instead of pushing the whole machine into swap / the OOM killer.
+
+    On Linux the cap is RLIMIT_DATA: heap and private writable mappings (numpy / pandas
+    buffers, thread stacks), i.e. memory the worker allocated whether or not it is resident
+    yet. Shared libraries and reserved-but-inaccessible regions (e.g. malloc arena
+    reservations) do not count, unlike RLIMIT_AS, which caps the whole virtual address space
+    and would fail a worker whose resident memory is far below the budget. Elsewhere
+    RLIMIT_DATA does not cover mmap allocations, so the address space is capped instead.
+    """
+    if not memory_budget_gb:
+        return
+    try:
+        import resource
+    except ImportError:
+        # No rlimits (e.g. Windows): the budget only sizes the pool
+        return
+    limit = int(memory_budget_gb * 1024 ** 3)
+    rlimit = resource.RLIMIT_DATA if sys.platform.startswith("linux") else resource.RLIMIT_AS
+    resource.setrlimit(rlimit, (limit, limit))
+
+
+def run_month(chain: str, year: int, month: int, stages: list[str], analysis_options: dict, log_dir: str = None) -> dict:
+    """
+    Run the selected stages of one month in order, timing each one.
+
+    With `log_dir`, the month's console output is appended to <log_dir>/<chain>__batch__YYYY_MM.log
+    (parallel workers would otherwise interleave it).
+
+    Returns:
+        dict: year, month, status ("ok" / "failed"), seconds per stage, error
+    """
+    from graph.run_graph_builder import run_graph_builder
+    from graph.run_feature_extraction import run_feature_extraction, get_graph_path
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    report = {"year": year, "month": month, "status": "ok", "error": None}
+
+    stdout = sys.stdout
+    log = None
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        log = open(os.path.join(log_dir, f"{chain}__batch__{year}_{month:02d}.log"), "a", encoding="utf-8")
+        sys.stdout = log
+        print(f"=== {time.strftime('%Y-%m-%d %H:%M:%S')} stages: {', '.join(stages)}")
+    try:
+        for stage in stages:
+            t0 = time.perf_counter()
+            if stage == "graph":
+                run_graph_builder(year, month)
+            elif stage == "features":
+                run_feature_extraction(get_graph_path(base_dir, chain, year, month), year, month, chain=chain)
+            else:
+                run_anomaly_analysis_pipeline(chain, year, month, **analysis_options)
+            report[stage] = time.perf_counter() - t0
+    except Exception as e:
+        report["status"] = "failed"
+        report["error"] = f"{type(e).__name__}: {e}"
+        traceback.print_exc(file=sys.stdout)
+    finally:
+        sys.stdout = stdout
+        if log is not None:
+            log.close()
+    return report
+
+
+def run_months(chain: str, months: list[tuple[int, int]], stages: list[str], analysis_options: dict,
+               workers: int, memory_budget_gb: float) -> list[dict]:
+    """
+    Run the stages of every month on a process pool (one fresh process per month, so memory
+    is returned between months).
+    """
+    if not stages:
+        return []
+    workers = min(plan_workers(workers, memory_budget_gb), len(months))
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"🚀 {', '.join(stages)} for {len(months)} months on {workers} worker(s)"
+          + (f", {memory_budget_gb:g} GB each" if memory_budget_gb else ""))
+
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=limit_worker_memory, initargs=(memory_budget_gb,),
+                             max_tasks_per_child=1) as pool:
+        futures = {
+            pool.submit(run_month, chain, year, month, stages, analysis_options,
+                        get_month_dir(base_dir, chain, year, month)): (year, month)
+            for year, month in months
+        }
+        for future in as_completed(futures):
+            year, month = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. killed); the month's log has the details
+                report = {"year": year, "month": month, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+            done = "✅" if report["status"] == "ok" else "❌"
+            print(f"{done} {year}-{month:02d} " + ", ".join(f"{s} {report[s]:.1f}s" for s in stages if s in report)
+                  + (f" — {report['error']}" if report["error"] else ""))
+            reports.append(report)
+    return sorted(reports, key=lambda r: (r["year"], r["month"]))
+
+
+def train_pooled_models(chain: str, months: list[tuple[int, int]], sample_size: int = POOLED_SAMPLE_SIZE,
+                        random_state: int = 42) -> str:
+    """
+    Train the statistical and Isolation Forest models once, on a sample pooled over the months.
+
+    Every month contributes an even share of its non-infra accounts (all of them if it has
+    fewer). The pooled sample fixes the z-score parameters and the Mahalanobis mean /
+    covariance; the Isolation Forest is fitted on the same z-scored sample. Everything is
+    saved as one registry entry (training period: the last month), which the months are then
+    scored against with score_only.
+
+    Returns:
+        str: Model ID
+    """
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    per_month = -(-sample_size // len(months))
+    samples = []
+    for i, (year, month) in enumerate(months):
+        df = load_features(get_input_path(base_dir, chain, year, month))
+        df = df[df["is_infra"] == 0]
+        df = df.iloc[sample_rows(len(df), per_month, random_state=random_state + i)]
+        present = [c for c in FILL_ZERO_COLUMNS if c in df.columns]
+        samples.append(df.assign(**{c: df[c].fillna(0) for c in present}))
+        print(f"🧺 {year}-{month:02d}: {len(df):,} rows sampled")
+    pooled = pd.concat(samples, ignore_index=True)
+    del samples
+
+    Z, zscore_params = build_working_matrix(pooled)
+    _, mahalanobis_model = mahalanobis_distances(Z, STATISTICAL_FEATURES, return_model=True)
+    iforest = fit_iforest(Z, **IFOREST_PARAMS)
+
+    last_year, last_month = months[-1]
+    return save_model(
+        iforest, get_registry_dir(base_dir, chain), STATISTICAL_FEATURES, Z, last_year, last_month,
+        params={**IFOREST_PARAMS, "pooled_sample_size": sample_size},
+        extra={
+            "zscore_params": zscore_params,
+            "mahalanobis": mahalanobis_model_to_dict(mahalanobis_model),
+            "training_months": [f"{y}-{m:02d}" for y, m in months],
+        },
+    )
+
+
+def print_timings(reports: list[dict], stages: list[str]) -> None:
+    rows = []
+    for r in reports:
+        row = {"month": f"{r['year']}-{r['month']:02d}", "status": r["status"]}
+        for stage in stages:
+            row[f"{stage}_s"] = round(r[stage], 1) if stage in r else np.nan
+        row["total_s"] = round(sum(r.get(stage, 0.0) for stage in stages), 1)
+        rows.append(row)
+    print("\n⏱️ Per-month timings:")
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+def run_batch(chain: str, start: tuple[int, int], end: tuple[int, int], stages: list[str] = STAGES,
+              workers: int = 1, memory_budget_gb: float = DEFAULT_MEMORY_BUDGET_GB, shared_model: bool = False,
+              pooled_sample_size: int = POOLED_SAMPLE_SIZE) -> list[dict]:
+    """
+    Back-fill a range of months: graph building, feature extraction and anomaly analysis.
+
+    Months are independent, so each one runs its stages in its own worker process (at most
+    `workers`, fewer if they would not fit in RAM at `memory_budget_gb` each; each worker's
+    allocated memory is capped at the budget, see limit_worker_memory).
+
+    With `shared_model`, the analysis stage is split: once every month has its feature table,
+    the statistical and Isolation Forest models are trained a single time on a pooled sample
+    (see train_pooled_models), and every month is then scored against them. Months without a
+    feature table are reported as failed and left out of the training.
+
+    Returns:
+        list[dict]: Per-month reports (status and seconds per stage), oldest month first
+    """
+    months = iter_months(start, end)
+    if not months:
+        raise ValueError(f"Empty month range: {start} → {end}")
+    stages = [s for s in STAGES if s in stages]
+    t0 = time.perf_counter()
+
+    if shared_model and "analysis" in stages:
+        reports = {m: {"year": m[0], "month": m[1], "status": "ok", "error": None} for m in months}
+        for r in run_months(chain, months, [s for s in stages if s != "analysis"], {}, workers, memory_budget_gb):
+            reports[(r["year"], r["month"])] = r
+        # Months whose feature table is missing (e.g. --stages analysis alone) fail here,
+        # instead of aborting the pooled training
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for (year, month), report in reports.items():
+            input_path = get_input_path(base_dir, chain, year, month)
+            if report["status"] == "ok" and not os.path.exists(input_path):
+                report.update({"status": "failed", "error": f"FileNotFoundError: Feature file not found: {input_path}"})
+                print(f"❌ {year}-{month:02d} — {report['error']}")
+        ready = [m for m in months if reports[m]["status"] == "ok"]
+        if not ready:
+            raise RuntimeError("No month has a feature table to train the shared model on")
+
+        t1 = time.perf_counter()
+        model_id = train_pooled_models(chain, ready, sample_size=pooled_sample_size)
+        print(f"⏱️ Shared model training ({len(ready)} months): {time.perf_counter() - t1:.1f}s")
+
+        options = {"score_only": True, "model_id": model_id}
+        for r in run_months(chain, ready, ["analysis"], options, workers, memory_budget_gb):
+            reports[(r["year"], r["month"])].update({k: v for k, v in r.items() if k in ("analysis", "status", "error")})
+        reports = [reports[m] for m in months]
+    else:
+        reports = run_months(chain, months, stages, {}, workers, memory_budget_gb)
+
+    print_timings(reports, stages)
+    n_failed = sum(r["status"] != "ok" for r in reports)
+    print(f"\n{'✅' if not n_failed else '⚠️'} {len(reports) - n_failed}/{len(reports)} months done "
+          f"in {time.perf_counter() - t0:.1f}s")
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Back-fill a range of months on a process pool")
+    parser.add_argument("--chain", type=str, default="ethereum", help="Target blockchain (default: ethereum)")
+    parser.add_argument("--start", type=parse_period, required=True, help="First month (YYYY-MM)")
+    parser.add_argument("--end", type=parse_period, help="Last month (YYYY-MM, default: --start)")
+    parser.add_argument("--stages", type=str, default=",".join(STAGES),
+                        help=f"Comma-separated stages to run, in order (default: {','.join(STAGES)})")
+    parser.add_argument("--workers", type=int, default=1, help="Months processed in parallel (default: 1)")
+    parser.add_argument("--memory-budget-gb", type=float, default=DEFAULT_MEMORY_BUDGET_GB,
+                        help=f"Cap on the memory each worker allocates (heap / private mappings, not resident "
+                             f"memory) in GB, 0 for none (default: {DEFAULT_MEMORY_BUDGET_GB:g})")
+    parser.add_argument("--shared-model", action="store_true",
+                        help="Train the statistical / Isolation Forest models once on a pooled sample of all months")
+    parser.add_argument("--pooled-sample-size", type=int, default=POOLED_SAMPLE_SIZE,
+                        help=f"Rows in the pooled training sample (default: {POOLED_SAMPLE_SIZE:,})")
+
+    args = parser.parse_args()
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {sorted(unknown)} (choose from {', '.join(STAGES)})")
+
+    reports = run_batch(args.chain, args.start, args.end or args.start, stages=stages, workers=args.workers,
+                        memory_budget_gb=args.memory_budget_gb, shared_model=args.shared_model,
+                        pooled_sample_size=args.pooled_sample_size)
+    sys.exit(1 if any(r["status"] != "ok" for r in reports) else 0)
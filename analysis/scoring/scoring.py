@@ -1,6 +1,29 @@
 import numpy as np
 import pandas as pd
 
+# Rule flag columns read by scoring, and the score columns appended to the result table
+RULE_FLAG_COLUMNS = ["H1_flag", "H2_flag", "H3_flag", "H4_flag", "H5_flag", "H6_flag"]
+SCORE_COLUMNS = [
+    "mahalanobis_distance", "iforest_score",
+    "rule_score_raw", "rule_score_100",
+    "mahalanobis_distance_stats_score_100", "iforest_stats_score_100",
+    "final_score_0_100", "final_score_top_percent", "final_score_top_percent_display",
+]
+# Optional local-density detector (k-NN / LOF): its raw scores and 0–100 component
+KNN_SCORE_COLUMNS = ["knn_distance", "lof_score", "lof_stats_score_100"]
+
+# Components averaged into final_score_0_100
+SCORE_COMPONENTS = ["rule_score_100", "mahalanobis_distance_stats_score_100", "iforest_stats_score_100"]
+KNN_SCORE_COMPONENT = "lof_stats_score_100"
+
+
+def score_columns(knn: bool = False) -> list[str]:
+    """Score columns of the result table, the k-NN / LOF ones (if enabled) before the final score."""
+    if not knn:
+        return list(SCORE_COLUMNS)
+    final = SCORE_COLUMNS.index("final_score_0_100")
+    return SCORE_COLUMNS[:final] + KNN_SCORE_COLUMNS + SCORE_COLUMNS[final:]
+
 def hazen_percentile_0_100(s: pd.Series) -> pd.Series:
     """
     Convert a numeric Series to Hazen percentile scores in the range 0–100.
@@ -21,6 +44,60 @@ def hazen_percentile_0_100(s: pd.Series) -> pd.Series:
     return ((ranks - 0.5) / n * 100.0).astype(np.float32)
 
 
+def hazen_percentile_lookup(sorted_reference: np.ndarray, values) -> np.ndarray:
+    """
+    Hazen percentile (0–100) of values against a sorted reference sample, by binary search
+    instead of re-ranking the whole sample.
+
+    On the reference's own values this equals hazen_percentile_0_100: with left / right the
+    insertion points of a value, its average rank among ties is (left + right + 1) / 2, so
+        percentile = (left + right) / 2 / n * 100
+    A value that is not in the reference lands between its neighbours (left == right).
+
+    Parameters:
+        sorted_reference (np.ndarray): Reference scores sorted ascending, NaN last (np.sort)
+        values: Scores to place
+
+    Returns:
+        np.ndarray: float32 percentiles (NaN for NaN values)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    left = np.searchsorted(sorted_reference, values, side="left")
+    right = np.searchsorted(sorted_reference, values, side="right")
+    percentiles = ((left + right) / 2 / len(sorted_reference) * 100.0).astype(np.float32)
+    percentiles[np.isnan(values)] = np.nan
+    return percentiles
+
+
+def top_percent_lookup(sorted_reference: np.ndarray, values) -> np.ndarray:
+    """
+    Top % rank of values against a sorted reference sample, as combine_scores computes it
+    (descending average rank / n * 100, rounded to 2 decimals), by binary search.
+
+    Returns:
+        np.ndarray: float32 top percentages (NaN for NaN values)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    left = np.searchsorted(sorted_reference, values, side="left")
+    right = np.searchsorted(sorted_reference, values, side="right")
+    # NaN sorts last: its insertion point is the number of non-NaN reference values
+    n_valid = np.searchsorted(sorted_reference, np.nan, side="left")
+    ranks_desc = (n_valid - right) + (right - left + 1) / 2
+    top_percent = np.round(ranks_desc / len(sorted_reference) * 100, 2).astype(np.float32)
+    top_percent[np.isnan(values)] = np.nan
+    return top_percent
+
+
+def expand_rows(values: np.ndarray, rows: np.ndarray, n_rows: int) -> np.ndarray:
+    """
+    Full-length column with `values` at the row positions `rows` and NaN elsewhere
+    (float columns keep their dtype, anything else becomes object).
+    """
+    column = np.full(n_rows, np.nan, dtype=values.dtype if values.dtype.kind == "f" else object)
+    column[rows] = values
+    return column
+
+
 def score_rule_based(df: pd.DataFrame) -> pd.DataFrame:
     """
     Compute rule-based anomaly score.
@@ -35,9 +112,8 @@ def score_rule_based(df: pd.DataFrame) -> pd.DataFrame:
         df (pd.DataFrame): Input DataFrame containing integer flags for each rule.
 
     Returns:
-        pd.DataFrame: Copy of input with added raw and scaled rule-based scores.
+        pd.DataFrame: Input with added raw and scaled rule-based scores (in place).
     """
-    df = df.copy()
     hcols_main = ["H1_flag", "H2_flag", "H3_flag", "H4_flag"]
     hcols_cycle = ["H5_flag", "H6_flag"]
 
@@ -57,9 +133,8 @@ def score_statistical_percentile(df: pd.DataFrame) -> pd.DataFrame:
         df (pd.DataFrame): Input DataFrame containing Mahalanobis distance.
 
     Returns:
-        pd.DataFrame: Copy of input with added Hazen percentile for Mahalanobis_distance.
+        pd.DataFrame: Input with added Hazen percentile for Mahalanobis_distance (in place).
     """
-    df = df.copy()
     df["mahalanobis_distance_stats_score_100"] = hazen_percentile_0_100(df["mahalanobis_distance"])
     return df
 
@@ -73,29 +148,39 @@ def score_iforest_percentile(df: pd.DataFrame) -> pd.DataFrame:
       - If you stored '-decision_function(X)', then higher_is_more_anomalous=True (default).
       - If you stored the raw scikit-learn decision_function (higher=more normal),
         set higher_is_more_anomalous=False to flip the direction.
+      - Adds the column in place.
     """
-    df = df.copy()
     df["iforest_stats_score_100"] = hazen_percentile_0_100(df["iforest_score"])
     return df
 
 
-def combine_scores(df: pd.DataFrame) -> pd.DataFrame:
+def score_lof_percentile(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the local outlier factor to Hazen percentile (0–100). Larger = sparser than its
+    neighborhood. Adds the column in place.
+    """
+    df["lof_stats_score_100"] = hazen_percentile_0_100(df["lof_score"])
+    return df
+
+
+def combine_scores(df: pd.DataFrame, components: list[str] = SCORE_COMPONENTS) -> pd.DataFrame:
     """
-    Compute the final anomaly score as the simple average of:
+    Compute the final anomaly score as the simple average of the component scores, by default:
       - rule_score_100
       - mahalanobis_distance_stats_score_100
       - iforest_stats_score_100
+    (plus lof_stats_score_100 when the k-NN / LOF detector is enabled).
 
     Parameters:
         df (pd.DataFrame): Input DataFrame with component scores.
+        components (list[str]): Component score columns to average.
 
     Returns:
-        pd.DataFrame: Copy of input with an additional column:
-            - final_score_0_100: Row-wise mean of the three component scores.
+        pd.DataFrame: Input with additional columns (in place):
+            - final_score_0_100: Row-wise mean of the component scores.
+            - final_score_top_percent(_display): Top % rank of the final score.
     """
-    df = df.copy()
-    cols = ["rule_score_100", "mahalanobis_distance_stats_score_100", "iforest_stats_score_100"]
-    df["final_score_0_100"] = df[cols].mean(axis=1)
+    df["final_score_0_100"] = df[components].mean(axis=1)
 
     # === Calculate Top % ranking ===
     n = len(df)
@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from analysis.detectors.rule_based_anomaly_detection import compile_rules, RULE_SPECS
+from analysis.detectors.statistical_anomaly_detection import build_working_matrix, score_mahalanobis
+from analysis.detectors.unsupervised_learning_anomaly_detection import score_iforest
+from analysis.detectors.model_registry import get_registry_dir, load_model
+from analysis.detectors.local_density_anomaly_detection import score_knn, knn_index_to_arrays, knn_index_from_arrays
+from analysis.scoring.scoring import (
+    score_rule_based, hazen_percentile_lookup, top_percent_lookup, expand_rows, score_columns, RULE_FLAG_COLUMNS,
+    SCORE_COMPONENTS, KNN_SCORE_COMPONENT
+)
+
+# Month scores kept sorted in the bundle, to place new scores on the month's percentile scales
+REFERENCE_SCORES = ["mahalanobis_distance", "iforest_score", "final_score_0_100"]
+
+
+def get_bundle_path(base_dir: str, chain: str, year: int, month: int) -> str:
+    return os.path.join(
+        base_dir, "data", "output", "graph", chain, f"{year:04d}", f"{month:02d}",
+        f"{chain}__scoring_bundle__{year}_{month:02d}.npz"
+    )
+
+
+class ScoringBundle:
+    """
+    Frozen statistics of one monthly analysis run — everything needed to score new or updated
+    accounts without reloading the month:
+      - rule thresholds and the compiled rule spec
+      - z-score parameters of the transformed features
+      - Mahalanobis mean and covariance factor (Cholesky or pseudo-inverse)
+      - the Isolation Forest, referenced by its model registry ID
+      - with the k-NN / LOF detector: its reference points and their k-distances / densities
+      - the month's sorted Mahalanobis / Isolation Forest (/ LOF) / final scores, so
+        percentiles and the top % rank are binary-search lookups (see hazen_percentile_lookup)
+
+    Scores of the month's own accounts come out exactly as in the result table — except the
+    LOF of the k-NN reference accounts, which the bundle scores as new points.
+
+    Attributes:
+        metadata (dict): chain, year, month, model_id, thresholds, zscore_params, fill_zero_columns,
+            mahalanobis_method
+        arrays (dict[str, np.ndarray]): mahalanobis_keep / _mean / _factor, knn_*, sorted_<score>
+        iforest: Loaded Isolation Forest (None until load)
+    """
+
+    def __init__(self, metadata: dict, arrays: dict, iforest=None, knn_index: dict = None):
+        self.metadata = metadata
+        self.arrays = arrays
+        self.iforest = iforest
+        self.knn_index = knn_index
+        self._evaluate_rules = compile_rules(RULE_SPECS)
+
+    @classmethod
+    def from_run(cls, chain: str, year: int, month: int, thresholds: dict, zscore_params: dict,
+                 mahalanobis_model: dict, iforest, model_id: str, scores: pd.DataFrame,
+                 fill_zero_columns: list[str], knn_index: dict = None) -> "ScoringBundle":
+        """
+        Bundle the statistics of a finished run (`scores`: score columns of the evaluated rows).
+        """
+        metadata = {
+            "chain": chain,
+            "year": year,
+            "month": month,
+            "model_id": model_id,
+            "thresholds": {col: float(value) for col, value in thresholds.items()},
+            "zscore_params": zscore_params,
+            "fill_zero_columns": list(fill_zero_columns),
+            "mahalanobis_method": mahalanobis_model["method"],
+            "knn": knn_index is not None,
+        }
+        arrays = {"mahalanobis_keep": np.asarray(mahalanobis_model["keep"])}
+        if mahalanobis_model["mean"] is not None:
+            arrays["mahalanobis_mean"] = mahalanobis_model["mean"]
+            arrays["mahalanobis_factor"] = mahalanobis_model["factor"]
+        if knn_index is not None:
+            arrays.update(knn_index_to_arrays(knn_index))
+        for col in REFERENCE_SCORES + (["lof_score"] if knn_index is not None else []):
+            arrays[f"sorted_{col}"] = np.sort(scores[col].to_numpy(dtype=np.float64))
+        return cls(metadata, arrays, iforest, knn_index)
+
+    def save(self, path: str) -> None:
+        """One compressed .npz (metadata as a JSON string entry), write-then-rename."""
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(f, metadata=np.array(json.dumps(self.metadata)), **self.arrays)
+        os.replace(path + ".tmp", path)
+        print(f"💾 Saved scoring bundle to: {path}")
+
+    @classmethod
+    def load(cls, path: str, registry_dir: str) -> "ScoringBundle":
+        """Load a bundle and its Isolation Forest from the model registry."""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Scoring bundle not found: {path} (run the analysis pipeline first)")
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        metadata = json.loads(str(arrays.pop("metadata")))
+        iforest, _ = load_model(registry_dir, model_id=metadata["model_id"])
+        knn_index = knn_index_from_arrays(arrays) if metadata.get("knn") else None
+        return cls(metadata, arrays, iforest, knn_index)
+
+    def mahalanobis_model(self) -> dict:
+        return {
+            "keep": self.arrays["mahalanobis_keep"],
+            "mean": self.arrays.get("mahalanobis_mean"),
+            "method": self.metadata["mahalanobis_method"],
+            "factor": self.arrays.get("mahalanobis_factor"),
+        }
+
+    def score_batch(self, features_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Score a batch of accounts (feature-table rows) against the frozen month statistics.
+
+        Infra rows (is_infra == 1) are not evaluated, as in the pipeline: no rule bits and
+        NaN scores. The input frame is not modified.
+
+        Returns:
+            pd.DataFrame (same index): address (if given), rule_flags, H*_flag, score columns
+        """
+        n_rows = len(features_df)
+        is_infra = features_df["is_infra"].to_numpy() if "is_infra" in features_df.columns else np.zeros(n_rows)
+        non_infra = is_infra == 0
+        rows = np.flatnonzero(non_infra)
+
+        # Numeric feature columns as float64 (the caller's frame is left untouched)
+        work = features_df.drop(columns=["address"], errors="ignore").apply(pd.to_numeric, errors="coerce").astype(np.float64)
+        for col in self.metadata["fill_zero_columns"]:
+            if col in work.columns:
+                work.loc[non_infra & work[col].isna().to_numpy(), col] = 0
+
+        # === Rules
+        rule_flags, flags = self._evaluate_rules(work, self.metadata["thresholds"], rows)
+        scores = pd.DataFrame({f"{spec['id']}_flag": flags[spec["id"]].astype(np.float64) for spec in RULE_SPECS})
+
+        # === Mahalanobis and Isolation Forest on the frozen z-scores
+        Z, _ = build_working_matrix(work, rows, zscore_params=self.metadata["zscore_params"])
+        scores["mahalanobis_distance"] = score_mahalanobis(Z, self.mahalanobis_model())
+        scores["iforest_score"] = score_iforest(self.iforest, Z, n_jobs=1)
+        components = SCORE_COMPONENTS
+        if self.knn_index is not None:
+            scores["knn_distance"], scores["lof_score"] = score_knn(self.knn_index, Z, n_jobs=1)
+            components = SCORE_COMPONENTS + [KNN_SCORE_COMPONENT]
+
+        # === Scores on the month's scales
+        scores = score_rule_based(scores)
+        scores["mahalanobis_distance_stats_score_100"] = hazen_percentile_lookup(
+            self.arrays["sorted_mahalanobis_distance"], scores["mahalanobis_distance"]
+        )
+        scores["iforest_stats_score_100"] = hazen_percentile_lookup(self.arrays["sorted_iforest_score"], scores["iforest_score"])
+        if self.knn_index is not None:
+            scores["lof_stats_score_100"] = hazen_percentile_lookup(self.arrays["sorted_lof_score"], scores["lof_score"])
+        scores["final_score_0_100"] = scores[components].mean(axis=1)
+        scores["final_score_top_percent"] = top_percent_lookup(self.arrays["sorted_final_score_0_100"], scores["final_score_0_100"])
+        scores["final_score_top_percent_display"] = scores["final_score_top_percent"].map(lambda x: f"{x:.2f}%")
+
+        # === Back to the batch rows (infra rows unscored)
+        result = pd.DataFrame(index=features_df.index)
+        if "address" in features_df.columns:
+            result["address"] = features_df["address"].to_numpy()
+        all_flags = np.zeros(n_rows, dtype=rule_flags.dtype)
+        all_flags[rows] = rule_flags
+        result["rule_flags"] = all_flags
+        for col in RULE_FLAG_COLUMNS + score_columns(self.knn_index is not None):
+            result[col] = expand_rows(scores[col].to_numpy(), rows, n_rows)
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score accounts against a month's frozen scoring bundle")
+    parser.add_argument("--chain", type=str, default="ethereum", help="Target blockchain (default: ethereum)")
+    parser.add_argument("--year", type=int, required=True, help="Bundle year")
+    parser.add_argument("--month", type=int, required=True, help="Bundle month")
+    parser.add_argument("--input", type=str, required=True, help="Feature rows to score (.parquet or .csv)")
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    bundle = ScoringBundle.load(get_bundle_path(base_dir, args.chain, args.year, args.month),
+                                get_registry_dir(base_dir, args.chain))
+    features = pd.read_parquet(args.input) if args.input.endswith(".parquet") else pd.read_csv(args.input)
+
+    t0 = time.perf_counter()
+    result = bundle.score_batch(features)
+    print(f"⏱️ Scored {len(result):,} rows in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(result)
@@ -0,0 +1,139 @@
+import os
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from analysis.detectors.rule_based_anomaly_detection import rule_catalog
+from analysis.scoring.scoring import SCORE_COMPONENTS, KNN_SCORE_COMPONENT
+
+# Columns served by the API, with their storage types. Counts are int32 (null for infra rows),
+# amounts stay float64 (wei), 0–100 scores and the top % are float32; H*_flag is carried by the
+# rule_flags bitmask and the "12.34%" display string is formatted at response time.
+SERVING_SCHEMA = pa.schema([
+    ("address", pa.string()),
+    ("is_infra", pa.bool_()),
+    ("in_degree", pa.int32()),
+    ("out_degree", pa.int32()),
+    ("in_transfer_count", pa.int32()),
+    ("out_transfer_count", pa.int32()),
+    ("total_input_amount", pa.float64()),
+    ("total_output_amount", pa.float64()),
+    ("self_loop_count", pa.int32()),
+    ("two_node_loop_count", pa.int32()),
+    ("triangle_loop_count", pa.int32()),
+    ("egonet_density", pa.float32()),
+    ("rule_flags", pa.uint8()),
+    *[(col, pa.float32()) for col in SCORE_COMPONENTS],
+    ("final_score_0_100", pa.float32()),
+    ("final_score_top_percent", pa.float32()),
+])
+KNN_SERVING_FIELD = pa.field(KNN_SCORE_COMPONENT, pa.float32())
+
+# Rows per row group: with rows sorted by address, an address lookup decodes one group instead
+# of the month (1M-row month: ~3.5 ms p50 / 6 ms p99 at 8k rows, vs. ~23 / 38 ms at 64k)
+SERVING_ROW_GROUP_SIZE = 8_192
+# Low-cardinality columns that dictionary-encode well (addresses are unique, scores near-unique)
+SERVING_DICTIONARY_COLUMNS = ["is_infra", "rule_flags"]
+SERVING_COMPRESSION = "zstd"
+
+# Pre-ranked rows kept for /v1/top (requests for more fall back to a scan of the serving table)
+TOP_K_ROWS = 100_000
+# Small row groups, so serving the first n ranks reads only the first few groups
+TOP_ROW_GROUP_SIZE = 8_192
+
+
+def get_serving_path(base_dir: str, chain: str, year: int, month: int) -> str:
+    return os.path.join(
+        base_dir, "data", "output", "graph", chain, f"{year:04d}", f"{month:02d}",
+        f"{chain}__analysis_serving__{year}_{month:02d}.parquet"
+    )
+
+
+def get_top_path(base_dir: str, chain: str, year: int, month: int) -> str:
+    return os.path.join(
+        base_dir, "data", "output", "graph", chain, f"{year:04d}", f"{month:02d}",
+        f"{chain}__analysis_top__{year}_{month:02d}.parquet"
+    )
+
+
+def build_serving_table(df: pd.DataFrame, chain: str, year: int, month: int, knn: bool = False) -> pa.Table:
+    """
+    Compact, serving-oriented copy of the analysis result table.
+
+    Only the columns the API returns are kept, cast to the narrow types of SERVING_SCHEMA;
+    addresses are lowercased and the rows sorted by them, so the row-group min/max statistics
+    of `address` pin an address to a single row group. Chain / period and the rule catalog
+    (rule_flags bit → description) travel in the file metadata instead of per row.
+
+    Parameters:
+        df (pd.DataFrame): Full analysis result table
+        chain, year, month: Period of the table (stored in the metadata)
+        knn (bool): Whether the k-NN / LOF score is part of the table
+
+    Returns:
+        pa.Table: Sorted serving table
+    """
+    schema = SERVING_SCHEMA
+    if knn:
+        schema = schema.insert(schema.get_field_index("final_score_0_100"), KNN_SERVING_FIELD)
+
+    # NaN (infra rows, unevaluated scores) becomes null; float counts are whole numbers, cast safely
+    columns = [pa.array(df[field.name].to_numpy(), from_pandas=True).cast(field.type) for field in schema]
+    columns[0] = pc.utf8_lower(columns[0])
+    table = pa.Table.from_arrays(columns, schema=schema).sort_by("address")
+
+    return table.replace_schema_metadata({
+        b"chain": chain,
+        b"period": f"{year:04d}-{month:02d}",
+        b"rule_catalog": json.dumps(rule_catalog()),
+    })
+
+
+def write_serving_table(table: pa.Table, path: str) -> None:
+    """Write the serving table (tuned row groups, address statistics, sort order recorded), write-then-rename."""
+    pq.write_table(
+        table, path + ".tmp",
+        row_group_size=SERVING_ROW_GROUP_SIZE,
+        compression=SERVING_COMPRESSION,
+        use_dictionary=SERVING_DICTIONARY_COLUMNS,
+        write_statistics=True,
+        sorting_columns=[pq.SortingColumn(0)],
+    )
+    os.replace(path + ".tmp", path)
+    print(f"✅ Saved serving Parquet to: {path} ({table.num_rows:,} rows, "
+          f"{os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+def build_top_table(serving: pa.Table, k: int = TOP_K_ROWS) -> pa.Table:
+    """
+    Top-k ranking of a serving table, materialized so /v1/top is a slice instead of a sort.
+
+    Rows are ranked by final_score_0_100 (descending, ties by address, unscored infra rows
+    last) and carry ranking (1-based), address and the scores. The metadata records the
+    month's row count, so a reader knows whether the ranking is complete.
+
+    Parameters:
+        serving (pa.Table): Serving table (see build_serving_table)
+        k (int): Rows to keep
+
+    Returns:
+        pa.Table: ranking, address, rule_flags, 0–100 scores, final_score_top_percent
+    """
+    order = pc.sort_indices(
+        serving, sort_keys=[("final_score_0_100", "descending"), ("address", "ascending")], null_placement="at_end"
+    )[:k]
+    columns = ["address", "rule_flags"] + [name for name in serving.column_names if name.endswith("_100")] + \
+              ["final_score_top_percent"]
+    top = serving.select(columns).take(order)
+    top = top.add_column(0, "ranking", pa.array(range(1, top.num_rows + 1), type=pa.int32()))
+    return top.replace_schema_metadata({**serving.schema.metadata, b"total_rows": str(serving.num_rows)})
+
+
+def write_top_table(table: pa.Table, path: str) -> None:
+    """Write the Top-k ranking in small row groups, write-then-rename."""
+    pq.write_table(table, path + ".tmp", row_group_size=TOP_ROW_GROUP_SIZE, compression=SERVING_COMPRESSION)
+    os.replace(path + ".tmp", path)
+    print(f"✅ Saved Top-{table.num_rows:,} ranking to: {path}")
@@ -1,6 +1,9 @@
 import os
 from flask import Flask, request, jsonify
-from api.utils import wei_to_eth, build_month_parquet_path, query_duckdb, pack_rules
+from api.utils import (
+    wei_to_eth, resolve_serving_path, query_duckdb, pack_rules, load_rule_catalog, format_top_percent,
+    build_top_parquet_path, read_top_rows, load_address_index, lookup_address
+)
 from api.sql_api import register_sql_endpoint
 
 app = Flask(__name__)
@@ -30,8 +33,8 @@ def top():
     except Exception:
         return jsonify({"error": "missing or invalid chain/year/month"}), 400
 
-    # --- Resolve parquet file path ---
-    path = build_month_parquet_path(chain, year, month)
+    # --- Resolve parquet file path (compact serving table, or the full result table) ---
+    path, _ = resolve_serving_path(chain, year, month)
     if not os.path.exists(path):
         return jsonify({"error": f"parquet not found for {chain} {year}-{month:02d}", "path": path}), 404
 
@@ -41,18 +44,20 @@ def top():
     except Exception:
         return jsonify({"error": "invalid n"}), 400
 
-    # --- Query DuckDB for top N addresses ---
-    sql = """
-        SELECT address, final_score_0_100
-        FROM read_parquet(?)
-        ORDER BY final_score_0_100 DESC
-        LIMIT ?
-    """
+    # --- Slice of the pre-ranked Top-K table; scan only if it is missing or n exceeds K ---
+    df = read_top_rows(build_top_parquet_path(chain, year, month), n, ["ranking", "address", "final_score_0_100"])
+    if df is None:
+        sql = """
+            SELECT address, final_score_0_100
+            FROM read_parquet(?)
+            ORDER BY final_score_0_100 DESC
+            LIMIT ?
+        """
 
-    df = query_duckdb(sql, [path, n])
+        df = query_duckdb(sql, [path, n])
 
-    # Add ranking column starting from 1
-    df.insert(0, "ranking", range(1, len(df) + 1))
+        # Add ranking column starting from 1
+        df.insert(0, "ranking", range(1, len(df) + 1))
     df["final_score_0_100"] = df["final_score_0_100"].astype("float64").round(1)
 
     return df.to_json(orient="records", double_precision=2), 200, {"Content-Type": "application/json"}
@@ -75,8 +80,8 @@ def get_address():
     except Exception:
         return jsonify({"error": "missing or invalid chain/year/month/addr"}), 400
 
-    # --- Resolve parquet file path ---
-    path = build_month_parquet_path(chain, year, month)
+    # --- Resolve parquet file path (compact serving table, or the full result table) ---
+    path, serving = resolve_serving_path(chain, year, month)
     if not os.path.exists(path):
         return jsonify({"error": f"parquet not found for {chain} {year}-{month:02d}", "path": path}), 404
 
@@ -91,26 +96,42 @@ def get_address():
         "egonet_density",
         "rule_score_100", "mahalanobis_distance_stats_score_100",
         "iforest_stats_score_100", "final_score_0_100",
-        "final_score_top_percent_display",
     ]
-    RULE_FLAG_COLS = [f"H{i}_flag" for i in range(1, 7)]
-    RULE_DESC_COLS = [f"H{i}_description" for i in range(1, 7)]
-    COLS = BASE_COLS + RULE_FLAG_COLS + RULE_DESC_COLS
-    cols_sql = ", ".join(COLS)
-
-
-    # --- Query DuckDB for this address ---
-    sql = f"""
-        SELECT {cols_sql}
-        FROM read_parquet(?)
-        WHERE lower(address) = ?
-    """
-    df = query_duckdb(sql, [path, addr])
-
-    if df.empty:
-        return jsonify([]), 200 # Address not found
-    
-    r = df.iloc[0].to_dict()
+    # Serving table (sorted by lowercased address): read the one row group holding the address
+    index = load_address_index(path) if serving else None
+    if index is not None:
+        # Flags only as the bitmask, top % as a number formatted below
+        catalog = index["catalog"]
+        r = lookup_address(index, addr, BASE_COLS + ["final_score_top_percent", "rule_flags"])
+        if r is None:
+            return jsonify([]), 200 # Address not found
+    else:
+        # Current files pack the flags into rule_flags (descriptions in the file metadata);
+        # older files carry one description column per rule
+        catalog = load_rule_catalog(path)
+        if serving:
+            COLS = BASE_COLS + ["final_score_top_percent", "rule_flags"]
+        else:
+            RULE_FLAG_COLS = [f"H{i}_flag" for i in range(1, 7)]
+            RULE_DESC_COLS = ["rule_flags"] if catalog is not None else [f"H{i}_description" for i in range(1, 7)]
+            COLS = BASE_COLS + ["final_score_top_percent_display"] + RULE_FLAG_COLS + RULE_DESC_COLS
+        cols_sql = ", ".join(COLS)
+        # Serving tables store lowercased addresses, so the comparison stays prunable by row-group statistics
+        address_sql = "address" if serving else "lower(address)"
+
+
+        # --- Query DuckDB for this address ---
+        sql = f"""
+            SELECT {cols_sql}
+            FROM read_parquet(?)
+            WHERE {address_sql} = ?
+        """
+        df = query_duckdb(sql, [path, addr])
+
+        if df.empty:
+            return jsonify([]), 200 # Address not found
+
+        r = df.iloc[0].to_dict()
 
     # --- Special case: infrastructure account ---
     if bool(r["is_infra"]):
@@ -177,11 +198,12 @@ def get_address():
             "mahalanobis_stats_100": round(float(r["mahalanobis_distance_stats_score_100"]), 1),
             "iforest_stats_100": round(float(r["iforest_stats_score_100"]), 1),
             "final_score_0_100": round(float(r["final_score_0_100"]), 1),
-            "final_score_top_percent": r["final_score_top_percent_display"],
+            "final_score_top_percent": format_top_percent(r["final_score_top_percent"]) if serving
+                                       else r["final_score_top_percent_display"],
         },
         "explanations": {
-            "rule_ids": [item["rule"] for item in pack_rules(r)],
-            "rules": pack_rules(r)
+            "rule_ids": [item["rule"] for item in pack_rules(r, catalog)],
+            "rules": pack_rules(r, catalog)
         }
     }
 
@@ -1,8 +1,15 @@
 import os
+import json
+import bisect
 import duckdb
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Address indexes (footer metadata) of serving tables, keyed by path (rebuilt when the file's mtime changes)
+_ADDRESS_INDEXES = {}
+
 def wei_to_eth(wei):
     """
     Convert a value from Wei to ETH.
@@ -31,6 +38,87 @@ def build_month_parquet_path(chain: str, year: int, month: int) -> str:
     )
     return os.path.join(data_root, f"{chain}__analysis_result__{year}_{month:02d}.parquet")
 
+def build_serving_parquet_path(chain: str, year: int, month: int) -> str:
+    """
+    Build the file path of the compact serving table of a month (API columns only,
+    float32 scores, rows sorted by lowercased address).
+
+    Parameters:
+        chain (str): Blockchain name (e.g., "ethereum").
+        year (int): Year of the data.
+        month (int): Month of the data (1–12).
+    Returns:
+        str: Full path to the serving parquet file.
+    """
+    data_root = os.path.dirname(build_month_parquet_path(chain, year, month))
+    return os.path.join(data_root, f"{chain}__analysis_serving__{year}_{month:02d}.parquet")
+
+def build_top_parquet_path(chain: str, year: int, month: int) -> str:
+    """
+    Build the file path of the pre-ranked Top-K table of a month (written by the analysis pipeline).
+
+    Parameters:
+        chain (str): Blockchain name (e.g., "ethereum").
+        year (int): Year of the data.
+        month (int): Month of the data (1–12).
+    Returns:
+        str: Full path to the Top-K parquet file.
+    """
+    data_root = os.path.dirname(build_month_parquet_path(chain, year, month))
+    return os.path.join(data_root, f"{chain}__analysis_top__{year}_{month:02d}.parquet")
+
+def read_top_rows(path: str, n: int, columns: list[str]):
+    """
+    Read the first n ranks of a pre-ranked Top-K table, row group by row group.
+
+    Parameters:
+        path (str): Path to the Top-K parquet file.
+        n (int): Number of ranks requested.
+        columns (list[str]): Columns to read.
+    Returns:
+        pandas.DataFrame | None: The first n rows, or None when the file is missing or holds
+                                 fewer than n ranks of a larger month (the caller scans instead).
+    """
+    if not os.path.exists(path):
+        return None
+    with pq.ParquetFile(path) as pf:
+        total_rows = int((pf.schema_arrow.metadata or {}).get(b"total_rows", -1))
+        if n > pf.metadata.num_rows and pf.metadata.num_rows != total_rows:
+            return None
+
+        groups, rows = [], 0
+        for i in range(pf.num_row_groups):
+            if rows >= n:
+                break
+            groups.append(i)
+            rows += pf.metadata.row_group(i).num_rows
+        table = pf.read_row_groups(groups, columns=columns) if groups else pf.schema_arrow.empty_table().select(columns)
+    return table.slice(0, max(n, 0)).to_pandas()
+
+def resolve_serving_path(chain: str, year: int, month: int) -> tuple[str, bool]:
+    """
+    Pick the parquet file the API reads for a month: the serving table if it exists,
+    otherwise the full analysis result table (months analysed before it was introduced).
+
+    Returns:
+        tuple[str, bool]: (path, whether it is the serving table)
+    """
+    serving_path = build_serving_parquet_path(chain, year, month)
+    if os.path.exists(serving_path):
+        return serving_path, True
+    return build_month_parquet_path(chain, year, month), False
+
+def format_top_percent(value) -> str:
+    """
+    Format a final_score_top_percent value for display (e.g. "0.25%").
+
+    Parameters:
+        value (float): Top % rank.
+    Returns:
+        str: Rank with 2 decimals and a percent sign.
+    """
+    return f"{float(value):.2f}%"
+
 def query_duckdb(sql: str, params: list):
     """
     Execute a parameterized SQL query on DuckDB (in-memory)
@@ -48,17 +136,37 @@ def query_duckdb(sql: str, params: list):
     finally:
         con.close()
 
-def pack_rules(row: dict, ids=range(1, 7)):
+def load_rule_catalog(path: str) -> list[dict] | None:
+    """
+    Read the rule description lookup table stored in a result file's Parquet metadata.
+
+    Parameters:
+        path (str): Path to the analysis result parquet file.
+    Returns:
+        list[dict] | None: Rules with keys "id", "bit", "name", "description";
+                           None for files written before the packed rule_flags column.
+    """
+    metadata = pq.read_schema(path).metadata or {}
+    catalog = metadata.get(b"rule_catalog")
+    return json.loads(catalog) if catalog else None
+
+def pack_rules(row: dict, catalog: list[dict] = None, ids=range(1, 7)):
     """
     Extract triggered anomaly rules from a row.
 
     Parameters:
         row (dict): Dictionary representing one address/row of data.
-        ids (iterable): Iterable of rule IDs to check (default H1–H6).
+        catalog (list[dict]): Rule lookup table (see load_rule_catalog); when given, rules
+                              are decoded from the packed rule_flags bitmask.
+        ids (iterable): Rule IDs to check in legacy files with H*_description columns (default H1–H6).
     Returns:
         list[dict]: List of triggered rules with IDs and descriptions.
                     Each dict has keys: "rule", "description".
     """
+    if catalog is not None and row.get("rule_flags") is not None:
+        mask = int(row["rule_flags"])
+        return [{"rule": r["id"], "description": r["description"]} for r in catalog if mask >> r["bit"] & 1]
+
     items = []
     for i in ids:
         flag = row.get(f"H{i}_flag", 0)
@@ -68,4 +176,65 @@ def pack_rules(row: dict, ids=range(1, 7)):
                 "rule": f"H{i}",
                 "description": str(desc)
                 })
-    return items
\ No newline at end of file
+    return items
+
+
+def load_address_index(path: str) -> dict | None:
+    """
+    Address index of a serving table, built from its footer alone: the parsed file metadata
+    and the address min/max of every row group (rows are sorted by lowercased address, so the
+    ranges are ordered and disjoint). Cached per process until the file is rewritten.
+
+    Only the metadata is cached, not an open file: every lookup opens its own reader, so
+    request threads never share one, and no handle keeps the pipeline from replacing the file.
+
+    Parameters:
+        path (str): Path to the serving parquet file.
+    Returns:
+        dict | None: Keys "path", "mtime", "metadata", "min", "max", "catalog";
+                     None if a row group lacks address statistics.
+    """
+    mtime = os.path.getmtime(path)
+    index = _ADDRESS_INDEXES.get(path)
+    if index is not None and index["mtime"] == mtime:
+        return index
+
+    with pq.ParquetFile(path) as pf:
+        metadata = pf.metadata
+        schema = pf.schema_arrow
+    column = schema.get_field_index("address")
+    mins, maxs = [], []
+    for i in range(metadata.num_row_groups):
+        stats = metadata.row_group(i).column(column).statistics
+        if stats is None or not stats.has_min_max:
+            return None
+        mins.append(stats.min)
+        maxs.append(stats.max)
+
+    catalog = (schema.metadata or {}).get(b"rule_catalog")
+    index = {"path": path, "mtime": mtime, "metadata": metadata, "min": mins, "max": maxs,
+             "catalog": json.loads(catalog) if catalog else None}
+    _ADDRESS_INDEXES[path] = index
+    return index
+
+def lookup_address(index: dict, addr: str, columns: list[str]) -> dict | None:
+    """
+    Read one address from a serving table: bisect the row-group address ranges, then read
+    only the matching row group (address column first, the requested columns for the hit).
+
+    Parameters:
+        index (dict): Address index (see load_address_index).
+        addr (str): Lowercased address.
+        columns (list[str]): Columns to return.
+    Returns:
+        dict | None: Column values of the address, or None if it is not in the table.
+    """
+    group = bisect.bisect_right(index["min"], addr) - 1
+    if group < 0 or addr > index["max"][group]:
+        return None
+    # A reader per lookup on the cached metadata: no footer parse, no handle kept open
+    with pq.ParquetFile(index["path"], metadata=index["metadata"]) as pf:
+        position = pc.index(pf.read_row_group(group, columns=["address"]).column(0), addr).as_py()
+        if position < 0:
+            return None
+        return pf.read_row_group(group, columns=columns).slice(position, 1).to_pylist()[0]
@@ -0,0 +1,94 @@
+import os
+import json
+import shutil
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MANIFEST_NAME = "manifest.json"
+
+
+class ExtractionCheckpoint:
+    """
+    On-disk checkpoint of a streaming feature extraction run.
+
+    Layout:
+        <month_dir>/feature_checkpoint/
+            manifest.json               # fingerprint + completed vertex ranges
+            part_<start>.parquet        # one finished vertex range
+            precompute/<key>.npz        # graph-level precomputations (e.g. motif memberships)
+
+    A restart resumes from the completed ranges only if the manifest fingerprint
+    (graph fingerprint, whitelist hash, family versions, chunk size) is unchanged;
+    otherwise the stale checkpoint is discarded.
+    """
+
+    def __init__(self, month_dir: str, fingerprint: dict):
+        self.dir = os.path.join(month_dir, "feature_checkpoint")
+        self.precompute_dir = os.path.join(self.dir, "precompute")
+        self.manifest_path = os.path.join(self.dir, MANIFEST_NAME)
+        self.fingerprint = fingerprint
+        self.completed: dict[int, int] = {}  # start -> stop
+
+    def open(self) -> dict[int, int]:
+        """
+        Load a matching manifest (or reset a stale one) and return completed ranges {start: stop}.
+        """
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+
+            if manifest.get("fingerprint") == self.fingerprint:
+                self.completed = {int(k): v for k, v in manifest.get("completed", {}).items()}
+                # Only trust ranges whose part file actually made it to disk
+                self.completed = {s: e for s, e in self.completed.items() if os.path.exists(self.part_path(s))}
+                return self.completed
+
+            print("⚠️ Checkpoint fingerprint changed (graph, whitelist or feature versions) — starting over")
+            shutil.rmtree(self.dir)
+
+        os.makedirs(self.precompute_dir, exist_ok=True)
+        self.completed = {}
+        self._write_manifest()
+        return self.completed
+
+    def part_path(self, start: int) -> str:
+        return os.path.join(self.dir, f"part_{start:012d}.parquet")
+
+    def mark_done(self, start: int, stop: int) -> None:
+        """
+        Record a vertex range whose part file has been fully written.
+        """
+        self.completed[start] = stop
+        self._write_manifest()
+
+    def _write_manifest(self) -> None:
+        # Write-then-rename so a crash never leaves a truncated manifest
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.fingerprint, "completed": self.completed}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def finalize(self, output_path: str, schema: pa.Schema) -> None:
+        """
+        Concatenate all parts (in vertex order) into the final Parquet file, one row group
+        per part, then remove the checkpoint directory.
+
+        Without any part (empty graph), an empty table with `schema` is written instead.
+        """
+        tmp_path = output_path + ".tmp"
+        writer = None
+        try:
+            for start in sorted(self.completed):
+                part = pq.ParquetFile(self.part_path(start))
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, part.schema_arrow, compression="zstd")
+                for i in range(part.num_row_groups):
+                    writer.write_table(part.read_row_group(i))
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            pq.write_table(schema.empty_table(), tmp_path, compression="zstd")
+        os.replace(tmp_path, output_path)
+        shutil.rmtree(self.dir)
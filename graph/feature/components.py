@@ -0,0 +1,140 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from tqdm import tqdm
+from scipy.sparse.csgraph import connected_components
+from graph.feature.graph_context import GraphContext
+
+# Work units hold at most this many vertices: small components are packed together,
+# components above the limit (e.g. the giant component) are split into vertex ranges
+UNIT_MAX_VERTICES = 50_000
+
+# Context inherited by forked workers (set right before the pool is created)
+_WORKER_CTX = None
+
+
+def compute_component_plan(ctx: GraphContext) -> dict[str, np.ndarray]:
+    """
+    Weakly connected components of the whitelist-filtered graph (self-loops ignored) and
+    the work plan built on them.
+
+    A component is "trivial" when it is a star: one center linked to every other vertex and
+    no other edges (isolated vertices and isolated pairs included). Trivial components have
+    no triangles and closed-form egonets, so they bypass the per-vertex Python loops.
+
+    Returns:
+        dict of per-vertex arrays:
+            - component: component label (-1 for whitelisted vertices)
+            - trivial: True for vertices of star components
+            - unit: work unit of the remaining vertices (-1 for trivial / whitelisted)
+            - neighbor_count: distinct filtered neighbors (in + out, self excluded)
+            - degree: filtered directed edges touching the vertex (in + out, self excluded)
+    """
+    n = ctx.n
+    skip = ctx.skip_mask
+    keep = ~skip[ctx.edge_src] & ~skip[ctx.edge_dst] & (ctx.edge_src != ctx.edge_dst)
+    src, dst = ctx.edge_src[keep], ctx.edge_dst[keep]
+
+    _, labels = connected_components(
+        sp.csr_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n)),
+        directed=True, connection="weak"
+    )
+    labels = np.where(skip, -1, labels).astype(np.int64)
+
+    # Undirected simple edges: u <-> v counts once regardless of direction
+    pairs = np.unique(np.minimum(src, dst) * n + np.maximum(src, dst))
+    pair_u, pair_v = pairs // n, pairs % n
+    neighbor_count = np.bincount(pair_u, minlength=n) + np.bincount(pair_v, minlength=n)
+    degree = np.bincount(src, minlength=n) + np.bincount(dst, minlength=n)
+
+    # Star test per component: a tree (edges = size - 1) whose center touches every other vertex
+    active = labels >= 0
+    n_labels = int(labels.max()) + 1 if active.any() else 0
+    size = np.bincount(labels[active], minlength=n_labels)
+    edge_total = np.bincount(labels[pair_u], minlength=n_labels)
+    max_neighbors = np.zeros(n_labels, dtype=np.int64)
+    np.maximum.at(max_neighbors, labels[active], neighbor_count[active])
+    star = (edge_total == size - 1) & (max_neighbors == size - 1)
+
+    trivial = active & star[np.maximum(labels, 0)]
+
+    # Pack the remaining components into units, largest first
+    unit = np.full(n, -1, dtype=np.int64)
+    heavy_vids = np.flatnonzero(active & ~trivial)
+    if len(heavy_vids):
+        heavy_labels = labels[heavy_vids]
+        order = np.lexsort((heavy_vids, -size[heavy_labels]))
+        heavy_vids, heavy_labels = heavy_vids[order], heavy_labels[order]
+
+        unit_id, filled = 0, 0
+        starts = np.flatnonzero(np.r_[True, heavy_labels[1:] != heavy_labels[:-1]])
+        for start, stop in zip(starts, np.r_[starts[1:], len(heavy_vids)]):
+            members = heavy_vids[start:stop]
+            for offset in range(0, len(members), UNIT_MAX_VERTICES):
+                piece = members[offset:offset + UNIT_MAX_VERTICES]
+                if filled + len(piece) > UNIT_MAX_VERTICES:
+                    unit_id, filled = unit_id + 1, 0
+                unit[piece] = unit_id
+                filled += len(piece)
+
+    print(f"🧩 Components: {n_labels:,} weakly connected after whitelist removal, "
+          f"{int(star.sum()):,} trivial (stars / pairs / isolated), "
+          f"{int(unit.max()) + 1:,} work units for the remaining {len(heavy_vids):,} vertices")
+
+    return {
+        "component": labels,
+        "trivial": trivial,
+        "unit": unit,
+        "neighbor_count": neighbor_count,
+        "degree": degree,
+    }
+
+
+def get_component_plan(ctx: GraphContext) -> dict[str, np.ndarray]:
+    return ctx.cached("component_plan", compute_component_plan)
+
+
+def _run_worker(task):
+    fn, vids = task
+    return fn(_WORKER_CTX, vids)
+
+
+def run_component_units(ctx: GraphContext, vids: np.ndarray, fn, desc: str = None) -> list:
+    """
+    Apply `fn(ctx, vids)` to the selected non-trivial vertices, one call per work unit.
+
+    Units are independent, so with `ctx.n_jobs > 1` they run in a forked process pool
+    (workers inherit the context instead of pickling it). Where fork is unavailable
+    (e.g. Windows) or n_jobs is 1, a single serial call covers all units. `desc` labels the progress output.
+
+    Returns:
+        list of (vids, fn result) per call
+    """
+    global _WORKER_CTX
+    unit = get_component_plan(ctx)["unit"][vids]
+    vids, unit = vids[unit >= 0], unit[unit >= 0]
+    if len(vids) == 0:
+        return []
+
+    order = np.argsort(unit, kind="stable")
+    vids, unit = vids[order], unit[order]
+    starts = np.flatnonzero(np.r_[True, unit[1:] != unit[:-1]])
+    groups = np.split(vids, starts[1:])
+
+    # Serially, all units go in one call: neighborhoods shared by units are built once
+    n_jobs = min(ctx.n_jobs, len(groups))
+    if n_jobs <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        if desc:
+            print(f"{desc}: {len(vids):,} vertices")
+        return [(vids, fn(ctx, vids))]
+
+    _WORKER_CTX = ctx
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context("fork")) as pool:
+            results = list(tqdm(pool.map(_run_worker, [(fn, g) for g in groups]),
+                                total=len(groups), desc=desc, disable=desc is None))
+    finally:
+        _WORKER_CTX = None
+    return list(zip(groups, results))
@@ -0,0 +1,166 @@
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from graph.feature.graph_context import GraphContext
+from graph.feature.extract_motif_features import build_motif_membership
+
+CYCLE_KIND_PAIR = 2
+CYCLE_KIND_TRIANGLE = 3
+
+# Small row groups keep the min/max statistics selective, so a lookup by address (members)
+# or by cycle ID (cycles) only reads the row groups that can match
+INDEX_ROW_GROUP_SIZE = 65_536
+
+CYCLES_SCHEMA = pa.schema([
+    ("cycle_id", pa.int32()),
+    ("kind", pa.int8()),
+    ("node_0", pa.int32()),
+    ("node_1", pa.int32()),
+    ("node_2", pa.int32()),
+    ("amount_0", pa.float64()),
+    ("amount_1", pa.float64()),
+    ("amount_2", pa.float64()),
+    ("tx_count_0", pa.int32()),
+    ("tx_count_1", pa.int32()),
+    ("tx_count_2", pa.int32()),
+])
+
+MEMBERS_SCHEMA = pa.schema([
+    ("address", pa.string()),
+    ("node", pa.int32()),
+    ("cycle_id", pa.int32()),
+])
+
+
+def get_cycle_index_paths(month_dir: str, chain: str, year: int, month: int) -> tuple[str, str]:
+    """
+    Paths of the cycle table and of the participant index of one month.
+    """
+    return (
+        os.path.join(month_dir, f"{chain}__cycles__{year}_{month:02d}.parquet"),
+        os.path.join(month_dir, f"{chain}__cycle_members__{year}_{month:02d}.parquet"),
+    )
+
+
+def build_cycle_tables(ctx: GraphContext) -> tuple[pa.Table, pa.Table]:
+    """
+    Materialize the two-node loops and triangles found by the motif family.
+
+    Returns:
+        cycles (pa.Table): one row per loop, sorted by cycle_id
+            - kind: 2 (mutual pair) or 3 (triangle)
+            - node_0..2: vertex IDs along the loop (node_2 null for pairs); a self-loop is
+              stored as a pair with node_0 == node_1, as the motif features count it
+            - amount_i / tx_count_i: edge node_i -> node_(i+1), wrapping back to node_0
+        members (pa.Table): one row per (participant, loop), sorted by address then cycle_id
+    """
+    membership = ctx.cached("motif_membership", build_motif_membership)
+
+    # Mutual pairs are listed once per direction: keep one row per pair
+    pairs = membership["pair_nodes"].reshape(-1, 2)
+    pairs = pairs[pairs[:, 0] <= pairs[:, 1]]
+    tri = membership["tri_nodes"].reshape(-1, 3)
+    n_pairs, n_tri = len(pairs), len(tri)
+
+    pair_eids = np.column_stack([ctx.edge_ids(pairs[:, 0], pairs[:, 1]), ctx.edge_ids(pairs[:, 1], pairs[:, 0])])
+    tri_eids = np.column_stack([ctx.edge_ids(tri[:, i], tri[:, (i + 1) % 3]) for i in range(3)])
+
+    nodes = np.full((n_pairs + n_tri, 3), -1, dtype=np.int64)
+    nodes[:n_pairs, :2] = pairs
+    nodes[n_pairs:] = tri
+    eids = np.full((n_pairs + n_tri, 3), -1, dtype=np.int64)
+    eids[:n_pairs, :2] = pair_eids
+    eids[n_pairs:] = tri_eids
+    present = nodes >= 0
+
+    cycle_id = np.arange(n_pairs + n_tri, dtype=np.int32)
+    columns = {
+        "cycle_id": cycle_id,
+        "kind": np.r_[np.full(n_pairs, CYCLE_KIND_PAIR), np.full(n_tri, CYCLE_KIND_TRIANGLE)].astype(np.int8),
+    }
+    for i in range(3):
+        mask = ~present[:, i]
+        columns[f"node_{i}"] = pa.array(nodes[:, i].astype(np.int32), mask=mask)
+        columns[f"amount_{i}"] = pa.array(ctx.edge_amount[eids[:, i]], mask=mask)
+        columns[f"tx_count_{i}"] = pa.array(ctx.edge_count[eids[:, i]].astype(np.int32), mask=mask)
+    cycles = pa.table(columns, schema=CYCLES_SCHEMA)
+
+    # Participants: every distinct vertex of every loop (a self-loop has one participant)
+    distinct = present.copy()
+    distinct[:, 1] &= nodes[:, 1] != nodes[:, 0]
+    member_node = nodes[distinct]
+    member_cycle = np.broadcast_to(cycle_id[:, None], nodes.shape)[distinct]
+    member_address = ctx.addresses[member_node]
+    order = np.lexsort((member_cycle, member_address))
+    members = pa.table({
+        "address": member_address[order].astype(str),
+        "node": member_node[order].astype(np.int32),
+        "cycle_id": member_cycle[order],
+    }, schema=MEMBERS_SCHEMA)
+
+    return cycles, members
+
+
+def write_cycle_index(ctx: GraphContext, month_dir: str, chain: str, year: int, month: int) -> None:
+    """
+    Write the month's cycle table and participant index next to the feature table.
+    """
+    cycles, members = build_cycle_tables(ctx)
+    for table, path in zip((cycles, members), get_cycle_index_paths(month_dir, chain, year, month)):
+        pq.write_table(table, path + ".tmp", compression="zstd", row_group_size=INDEX_ROW_GROUP_SIZE)
+        os.replace(path + ".tmp", path)
+    print(f"🗂️ Cycle index: {cycles.num_rows:,} loops, {members.num_rows:,} memberships")
+
+
+def lookup_address_cycles(month_dir: str, chain: str, year: int, month: int, address: str) -> pd.DataFrame:
+    """
+    All two-node loops and triangles an address participates in, read through the index
+    (row groups are pruned by address, then by cycle ID) — no graph reload or re-enumeration.
+
+    Counterparty addresses are resolved from the month's feature table (node -> address)
+    when it exists.
+
+    Returns:
+        pd.DataFrame: one row per loop (cycles table columns + address_0..2)
+    """
+    cycles_path, members_path = get_cycle_index_paths(month_dir, chain, year, month)
+    if not os.path.exists(members_path):
+        raise FileNotFoundError(f"Cycle index not found: {members_path} (run feature extraction with --cycle-index)")
+
+    hits = pq.read_table(members_path, columns=["cycle_id"], filters=[("address", "=", address.lower())])
+    cycle_ids = hits.column("cycle_id").to_pylist()
+    if not cycle_ids:
+        return pd.DataFrame(columns=CYCLES_SCHEMA.names)
+
+    df = pq.read_table(cycles_path, filters=[("cycle_id", "in", cycle_ids)]).to_pandas()
+
+    features_path = os.path.join(month_dir, f"{chain}__features__{year}_{month:02d}.parquet")
+    if os.path.exists(features_path):
+        nodes = pd.unique(df[["node_0", "node_1", "node_2"]].stack().astype(np.int64))
+        lookup = pq.read_table(
+            features_path, columns=["node", "address"], filters=[("node", "in", nodes.tolist())]
+        ).to_pandas().set_index("node")["address"]
+        for i in range(3):
+            df[f"address_{i}"] = df[f"node_{i}"].map(lookup)
+
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up the loops (mutual pairs, triangles) of an address")
+    parser.add_argument("--chain", type=str, default="ethereum")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--month", type=int, required=True)
+    parser.add_argument("--address", type=str, required=True)
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    month_dir = os.path.join(base_dir, "data", "output", "graph", args.chain, f"{args.year:04d}", f"{args.month:02d}")
+
+    result = lookup_address_cycles(month_dir, args.chain, args.year, args.month, args.address)
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(result)
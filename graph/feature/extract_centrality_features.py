@@ -0,0 +1,226 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import scipy.sparse as sp
+from graph.feature.graph_context import GraphContext
+from graph.feature.feature_registry import register_feature_family
+
+PAGERANK_DAMPING = 0.85
+# Power iteration stops once the L1 change of the (sum-normalized) vector drops below this
+CENTRALITY_TOL = 1e-10
+CENTRALITY_MAX_ITER = 1000
+# Share of the uniform cold start mixed into a warm HITS hub vector (keeps every active vertex positive)
+HITS_WARM_UNIFORM_SHARE = 1e-3
+
+
+def get_centrality_state_path(month_dir: str, chain: str, year: int, month: int) -> str:
+    """
+    Path of the per-month centrality vectors (address, pagerank, hub, authority) that seed the next month.
+    """
+    return os.path.join(month_dir, f"{chain}__centrality_state__{year}_{month:02d}.parquet")
+
+
+def get_previous_state_path(ctx: GraphContext) -> str | None:
+    """
+    Centrality state of the month before ctx's month (None if the period is unknown).
+    Month folders live under <chain>/<YYYY>/<MM>/, so the previous month is two levels up.
+    """
+    if not (ctx.graph_path and ctx.chain and ctx.year and ctx.month):
+        return None
+    year, month = (ctx.year - 1, 12) if ctx.month == 1 else (ctx.year, ctx.month - 1)
+    chain_dir = os.path.dirname(os.path.dirname(os.path.dirname(ctx.graph_path)))
+    month_dir = os.path.join(chain_dir, f"{year:04d}", f"{month:02d}")
+    return get_centrality_state_path(month_dir, ctx.chain, year, month)
+
+
+def build_weighted_adjacency(ctx: GraphContext) -> sp.csr_matrix:
+    """
+    Sparse amount-weighted adjacency W[u, v] = aggregated amount u → v on the whitelist-filtered
+    graph (edges touching whitelisted vertices and self-loops are dropped).
+    """
+    keep = ~ctx.skip_mask[ctx.edge_src] & ~ctx.skip_mask[ctx.edge_dst] & (ctx.edge_src != ctx.edge_dst)
+    return sp.csr_matrix(
+        (ctx.edge_amount[keep], (ctx.edge_src[keep], ctx.edge_dst[keep])),
+        shape=(ctx.n, ctx.n)
+    )
+
+
+def _normalized(x: np.ndarray, fallback: np.ndarray) -> np.ndarray:
+    total = x.sum()
+    return x / total if total > 0 else fallback.copy()
+
+
+def pagerank(W: sp.csr_matrix, active: np.ndarray, x0: np.ndarray = None, damping: float = PAGERANK_DAMPING,
+             tol: float = CENTRALITY_TOL, max_iter: int = CENTRALITY_MAX_ITER) -> tuple[np.ndarray, int]:
+    """
+    Weighted PageRank by sparse power iteration.
+
+    Transition probabilities are proportional to the outgoing amounts; dangling vertices and the
+    teleport step spread uniformly over the active (non-whitelisted) vertices.
+
+    Returns:
+        (pagerank vector summing to 1 over active vertices, iterations used)
+    """
+    teleport = _normalized(active.astype(np.float64), np.zeros(len(active)))
+    out_weight = np.asarray(W.sum(axis=1)).ravel()
+    dangling = active & (out_weight == 0)
+    inv_weight = np.divide(1.0, out_weight, out=np.zeros_like(out_weight), where=out_weight > 0)
+    transition_t = (sp.diags(inv_weight) @ W).T.tocsr()
+
+    x = teleport.copy() if x0 is None else _normalized(np.where(active, x0, 0.0), teleport)
+    for iteration in range(1, max_iter + 1):
+        x_new = damping * (transition_t @ x) + (damping * x[dangling].sum() + 1.0 - damping) * teleport
+        err = np.abs(x_new - x).sum()
+        x = x_new
+        if err < tol:
+            break
+    return x, iteration
+
+
+def hits(W: sp.csr_matrix, active: np.ndarray, h0: np.ndarray = None,
+         tol: float = CENTRALITY_TOL, max_iter: int = CENTRALITY_MAX_ITER) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Weighted HITS by sparse power iteration (authority = Wᵀ·hub, hub = W·authority),
+    both vectors normalized to sum 1.
+
+    Returns:
+        (hub, authority, iterations used)
+    """
+    uniform = _normalized(active.astype(np.float64), np.zeros(len(active)))
+    W_t = W.T.tocsr()
+
+    h = uniform.copy() if h0 is None else _normalized(np.where(active, h0, 0.0), uniform)
+    a = uniform.copy()
+    for iteration in range(1, max_iter + 1):
+        a = _normalized(W_t @ h, np.zeros_like(h))
+        h_new = _normalized(W @ a, np.zeros_like(h))
+        err = np.abs(h_new - h).sum()
+        h = h_new
+        if err < tol:
+            break
+    return h, a, iteration
+
+
+def load_warm_start(ctx: GraphContext, state_path: str) -> dict[str, np.ndarray] | None:
+    """
+    Previous month's vectors aligned to ctx's vertex IDs.
+
+    Addresses present in both months start from last month's PageRank; new addresses from the
+    minimum PageRank (1 - d) / n (what a vertex without senders gets). PageRank has a unique fixed
+    point, so its start only changes the iteration count.
+
+    HITS does not: power iteration never moves mass into a part of the graph that starts at zero,
+    so a small share (HITS_WARM_UNIFORM_SHARE) of the uniform cold start is mixed into last
+    month's hub vector. Every active vertex starts positive, so the warm start converges to the
+    same vectors as a cold one, while the start stays close to last month's fixed point.
+    """
+    if not state_path or not os.path.exists(state_path):
+        return None
+
+    prev = pq.read_table(state_path, columns=["address", "pagerank", "hub"]).to_pandas()
+    pos = pd.Index(prev["address"]).get_indexer(ctx.addresses)
+    matched = (pos >= 0) & ~ctx.skip_mask
+    n_active = max(1, int((~ctx.skip_mask).sum()))
+
+    pr0 = np.full(ctx.n, (1.0 - PAGERANK_DAMPING) / n_active)
+    pr0[matched] = prev["pagerank"].to_numpy()[pos[matched]]
+    hub0 = np.zeros(ctx.n)
+    hub0[matched] = prev["hub"].to_numpy()[pos[matched]]
+    uniform = _normalized((~ctx.skip_mask).astype(np.float64), np.zeros(ctx.n))
+    hub0 = (1.0 - HITS_WARM_UNIFORM_SHARE) * _normalized(hub0, uniform) + HITS_WARM_UNIFORM_SHARE * uniform
+
+    print(f"♨️ Warm start from {os.path.basename(state_path)}: {int(matched.sum()):,} / {n_active:,} addresses matched")
+    return {"pagerank": pr0, "hub": hub0}
+
+
+def compute_centrality(ctx: GraphContext, warm_start: bool = True) -> dict[str, np.ndarray]:
+    """
+    PageRank / HITS vectors of the whole filtered graph, warm-started from the previous month
+    when its state file exists (this month's state is written by write_centrality_state).
+
+    Returns:
+        dict with "pagerank", "hub", "authority" arrays (NaN for whitelisted vertices)
+    """
+    W = build_weighted_adjacency(ctx)
+    active = ~ctx.skip_mask
+    init = load_warm_start(ctx, get_previous_state_path(ctx)) if warm_start else None
+    start_mode = "warm" if init is not None else "cold"
+
+    t0 = time.perf_counter()
+    pr, pr_iter = pagerank(W, active, x0=init["pagerank"] if init else None)
+    t1 = time.perf_counter()
+    hub, authority, hits_iter = hits(W, active, h0=init["hub"] if init else None)
+    t2 = time.perf_counter()
+
+    print(f"🔁 PageRank ({start_mode} start): {pr_iter} iterations in {t1 - t0:.2f}s")
+    print(f"🔁 HITS ({start_mode} start): {hits_iter} iterations in {t2 - t1:.2f}s")
+
+    return {
+        "pagerank": np.where(active, pr, np.nan),
+        "hub": np.where(active, hub, np.nan),
+        "authority": np.where(active, authority, np.nan),
+    }
+
+
+def write_centrality_state(ctx: GraphContext, df: pd.DataFrame) -> None:
+    """
+    Save the month's vectors (address, pagerank, hub, authority of the non-whitelisted vertices)
+    to seed the next month. Runs on the family's features whether they were just computed or
+    reused from the feature store, so a cached month still leaves its state file behind.
+    """
+    if not (ctx.graph_path and ctx.chain and ctx.year and ctx.month):
+        return
+    active = ~ctx.skip_mask[df.index.to_numpy()]
+    state = pa.table({
+        "address": ctx.addresses[df.index.to_numpy()[active]].astype(str),
+        "pagerank": df["pagerank"].to_numpy(dtype=np.float64)[active],
+        "hub": df["hub_score"].to_numpy(dtype=np.float64)[active],
+        "authority": df["authority_score"].to_numpy(dtype=np.float64)[active],
+    })
+    state_path = get_centrality_state_path(os.path.dirname(ctx.graph_path), ctx.chain, ctx.year, ctx.month)
+    pq.write_table(state, state_path + ".tmp", compression="zstd")
+    os.replace(state_path + ".tmp", state_path)
+
+
+CENTRALITY_FEATURE_SCHEMA = {
+    "pagerank": pa.float32(),
+    "hub_score": pa.float32(),
+    "authority_score": pa.float32(),
+}
+
+
+@register_feature_family("centrality", version=2, description="🌐 centrality", schema=CENTRALITY_FEATURE_SCHEMA,
+                         persist=write_centrality_state)
+def extract_centrality_features(ctx: GraphContext, vids: np.ndarray = None) -> pd.DataFrame:
+    """
+    Extract amount-weighted PageRank / HITS scores on the whitelist-filtered graph.
+
+    Parameters:
+        ctx (GraphContext): Shared per-graph context (chain/year/month locate last month's state)
+        vids (np.ndarray): Vertex IDs to compute (default: all vertices)
+
+    Returns:
+        pd.DataFrame: Centrality features indexed by node ID
+
+    Definitions (edges weighted by aggregated amount, whitelisted vertices and self-loops removed):
+      - pagerank: weighted PageRank (damping 0.85), summing to 1 over non-whitelisted vertices
+      - hub_score: HITS hub score (sends large amounts to strong authorities), sums to 1
+      - authority_score: HITS authority score (receives large amounts from strong hubs), sums to 1
+    """
+    vids = ctx.vertex_ids(vids)
+    centrality = ctx.cached("centrality", compute_centrality)
+
+    df = pd.DataFrame({
+        "pagerank": centrality["pagerank"][vids],
+        "hub_score": centrality["hub"][vids],
+        "authority_score": centrality["authority"][vids],
+    }, index=pd.Index(vids, name="node"))
+
+    # Whitelisted nodes: NaN for every feature
+    df.loc[ctx.skip_mask[vids]] = np.nan
+
+    return df
@@ -1,63 +1,32 @@
+import numpy as np
 import pandas as pd
-from igraph import Graph
-from tqdm import tqdm
-from graph.feature.graph_utils import load_whitelist_addresses
+import pyarrow as pa
+from graph.feature.graph_context import GraphContext
+from graph.feature.feature_registry import register_feature_family
+from graph.feature.components import get_component_plan, run_component_units
 
-def extract_egonet_features(g: Graph, whitelist_path: str = None) -> pd.DataFrame:
-    """
-    Extract egonet-based features from the graph (node count, edge count, density),
-    skipping nodes in the whitelist.
-
-    Parameters:
-        g (igraph.Graph): Directed igraph object
-        whitelist_path (str): Path to CSV file with whitelist addresses
-
-    Returns:
-        pd.DataFrame: Egonet features indexed by node ID
-    
-    Definitions:
-        - egonet_node_count (n): |ego(v)|
-        - egonet_edge_count (m): number of directed edges whose both endpoints lie in ego(v),
-                                 excluding self-loops
-        - egonet_density: m / [n * (n - 1)]  (density of a simple directed graph without self-loops)
 
+def _egonet_counts(ctx: GraphContext, vids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
     """
-    # === Load whitelist
-    whitelist_set = load_whitelist_addresses(whitelist_path) if whitelist_path else set()
-
-    # === Build a mapping from address label to vertex ID
-    address_to_vid = {v["label"]: v.index for v in g.vs}
-
-    # === Map whitelisted addresses to vertex IDs
-    #     These infra nodes will be skipped in egonet feature calculation
-    skip_vids = set(address_to_vid[a] for a in whitelist_set if a in address_to_vid)
-
-    N = g.vcount()
+    Egonet node / edge counts of non-whitelisted vertices by set intersection.
+    """
+    skip = ctx.skip_mask
 
-    # Precompute adjacency sets for all nodes:
+    # Adjacency sets of this unit (and its 1-hop neighbors):
     #   neighbors_all[v] = all neighbors of v (in + out)
     #   neighbors_out[v] = outgoing neighbors of v
-    # Doing this once avoids repeated g.neighbors() calls inside the loop
-    neighbors_all = [set(g.neighbors(v, mode="ALL")) for v in range(N)]
-    neighbors_out = [set(g.neighbors(v, mode="OUT")) for v in range(N)]
-
-    rows = []
-    for vid in tqdm(range(N), desc="🧠 Extracting Egonet Features (fast)"):
-        if vid in skip_vids: # Skip whitelist center nodes
-            rows.append({
-                "node": vid,
-                "egonet_node_count": None,
-                "egonet_edge_count": None,
-                "egonet_density": None
-            })
-            continue  
+    neighbors_all = ctx.neighbor_sets(vids, "all")
+    ego_vids = set(vids.tolist()).union(*neighbors_all.values())
+    neighbors_out = ctx.neighbor_sets(sorted(ego_vids), "out")
+
+    node_count = np.zeros(len(vids), dtype=np.int64)
+    edge_count = np.zeros(len(vids), dtype=np.int64)
 
+    for i, vid in enumerate(vids.tolist()):
         # 1-hop ego nodes (all directions), exclude whitelist, and include the node itself
-        ego_nodes = {n for n in neighbors_all[vid] if n not in skip_vids}
+        ego_nodes = {u for u in neighbors_all[vid] if not skip[u]}
         ego_nodes.add(vid)
 
-        n = len(ego_nodes)
-    
         # Count the number of unique directed edges inside the egonet:
         # For each node u in the egonet:
         #   1. Look at all its outgoing neighbors (out_u).
@@ -74,14 +43,69 @@ def extract_egonet_features(g: Graph, whitelist_path: str = None) -> pd.DataFram
                 m_u -= 1
             m += m_u
 
-        max_edges = n * (n - 1)  # directed simple graph
-        density = m / max_edges if max_edges > 0 else 0.0
+        node_count[i] = len(ego_nodes)
+        edge_count[i] = m
+
+    return node_count, edge_count
+
+
+EGONET_FEATURE_SCHEMA = {
+    "egonet_node_count": pa.int32(),
+    "egonet_edge_count": pa.int32(),
+    "egonet_density": pa.float32(),
+}
+
+
+@register_feature_family("egonet", version=1, description="🕸️ egonet-level", schema=EGONET_FEATURE_SCHEMA)
+def extract_egonet_features(ctx: GraphContext, vids: np.ndarray = None) -> pd.DataFrame:
+    """
+    Extract egonet-based features from the graph (node count, edge count, density),
+    skipping nodes in the whitelist.
+
+    Parameters:
+        ctx (GraphContext): Shared per-graph context (neighbor sets, whitelist mask)
+        vids (np.ndarray): Vertex IDs to compute (default: all vertices)
+
+    Returns:
+        pd.DataFrame: Egonet features indexed by node ID
+
+    Definitions:
+        - egonet_node_count (n): |ego(v)|
+        - egonet_edge_count (m): number of directed edges whose both endpoints lie in ego(v),
+                                 excluding self-loops
+        - egonet_density: m / [n * (n - 1)]  (density of a simple directed graph without self-loops)
+
+    """
+    show_progress = vids is None
+    vids = ctx.vertex_ids(vids)
+    skip = ctx.skip_mask
+    plan = get_component_plan(ctx)
+
+    node_count = np.full(len(vids), np.nan)
+    edge_count = np.full(len(vids), np.nan)
+
+    # === Fast path: in a star component (incl. isolated vertices / pairs) no two neighbors
+    # of a vertex are linked, so the egonet is the vertex, its neighbors and its own edges
+    trivial = plan["trivial"][vids]
+    node_count[trivial] = plan["neighbor_count"][vids[trivial]] + 1
+    edge_count[trivial] = plan["degree"][vids[trivial]]
+
+    # === Remaining components: per-vertex set intersections, one call per work unit
+    position = pd.Index(vids)
+    units = run_component_units(ctx, vids[~trivial & ~skip[vids]], _egonet_counts,
+                                desc="🧠 Extracting Egonet Features (fast)" if show_progress else None)
+    for unit_vids, (n, m) in units:
+        idx = position.get_indexer(unit_vids)
+        node_count[idx] = n
+        edge_count[idx] = m
 
-        rows.append({
-            "node": vid,
-            "egonet_node_count": n,
-            "egonet_edge_count": m,
-            "egonet_density": density,
-        })
+    max_edges = node_count * (node_count - 1)  # directed simple graph
+    with np.errstate(invalid="ignore", divide="ignore"):
+        density = np.where(max_edges > 0, edge_count / max_edges, 0.0)
+    density[np.isnan(node_count)] = np.nan
 
-    return pd.DataFrame(rows).set_index("node")
+    return pd.DataFrame({
+        "egonet_node_count": node_count,
+        "egonet_edge_count": edge_count,
+        "egonet_density": density,
+    }, index=pd.Index(vids, name="node"))
@@ -0,0 +1,245 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from graph.feature.graph_context import GraphContext, group_by_vertex, gather_segments, segment_sums
+from graph.feature.feature_registry import register_feature_family
+from graph.feature.components import run_component_units
+
+# Cycle lengths counted by this family (2- and 3-cycles live in the motif family)
+KCYCLE_LENGTHS = (4, 5)
+# Per-root work budget: partial paths + closing candidates materialized while enumerating
+# the cycles rooted at one vertex. Roots above the budget stop early and are flagged.
+KCYCLE_WORK_BUDGET = 20_000
+# Upper bound of work (partial paths + closing candidates) per batch of roots
+MAX_PATHS_PER_BATCH = 5_000_000
+
+LENGTH_NAMES = {4: "four", 5: "five"}
+
+
+def build_cycle_graph(ctx: GraphContext) -> dict[str, np.ndarray]:
+    """
+    Pruned adjacency on which every directed cycle of the filtered graph lives.
+
+    Pruning: whitelisted vertices and self-loops are dropped, then every edge between different
+    strongly connected components — the fixed point of repeatedly removing vertices with zero
+    in- or out-degree. Vertices are ranked by ascending degree in the pruned graph (ties by ID).
+
+    Returns:
+        dict with rank per vertex (-1 if pruned away) and the pruned out/in CSR
+        (indptr, neighbor, edge ID)
+    """
+    n = ctx.n
+    skip = ctx.skip_mask
+    keep = ~skip[ctx.edge_src] & ~skip[ctx.edge_dst] & (ctx.edge_src != ctx.edge_dst)
+
+    _, scc = connected_components(
+        sp.csr_matrix((np.ones(int(keep.sum()), dtype=np.int8), (ctx.edge_src[keep], ctx.edge_dst[keep])),
+                      shape=(n, n)),
+        directed=True, connection="strong"
+    )
+    eid = np.flatnonzero(keep)
+    eid = eid[scc[ctx.edge_src[eid]] == scc[ctx.edge_dst[eid]]]
+    src, dst = ctx.edge_src[eid], ctx.edge_dst[eid]
+
+    degree = np.bincount(src, minlength=n) + np.bincount(dst, minlength=n)
+    alive = degree > 0
+    rank = np.full(n, -1, dtype=np.int64)
+    alive_vids = np.flatnonzero(alive)
+    rank[alive_vids[np.lexsort((alive_vids, degree[alive_vids]))]] = np.arange(len(alive_vids))
+
+    out_indptr, out_order = group_by_vertex(src, n)
+    in_indptr, in_order = group_by_vertex(dst, n)
+    out_indices = dst[out_order]
+    out_degree, in_degree = np.diff(out_indptr), np.diff(in_indptr)
+
+    # Upper bound of the enumeration work per root (paths of up to 3 hops, each closed through
+    # the root's in-neighbors), ignoring the rank filter; used to size batches of roots
+    def hop_sums(values):
+        lengths, pos = gather_segments(out_indptr, np.arange(n))
+        return segment_sums(values[out_indices[pos]], lengths)
+    paths = out_degree + hop_sums(out_degree + hop_sums(out_degree))
+    work_bound = paths * (1 + in_degree)
+
+    return {
+        "rank": rank,
+        "out_degree": out_degree, "in_degree": in_degree, "work_bound": work_bound,
+        "out_indptr": out_indptr, "out_indices": out_indices, "out_eids": eid[out_order],
+        "in_indptr": in_indptr, "in_indices": src[in_order], "in_eids": eid[in_order],
+    }
+
+
+def _cycles_from_roots(ctx: GraphContext, roots: np.ndarray, max_k: int = max(KCYCLE_LENGTHS),
+                       budget: int = KCYCLE_WORK_BUDGET) -> dict[str, np.ndarray]:
+    """
+    Enumerate the directed k-cycles (k in KCYCLE_LENGTHS) whose canonical root is in `roots`.
+
+    The canonical root of a cycle is its lowest-rank (lowest-degree) vertex, so each cycle is
+    found exactly once: paths grow from the root through vertices of higher rank only, and are
+    closed through the root's in-neighbors (cheap, as the root has the lowest degree on the cycle).
+    Roots are processed in batches with vectorized frontier expansion.
+
+    Returns:
+        dict with, per k: cycles<k> (m x k vertex IDs), eids<k> (m x k edge IDs); and
+        exhausted: roots whose enumeration hit the work budget
+    """
+    cg = ctx.cached("kcycle_graph", build_cycle_graph)
+    rank = cg["rank"]
+    found = {k: ([], []) for k in KCYCLE_LENGTHS}
+    exhausted = []
+
+    roots = roots[rank[roots] >= 0]
+    # Batches of roots whose bounded work (each root stops at the budget) fits MAX_PATHS_PER_BATCH
+    batch_id = np.cumsum(np.minimum(cg["work_bound"][roots], budget)) // MAX_PATHS_PER_BATCH
+
+    for b in np.unique(batch_id):
+        batch = roots[batch_id == b]
+        work = np.zeros(len(batch), dtype=np.int64)
+        dropped = np.zeros(len(batch), dtype=bool)
+
+        # Partial paths: owner (root position in batch), vertices (m x j), edge IDs (m x j-1)
+        owner = np.arange(len(batch))
+        verts = batch[:, None]
+        eids = np.empty((len(batch), 0), dtype=np.int64)
+
+        def within_budget(owner, lengths):
+            # Charge the expansion to each root; drop every path of roots over budget
+            work[:] += np.bincount(owner, weights=lengths, minlength=len(batch)).astype(np.int64)
+            dropped[:] |= work > budget
+            return ~dropped[owner]
+
+        for j in range(1, max_k):
+            if len(owner) == 0:
+                break
+            root = verts[:, 0]
+
+            # === Close cycles of length j + 1: c in in(root), last -> c must exist
+            k = j + 1
+            if k in KCYCLE_LENGTHS:
+                ok = within_budget(owner, cg["in_degree"][root])
+                lengths, pos = gather_segments(cg["in_indptr"], root[ok])
+                rows = np.repeat(np.flatnonzero(ok), lengths)
+                c, c_eid = cg["in_indices"][pos], cg["in_eids"][pos]
+
+                valid = rank[c] > rank[verts[rows, 0]]
+                for col in range(1, j):
+                    valid &= c != verts[rows, col]
+                rows, c, c_eid = rows[valid], c[valid], c_eid[valid]
+
+                last_eid = ctx.edge_ids(verts[rows, -1], c)
+                closed = last_eid >= 0
+                rows, c, c_eid, last_eid = rows[closed], c[closed], c_eid[closed], last_eid[closed]
+
+                found[k][0].append(np.column_stack([verts[rows], c]))
+                found[k][1].append(np.column_stack([eids[rows], last_eid, c_eid]))
+
+            if j == max_k - 1:
+                break
+
+            # === Extend paths by one hop through higher-rank vertices not yet on the path
+            ok = within_budget(owner, cg["out_degree"][verts[:, -1]])
+            owner, verts, eids = owner[ok], verts[ok], eids[ok]
+            lengths, pos = gather_segments(cg["out_indptr"], verts[:, -1])
+            rows = np.repeat(np.arange(len(owner)), lengths)
+            nxt, nxt_eid = cg["out_indices"][pos], cg["out_eids"][pos]
+
+            valid = rank[nxt] > rank[verts[rows, 0]]
+            for col in range(1, j):
+                valid &= nxt != verts[rows, col]
+            rows, nxt, nxt_eid = rows[valid], nxt[valid], nxt_eid[valid]
+
+            owner = owner[rows]
+            verts = np.column_stack([verts[rows], nxt])
+            eids = np.column_stack([eids[rows], nxt_eid])
+
+        exhausted.append(batch[dropped])
+
+    result = {"exhausted": np.concatenate(exhausted) if exhausted else np.empty(0, dtype=np.int64)}
+    for k, (cycles, cycle_eids) in found.items():
+        result[f"cycles{k}"] = np.concatenate(cycles) if cycles else np.empty((0, k), dtype=np.int64)
+        result[f"eids{k}"] = np.concatenate(cycle_eids) if cycle_eids else np.empty((0, k), dtype=np.int64)
+    return result
+
+
+def build_kcycle_membership(ctx: GraphContext) -> dict[str, np.ndarray]:
+    """
+    Enumerate 4- and 5-cycles once per graph (per component work unit) and group them by
+    participant, like the motif family does for triangles.
+
+    Returns:
+        dict with, for each k: c<k>_indptr (CSR offsets by vertex), c<k>_amount / c<k>_tx_count
+        (per-membership totals in CSR order); and exhausted (0/1 per vertex)
+    """
+    cg = ctx.cached("kcycle_graph", build_cycle_graph)
+    roots = np.flatnonzero(cg["rank"] >= 0)
+    units = run_component_units(ctx, roots, _cycles_from_roots, desc="🔄 Enumerating 4/5-cycles (bounded)")
+
+    membership = {"exhausted": np.zeros(ctx.n, dtype=np.int8)}
+    for k in KCYCLE_LENGTHS:
+        cycles = np.concatenate([r[f"cycles{k}"] for _, r in units] + [np.empty((0, k), dtype=np.int64)])
+        cycle_eids = np.concatenate([r[f"eids{k}"] for _, r in units] + [np.empty((0, k), dtype=np.int64)])
+        amount = ctx.edge_amount[cycle_eids].sum(axis=1)
+        tx_count = ctx.edge_count[cycle_eids].sum(axis=1)
+
+        # Every cycle is credited to all k participants
+        indptr, order = group_by_vertex(cycles.T.ravel(), ctx.n)
+        membership[f"c{k}_indptr"] = indptr
+        membership[f"c{k}_amount"] = np.tile(amount, k)[order]
+        membership[f"c{k}_tx_count"] = np.tile(tx_count, k)[order]
+        print(f"🔄 {len(cycles):,} directed {k}-cycles")
+
+    for _, r in units:
+        membership["exhausted"][r["exhausted"]] = 1
+    return membership
+
+
+KCYCLE_FEATURE_SCHEMA = {
+    "four_node_loop_count": pa.int32(),
+    "four_node_loop_amount": pa.float64(),
+    "four_node_loop_tx_count": pa.int32(),
+    "five_node_loop_count": pa.int32(),
+    "five_node_loop_amount": pa.float64(),
+    "five_node_loop_tx_count": pa.int32(),
+    "k_cycle_budget_exhausted": pa.int8(),
+}
+
+
+@register_feature_family("kcycle", version=1, description="🔄 k-cycle", schema=KCYCLE_FEATURE_SCHEMA)
+def extract_kcycle_features(ctx: GraphContext, vids: np.ndarray = None) -> pd.DataFrame:
+    """
+    Extract directed 4- and 5-cycle features on the whitelist-filtered graph.
+
+    Parameters:
+        ctx (GraphContext): Shared per-graph context
+        vids (np.ndarray): Vertex IDs to compute (default: all vertices)
+
+    Returns:
+        pd.DataFrame: k-cycle features indexed by node ID
+
+    Definitions (simple directed cycles: k distinct vertices, no self-loops):
+      - four_node_loop_count: number of distinct directed 4-cycles (a -> b -> c -> d -> a) the node is on
+      - four_node_loop_amount / _tx_count: sum of amounts / transfer counts over the 4 edges,
+        accumulated to each participant
+      - five_node_loop_*: same for directed 5-cycles
+      - k_cycle_budget_exhausted: 1 if enumerating the cycles rooted at this node hit
+        KCYCLE_WORK_BUDGET; counts of the node and of its cycle partners are then lower bounds
+    """
+    vids = ctx.vertex_ids(vids)
+    membership = ctx.cached("kcycle_membership", build_kcycle_membership)
+
+    columns = {}
+    for k in KCYCLE_LENGTHS:
+        name = LENGTH_NAMES[k]
+        count, pos = gather_segments(membership[f"c{k}_indptr"], vids)
+        columns[f"{name}_node_loop_count"] = count
+        columns[f"{name}_node_loop_amount"] = segment_sums(membership[f"c{k}_amount"][pos], count)
+        columns[f"{name}_node_loop_tx_count"] = segment_sums(membership[f"c{k}_tx_count"][pos], count)
+    columns["k_cycle_budget_exhausted"] = membership["exhausted"][vids]
+
+    df = pd.DataFrame(columns, index=pd.Index(vids, name="node"), dtype=np.float64)
+
+    # Whitelisted nodes: NaN for every feature
+    df.loc[ctx.skip_mask[vids]] = np.nan
+
+    return df
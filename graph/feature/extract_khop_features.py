@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from graph.feature.graph_context import GraphContext, gather_segments, segment_sums
+from graph.feature.feature_registry import register_feature_family
+
+# Per-vertex cap on the 2-hop expansion (sum of the out-degrees of its out-neighbors).
+# Vertices above the cap count the distinct targets of the first MAX_FRONTIER_PER_VERTEX
+# expanded entries only (a lower bound on the reach) and are flagged.
+MAX_FRONTIER_PER_VERTEX = 200_000
+# Upper bound of (source, target) pairs materialized at once while expanding a batch
+MAX_PAIRS_PER_BATCH = 5_000_000
+# Infra distance is searched up to this many hops; farther vertices get null
+INFRA_MAX_HOPS = 3
+
+
+def compute_infra_distance(ctx: GraphContext, max_hops: int = INFRA_MAX_HOPS) -> np.ndarray:
+    """
+    Undirected hop distance from every vertex to its nearest whitelisted (infra) vertex.
+
+    Multi-source frontier expansion over the CSR arrays: all infra vertices start at
+    distance 0, and each round expands the whole frontier at once with a visited bitmap.
+
+    Returns:
+        np.ndarray[float64]: distance per vertex (0 for infra, NaN if farther than max_hops)
+    """
+    distance = np.full(ctx.n, np.nan)
+    visited = ctx.skip_mask.copy()
+    frontier = np.flatnonzero(visited)
+    distance[frontier] = 0
+
+    for hop in range(1, max_hops + 1):
+        if len(frontier) == 0:
+            break
+        _, out_pos = gather_segments(ctx.out_indptr, frontier)
+        _, in_pos = gather_segments(ctx.in_indptr, frontier)
+        neighbors = np.concatenate([ctx.out_indices[out_pos], ctx.in_indices[in_pos]])
+
+        neighbors = neighbors[~visited[neighbors]]
+        frontier = np.unique(neighbors)
+        visited[frontier] = True
+        distance[frontier] = hop
+
+    return distance
+
+
+def compute_filtered_inflow(ctx: GraphContext) -> np.ndarray:
+    """
+    Total amount each vertex receives from non-whitelisted senders.
+    """
+    keep = ~ctx.skip_mask[ctx.edge_src]
+    return np.bincount(ctx.edge_dst[keep], weights=ctx.edge_amount[keep], minlength=ctx.n)
+
+
+def _khop_state(ctx: GraphContext) -> dict[str, np.ndarray]:
+    return {
+        "infra_distance": compute_infra_distance(ctx),
+        "filtered_inflow": compute_filtered_inflow(ctx),
+    }
+
+
+def _capped_two_hop_reach(ctx: GraphContext, v: int) -> int:
+    """
+    Lower bound on the 2-hop reach of a vertex above MAX_FRONTIER_PER_VERTEX: distinct
+    non-whitelisted targets among the first MAX_FRONTIER_PER_VERTEX entries of its expansion
+    (hop-1 targets first, then the out-neighbors of each hop-1 target in CSR order).
+    """
+    skip = ctx.skip_mask
+    w = ctx.successors(v)
+    w = w[~skip[w]][:MAX_FRONTIER_PER_VERTEX]
+
+    # Whole hop-2 segments while they fit in the remaining budget, then part of the next one
+    budget = MAX_FRONTIER_PER_VERTEX - len(w)
+    fits = int(np.searchsorted(np.cumsum(np.diff(ctx.out_indptr)[w]), budget, side="right"))
+    _, pos = gather_segments(ctx.out_indptr, w[:fits])
+    targets = [w, ctx.out_indices[pos]]
+    if fits < len(w):
+        targets.append(ctx.successors(w[fits])[:budget - len(pos)])
+
+    targets = np.concatenate(targets)
+    return len(np.unique(targets[~skip[targets] & (targets != v)]))
+
+
+def _two_hop_reach(ctx: GraphContext, vids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Number of distinct non-whitelisted vertices reachable from each vertex in 1 or 2 out-hops
+    (excluding the vertex itself), on the whitelist-filtered graph.
+
+    Sources are expanded in batches of bounded size: hop-1 and hop-2 targets are materialized
+    as (source, target) keys and deduplicated with one vectorized unique per batch. Sources
+    above MAX_FRONTIER_PER_VERTEX get a lower bound instead (see _capped_two_hop_reach).
+    """
+    skip = ctx.skip_mask
+    out_degree = np.diff(ctx.out_indptr)
+
+    # Expansion cost of each source = sum of out-degrees of its out-neighbors
+    hop1_len, hop1_pos = gather_segments(ctx.out_indptr, vids)
+    cost = segment_sums(out_degree[ctx.out_indices[hop1_pos]], hop1_len) + hop1_len
+
+    capped = cost > MAX_FRONTIER_PER_VERTEX
+    reach = np.zeros(len(vids), dtype=np.int64)
+    for i in np.flatnonzero(capped):
+        reach[i] = _capped_two_hop_reach(ctx, vids[i])
+
+    exact_idx = np.flatnonzero(~capped)
+    batch_id = np.cumsum(cost[exact_idx]) // MAX_PAIRS_PER_BATCH
+    for b in np.unique(batch_id):
+        local = exact_idx[batch_id == b]
+        sources = vids[local]
+
+        # hop 1: (source, w)
+        len1, pos1 = gather_segments(ctx.out_indptr, sources)
+        src1 = np.repeat(np.arange(len(sources)), len1)
+        w = ctx.out_indices[pos1]
+        keep1 = ~skip[w]
+        src1, w = src1[keep1], w[keep1]
+
+        # hop 2: (source, x) for x in out(w)
+        len2, pos2 = gather_segments(ctx.out_indptr, w)
+        src2 = np.repeat(src1, len2)
+        x = ctx.out_indices[pos2]
+
+        src_all = np.concatenate([src1, src2])
+        tgt_all = np.concatenate([w, x])
+        keep = ~skip[tgt_all] & (tgt_all != sources[src_all])
+
+        keys = np.unique(src_all[keep] * ctx.n + tgt_all[keep])
+        reach[local] = np.bincount(keys // ctx.n, minlength=len(sources))
+
+    return reach, capped
+
+
+KHOP_FEATURE_SCHEMA = {
+    "two_hop_reach_count": pa.int32(),
+    "two_hop_reach_capped": pa.int8(),
+    "two_hop_inflow_amount": pa.float64(),
+    "infra_distance": pa.int8(),
+}
+
+
+@register_feature_family("khop", version=2, description="🧭 k-hop neighborhood", schema=KHOP_FEATURE_SCHEMA)
+def extract_khop_features(ctx: GraphContext, vids: np.ndarray = None) -> pd.DataFrame:
+    """
+    Extract bounded-depth (2-hop) neighborhood features on the whitelist-filtered graph.
+
+    Parameters:
+        ctx (GraphContext): Shared per-graph context (CSR adjacency, whitelist mask)
+        vids (np.ndarray): Vertex IDs to compute (default: all vertices)
+
+    Returns:
+        pd.DataFrame: k-hop features indexed by node ID
+
+    Definitions:
+      - two_hop_reach_count: distinct vertices reachable in 1 or 2 outgoing hops (excluding the node)
+      - two_hop_reach_capped: 1 if the 2-hop expansion exceeded MAX_FRONTIER_PER_VERTEX; the count is
+        then a lower bound (distinct targets of the first MAX_FRONTIER_PER_VERTEX expanded entries)
+      - two_hop_inflow_amount: total amount received by the node's direct senders,
+        i.e. the volume entering the node 2 hops upstream
+      - infra_distance: undirected hop distance to the nearest whitelisted (infra) vertex,
+        null if farther than INFRA_MAX_HOPS
+    """
+    vids = ctx.vertex_ids(vids)
+    state = ctx.cached("khop_state", _khop_state)
+
+    reach, capped = _two_hop_reach(ctx, vids)
+
+    # 2-hop inflow: sum of the filtered inflow of every non-whitelisted in-neighbor
+    in_len, in_pos = gather_segments(ctx.in_indptr, vids)
+    senders = ctx.in_indices[in_pos]
+    inflow = np.where(ctx.skip_mask[senders], 0.0, state["filtered_inflow"][senders])
+    two_hop_inflow = segment_sums(inflow, in_len)
+
+    df = pd.DataFrame({
+        "two_hop_reach_count": reach.astype(np.float64),
+        "two_hop_reach_capped": capped.astype(np.float64),
+        "two_hop_inflow_amount": two_hop_inflow,
+        "infra_distance": state["infra_distance"][vids],
+    }, index=pd.Index(vids, name="node"))
+
+    # Whitelisted nodes: NaN for every feature
+    df.loc[ctx.skip_mask[vids]] = np.nan
+
+    return df
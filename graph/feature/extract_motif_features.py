@@ -1,21 +1,155 @@
+import numpy as np
 import pandas as pd
-from igraph import Graph
-from collections import defaultdict
-from tqdm import tqdm
-from graph.feature.graph_utils import load_whitelist_addresses, build_filtered_adjacent_list_and_edges
+import pyarrow as pa
+from graph.feature.graph_context import GraphContext, group_by_vertex, gather_segments, segment_sums
+from graph.feature.feature_registry import register_feature_family
+from graph.feature.components import run_component_units
 
 
-def extract_motif_features(g: Graph, whitelist_path: str = None) -> pd.DataFrame:
+def _triangles_from(ctx: GraphContext, sources: np.ndarray) -> np.ndarray:
+    """
+    Directed 3-cycles (u -> w -> v -> u) with u < w < v whose smallest vertex u is in `sources`.
+
+    Returns:
+        np.ndarray[int64] of shape (k, 3): rows (u, w, v)
+    """
+    # Filtered sets for the sources and their out-neighbors only; the closing edge v -> u
+    # is checked against u's in-neighbors, so no set beyond 1 hop is needed
+    _, pos = gather_segments(ctx.out_indptr, sources)
+    fout = ctx.neighbor_sets(np.union1d(sources, ctx.out_indices[pos]), "out", filtered=True)
+    fin = ctx.neighbor_sets(sources, "in", filtered=True)
+    found = []
+
+    for u in sources.tolist():
+        for w in fout[u]:
+            if w <= u:
+                continue
+            # second hop: w -> v
+            for v in fout[w]:
+                # close the cycle: v -> u
+                if v > w and v in fin[u]:
+                    found.append((u, w, v))
+
+    return np.asarray(found, dtype=np.int64).reshape(-1, 3)
+
+
+def enumerate_triangles(ctx: GraphContext) -> dict[str, np.ndarray]:
+    """
+    Enumerate directed 3-cycles (u -> w -> v -> u) on the whitelist-filtered graph.
+
+    Each triangle is reported exactly once using the order constraint u < w < v.
+    Triangles never leave a weakly connected component, so star components are skipped
+    and the rest is enumerated per component work unit (in parallel when ctx.n_jobs > 1).
+
+    Parameters:
+        ctx (GraphContext): Shared per-graph context
+
+    Returns:
+        dict of equal-length arrays:
+            - u, w, v: participating vertex IDs
+            - amount / tx_count: total amount / transfer count over the 3 edges
+    """
+    units = run_component_units(ctx, ctx.vertex_ids(), _triangles_from,
+                                desc="🔁 Counting directed triangle loops (filtered)")
+    found = [tri for _, tri in units]
+    tri = np.concatenate(found) if found else np.empty((0, 3), dtype=np.int64)
+    tri = tri[np.lexsort((tri[:, 2], tri[:, 1], tri[:, 0]))]
+    u, w, v = tri[:, 0], tri[:, 1], tri[:, 2]
+
+    # Triangle edges: u→w, w→v, v→u
+    eids = [ctx.edge_ids(u, w), ctx.edge_ids(w, v), ctx.edge_ids(v, u)]
+    amount = np.zeros(len(u), dtype=np.float64)
+    tx_count = np.zeros(len(u), dtype=np.int64)
+    for e in eids:
+        amount += ctx.edge_amount[e]
+        tx_count += ctx.edge_count[e]
+
+    return {"u": u, "w": w, "v": v, "amount": amount, "tx_count": tx_count}
+
+
+def enumerate_two_node_loops(ctx: GraphContext) -> dict[str, np.ndarray]:
+    """
+    Find every filtered edge (u -> v) whose reverse edge (v -> u) also exists.
+
+    Each mutual pair appears once per direction; a self-loop is its own reverse.
+
+    Returns:
+        dict of equal-length arrays:
+            - u, v: edge endpoints
+            - amount / tx_count: amount / transfer count over both directions
+    """
+    keep = ~ctx.skip_mask[ctx.edge_src] & ~ctx.skip_mask[ctx.edge_dst]
+    eid = np.flatnonzero(keep)
+    rev = ctx.edge_ids(ctx.edge_dst[eid], ctx.edge_src[eid])
+
+    mutual = rev >= 0
+    eid, rev = eid[mutual], rev[mutual]
+
+    return {
+        "u": ctx.edge_src[eid],
+        "v": ctx.edge_dst[eid],
+        "amount": ctx.edge_amount[eid] + ctx.edge_amount[rev],
+        "tx_count": ctx.edge_count[eid] + ctx.edge_count[rev],
+    }
+
+
+def build_motif_membership(ctx: GraphContext) -> dict[str, np.ndarray]:
+    """
+    Enumerate two-node loops and triangles once per graph and group them by participant,
+    so motif features of any vertex subset are plain CSR segment sums.
+
+    Returns:
+        dict with, for "pair" and "tri":
+            - <kind>_indptr: CSR offsets by vertex
+            - <kind>_amount / <kind>_tx_count: per-membership totals in CSR order
+            - <kind>_nodes: the loops themselves (directed (u, v) rows / (u, w, v) rows),
+              kept for the cycle membership index
+    """
+    membership = {}
+
+    # Two-node loops are credited to the edge source (one membership per direction)
+    pairs = enumerate_two_node_loops(ctx)
+    indptr, order = group_by_vertex(pairs["u"], ctx.n)
+    membership["pair_indptr"] = indptr
+    membership["pair_amount"] = pairs["amount"][order]
+    membership["pair_tx_count"] = pairs["tx_count"][order]
+    membership["pair_nodes"] = np.column_stack([pairs["u"], pairs["v"]])
+
+    # Triangles are credited to all three participants
+    tri = enumerate_triangles(ctx)
+    participants = np.concatenate([tri["u"], tri["w"], tri["v"]])
+    indptr, order = group_by_vertex(participants, ctx.n)
+    membership["tri_indptr"] = indptr
+    membership["tri_amount"] = np.tile(tri["amount"], 3)[order]
+    membership["tri_tx_count"] = np.tile(tri["tx_count"], 3)[order]
+    membership["tri_nodes"] = np.column_stack([tri["u"], tri["w"], tri["v"]])
+
+    return membership
+
+
+MOTIF_FEATURE_SCHEMA = {
+    "self_loop_count": pa.int8(),
+    "two_node_loop_count": pa.int32(),
+    "two_node_loop_amount": pa.float64(),
+    "two_node_loop_tx_count": pa.int32(),
+    "triangle_loop_count": pa.int32(),
+    "triangle_loop_amount": pa.float64(),
+    "triangle_loop_tx_count": pa.int32(),
+}
+
+
+@register_feature_family("motif", version=1, description="🔺 motif-level", schema=MOTIF_FEATURE_SCHEMA)
+def extract_motif_features(ctx: GraphContext, vids: np.ndarray = None) -> pd.DataFrame:
     """
     Extract motif-based features from the graph, skipping nodes in the whitelist.
 
     Parameters:
-        g (igraph.Graph): Directed igraph object
-        whitelist_path (str): Path to CSV file with whitelist addresses
+        ctx (GraphContext): Shared per-graph context (filtered adjacency, edge-ID index, whitelist mask)
+        vids (np.ndarray): Vertex IDs to compute (default: all vertices)
 
     Returns:
         pd.DataFrame: Motif features indexed by node ID
-    
+
     Definitions:
       - self_loop_count: presence of a self-loop (u -> u) as 0/1
       - two_node_loop_count: number of distinct mutual pairs (u <-> v) that the node participates in
@@ -25,102 +159,35 @@ def extract_motif_features(g: Graph, whitelist_path: str = None) -> pd.DataFrame
         accumulated to each participant in that triangle
 
     """
-    # --- Load whitelist
-    whitelist_set = load_whitelist_addresses(whitelist_path) if whitelist_path else set()
-
-    # --- Build a mapping from address label (string) to vertex ID
-    address_to_vid = {v["label"]: v.index for v in g.vs}
-
-    # --- Convert whitelisted addresses to vertex IDs set, only if they exist in the graph
-    skip_vids = set(address_to_vid[a] for a in whitelist_set if a in address_to_vid)
-    print(f"✅ Whitelist match: {len(skip_vids)} / {len(whitelist_set)} addresses found in graph")
-
-    # ---  Build full out-neighbor sets for every vertex: out_neighbors[u] = {v | (u -> v) exists}
-    out_neighbors = {v.index: set(g.successors(v.index)) for v in g.vs}
-    
-    # --- Build whitelist-filtered adjacency + edge set for motif counting (exclude any node in skip_vids)
-    # filtered_out_neighbors[u] = {v | (u -> v) exists and u,v not in skip_vids}
-    # filtered_edge = set of (u, v) pairs after whitelist filtering
-    filtered_out_neighbors, filtered_edge = build_filtered_adjacent_list_and_edges(out_neighbors, skip_vids)
-
-    # === Triangle (directed 3-cycle) counting ===
-    # Count each triangle (u -> w -> v -> u) exactly once using the order constraint u < w < v,
-    # Then accumulate its total amount and transfer count to all three participating nodes.
-    triangle_loop_counts = defaultdict(int)
-    triangle_loop_amounts = defaultdict(float)
-    triangle_loop_tx_counts = defaultdict(int)
-
-    for u in tqdm(filtered_out_neighbors, desc="🔁 Counting directed triangle loops (filtered)"):
-        for w in filtered_out_neighbors[u]:
-            # second hop: w -> v
-            for v in filtered_out_neighbors[w]:
-                # close the cycle: v -> u
-                if (v, u) in filtered_edge and u < w < v:
-                    # Triangle edges: u→w, w→v, v→u
-                    edges = [(u, w), (w, v), (v, u)]
-                    participants = {u, w, v}
-
-                    total_amount = 0.0
-                    total_count = 0
-
-                    for src, tgt in edges:
-                        eid = g.get_eid(src, tgt, directed=True, error=False)
-                        total_amount += g.es[eid]["amount"]
-                        total_count += g.es[eid]["count"]
-
-                    # Assign total triangle metrics to all 3 participants
-                    for node in participants:
-                        triangle_loop_counts[node] += 1
-                        triangle_loop_amounts[node] += total_amount
-                        triangle_loop_tx_counts[node] += total_count
-
-    # === Aggregate motif features
-    rows = []
-    for v in tqdm(g.vs, desc="🧱 Finalizing Motif Features"):
-        vid = v.index
-
-        # Whitelisted nodes: emit NA-like values (None) to be easily filtered downstream
-        if vid in skip_vids:
-            rows.append({
-                "node": vid,
-                "self_loop_count": None,
-                "two_node_loop_count": None,
-                "two_node_loop_amount": None,
-                "two_node_loop_tx_count": None,
-                "triangle_loop_count": None,
-                "triangle_loop_amount": None,
-                "triangle_loop_tx_count": None
-            })
-            continue
-        
-        # Self-loop: check if vid is among its own out-neighbors (after whitelist filtering)
-        self_loop_count = int(vid in filtered_out_neighbors[vid])
-
-        # Two-node loops (mutual pairs): count each neighbor u such that (vid -> u) and (u -> vid).
-        two_node_loop_count = 0
-        two_node_loop_amount = 0.0
-        two_node_loop_tx_count = 0
-
-        for u in filtered_out_neighbors[vid]:
-            if vid in filtered_out_neighbors[u]:
-                two_node_loop_count += 1
-                
-                eid1 = g.get_eid(vid, u, directed=True) # vid -> u
-                eid2 = g.get_eid(u, vid, directed=True) # u -> vid
-                
-                two_node_loop_amount += g.es[eid1]["amount"] + g.es[eid2]["amount"]
-                two_node_loop_tx_count += g.es[eid1]["count"] + g.es[eid2]["count"]
-             
-        # Triangle loops already accumulated in the dictionaries above
-        rows.append({
-            "node": vid,
-            "self_loop_count": self_loop_count,
-            "two_node_loop_count": two_node_loop_count,
-            "two_node_loop_amount": two_node_loop_amount,
-            "two_node_loop_tx_count": two_node_loop_tx_count,
-            "triangle_loop_count": triangle_loop_counts[vid],
-            "triangle_loop_amount": triangle_loop_amounts[vid],
-            "triangle_loop_tx_count": triangle_loop_tx_counts[vid]
-        })
-
-    return pd.DataFrame(rows).set_index("node")
+    vids = ctx.vertex_ids(vids)
+
+    # Loops are enumerated once per graph; each call only sums the selected vertices' memberships
+    membership = ctx.cached("motif_membership", build_motif_membership)
+
+    # === Self-loops on the filtered graph
+    self_loop_count = (ctx.edge_ids(vids, vids) >= 0).astype(np.int64)
+
+    # === Two-node loops (mutual pairs)
+    two_node_loop_count, pos = gather_segments(membership["pair_indptr"], vids)
+    two_node_loop_amount = segment_sums(membership["pair_amount"][pos], two_node_loop_count)
+    two_node_loop_tx_count = segment_sums(membership["pair_tx_count"][pos], two_node_loop_count)
+
+    # === Triangles: each triangle's totals accumulated to all three participants
+    triangle_loop_count, pos = gather_segments(membership["tri_indptr"], vids)
+    triangle_loop_amount = segment_sums(membership["tri_amount"][pos], triangle_loop_count)
+    triangle_loop_tx_count = segment_sums(membership["tri_tx_count"][pos], triangle_loop_count)
+
+    df = pd.DataFrame({
+        "self_loop_count": self_loop_count,
+        "two_node_loop_count": two_node_loop_count,
+        "two_node_loop_amount": two_node_loop_amount,
+        "two_node_loop_tx_count": two_node_loop_tx_count,
+        "triangle_loop_count": triangle_loop_count,
+        "triangle_loop_amount": triangle_loop_amount,
+        "triangle_loop_tx_count": triangle_loop_tx_count
+    }, index=pd.Index(vids, name="node"), dtype=np.float64)
+
+    # Whitelisted nodes: emit NA-like values to be easily filtered downstream
+    df.loc[ctx.skip_mask[vids]] = np.nan
+
+    return df
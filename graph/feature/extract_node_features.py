@@ -1,21 +1,35 @@
 import pandas as pd
 import numpy as np
-from igraph import Graph
-from graph.feature.graph_utils import load_whitelist_addresses
+import pyarrow as pa
+from graph.feature.graph_context import GraphContext, gather_segments, segment_sums
+from graph.feature.feature_registry import register_feature_family
 
 
-def extract_node_features(g: Graph, whitelist_path: str = None) -> pd.DataFrame:
+NODE_FEATURE_SCHEMA = {
+    "in_degree": pa.int32(),
+    "out_degree": pa.int32(),
+    "in_transfer_count": pa.int32(),
+    "out_transfer_count": pa.int32(),
+    # wei sums exceed int64; float64 keeps ~15 significant digits
+    "total_input_amount": pa.float64(),
+    "total_output_amount": pa.float64(),
+    "balance_proxy": pa.float64(),
+}
+
+
+@register_feature_family("node", version=1, description="📊 node-level", schema=NODE_FEATURE_SCHEMA)
+def extract_node_features(ctx: GraphContext, vids: np.ndarray = None) -> pd.DataFrame:
     """
-    Extract node-level features from an igraph token transfer graph,
+    Extract node-level features from the shared graph context,
     with exclusion of known infrastructure addresses.
 
     Parameters:
-        g (igraph.Graph): Directed igraph object
-        whitelist_path (str): Path to CSV file with whitelist address
+        ctx (GraphContext): Shared per-graph context (CSR adjacency, edge arrays, whitelist mask)
+        vids (np.ndarray): Vertex IDs to compute (default: all vertices)
 
     Returns:
         pd.DataFrame: Node-level feature DataFrame indexed by node ID
-    
+
     Definitions:
       - in_degree/out_degree: number of distinct inbound/outbound neighbors
         (since edges are aggregated, this equals the count of incident edges).
@@ -23,52 +37,32 @@ def extract_node_features(g: Graph, whitelist_path: str = None) -> pd.DataFrame:
       - total_input_amount/total_output_amount: sum of edge 'amount'.
       - balance_proxy: total_input_amount - total_output_amount.
     """
-    # === Load whitelist
-    whitelist_set = load_whitelist_addresses(whitelist_path) if whitelist_path else set()
-
-    rows = []
-
-    # Iterate vertices and aggregate features.
-    for v in g.vs:
-        node_id = v.index
-        address = v["label"].lower()
+    vids = ctx.vertex_ids(vids)
 
-        if address in whitelist_set:
-            rows.append({
-                "node": node_id,
-                "in_degree": np.nan,
-                "out_degree": np.nan,
-                "in_transfer_count": np.nan,
-                "out_transfer_count": np.nan,
-                "total_input_amount": np.nan,
-                "total_output_amount": np.nan,
-                "balance_proxy": np.nan
-            })
-            continue
-        
-         # Incident edges (already aggregated: one edge per (u->v))
-        in_eids = g.incident(node_id, mode="IN") # IDs of incoming edges
-        out_eids = g.incident(node_id, mode="OUT")
-        in_edges = g.es.select(in_eids) # incoming edge objects
-        out_edges = g.es.select(out_eids)
+    # Incident edges of the selected vertices, read from the CSR
+    # (edges are already aggregated: one edge per (u->v), so segment length = degree)
+    in_degree, in_pos = gather_segments(ctx.in_indptr, vids)
+    out_degree, out_pos = gather_segments(ctx.out_indptr, vids)
+    in_eids = ctx.in_eids[in_pos]
+    out_eids = ctx.out_eids[out_pos]
 
-        # Sums (assume each edge has 'amount' and 'count' attributes)
-        total_in = sum(e["amount"] for e in in_edges)
-        total_out = sum(e["amount"] for e in out_edges)
-        in_count = sum(e["count"] for e in in_edges)
-        out_count = sum(e["count"] for e in out_edges)
+    # Per-vertex sums over incident edges (amounts summed as exact Python ints)
+    in_count = segment_sums(ctx.edge_count[in_eids], in_degree)
+    out_count = segment_sums(ctx.edge_count[out_eids], out_degree)
+    total_in = segment_sums(ctx.edge_amount_exact[in_eids], in_degree)
+    total_out = segment_sums(ctx.edge_amount_exact[out_eids], out_degree)
 
-        row = {
-            "node": node_id,
-            "in_degree": len(in_edges), 
-            "out_degree": len(out_edges),
-            "in_transfer_count": in_count, 
-            "out_transfer_count": out_count,
-            "total_input_amount": total_in,
-            "total_output_amount": total_out,
-            "balance_proxy": total_in - total_out
-        }
+    df = pd.DataFrame({
+        "in_degree": in_degree.astype(np.float64),
+        "out_degree": out_degree.astype(np.float64),
+        "in_transfer_count": in_count.astype(np.float64),
+        "out_transfer_count": out_count.astype(np.float64),
+        "total_input_amount": total_in,
+        "total_output_amount": total_out,
+        "balance_proxy": total_in - total_out
+    }, index=pd.Index(vids, name="node"))
 
-        rows.append(row)
+    # Whitelisted nodes: NaN for every feature
+    df.loc[ctx.skip_mask[vids]] = np.nan
 
-    return pd.DataFrame(rows).set_index("node")
+    return df
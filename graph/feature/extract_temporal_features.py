@@ -0,0 +1,221 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tqdm import tqdm
+from graph.feature.graph_context import GraphContext
+from graph.feature.feature_registry import register_feature_family
+
+# Memory budget for the in-memory part of the temporal pass (one bucket of events)
+TEMPORAL_MEMORY_BUDGET_BYTES = 512 * 1024 * 1024
+# Approximate peak bytes per event while sorting/reducing a bucket (vid, ts, sort order, temporaries)
+BYTES_PER_EVENT = 48
+# Rows read from the edgelist Parquet per batch
+READ_BATCH_ROWS = 1_000_000
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+# One spilled event: vertex ID + unix timestamp
+EVENT_DTYPE = np.dtype([("vid", np.int32), ("ts", np.int64)])
+
+
+def get_edgelist_path(ctx: GraphContext) -> str:
+    """
+    Path of the filtered edgelist persisted next to the graph artifact by run_graph_builder.
+    """
+    if not ctx.graph_path:
+        raise ValueError("Temporal features need ctx.graph_path to locate the filtered edgelist")
+    return ctx.graph_path.replace("token_transfer_graph", "token_transfer_edgelist").replace(".pkl", ".parquet")
+
+
+def _plan_buckets(ctx: GraphContext, memory_budget: int) -> np.ndarray:
+    """
+    Split vertex IDs into contiguous ranges whose event counts fit the memory budget.
+
+    The number of events per vertex is known exactly from the aggregated graph
+    (in + out transfer counts), so no extra pass is needed.
+
+    Returns:
+        np.ndarray: bucket boundaries [b0=0, b1, ..., n]
+    """
+    events = (
+        np.bincount(ctx.edge_src, weights=ctx.edge_count, minlength=ctx.n)
+        + np.bincount(ctx.edge_dst, weights=ctx.edge_count, minlength=ctx.n)
+    )
+    max_events = max(1, memory_budget // BYTES_PER_EVENT)
+    bucket_of_vertex = (np.cumsum(events) - events) // max_events
+    boundaries = np.flatnonzero(np.r_[True, bucket_of_vertex[1:] != bucket_of_vertex[:-1]])
+    return np.r_[boundaries, ctx.n].astype(np.int64)
+
+
+def _spill_events(ctx: GraphContext, edgelist_path: str, boundaries: np.ndarray, spill_dir: str) -> list[str]:
+    """
+    Single streaming pass over the edgelist: every transfer yields one event for its sender
+    and one for its receiver, appended to the spill file of the vertex's bucket.
+    """
+    name_index = pd.Index(ctx.g.vs["name"])
+    paths = [os.path.join(spill_dir, f"bucket_{b:06d}.bin") for b in range(len(boundaries) - 1)]
+    handles = [open(p, "wb") for p in paths]
+
+    try:
+        parquet = pq.ParquetFile(edgelist_path)
+        batches = parquet.iter_batches(batch_size=READ_BATCH_ROWS, columns=["from_address_sid", "to_address_sid", "timestamp"])
+        for batch in tqdm(batches, desc="⏱️ Spilling transfer events", total=-(-parquet.metadata.num_rows // READ_BATCH_ROWS)):
+            ts = batch.column("timestamp").to_numpy().astype(np.int64)
+            for col in ("from_address_sid", "to_address_sid"):
+                vid = name_index.get_indexer(batch.column(col).to_pandas())
+                keep = (vid >= 0)
+                keep[keep] = ~ctx.skip_mask[vid[keep]]
+
+                events = np.empty(int(keep.sum()), dtype=EVENT_DTYPE)
+                events["vid"] = vid[keep]
+                events["ts"] = ts[keep]
+
+                # Route events to buckets (contiguous vertex ranges)
+                bucket = np.searchsorted(boundaries, events["vid"], side="right") - 1
+                order = np.argsort(bucket, kind="stable")
+                events, bucket = events[order], bucket[order]
+                cuts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]]) if len(bucket) else []
+                for start, stop in zip(cuts, list(cuts[1:]) + [len(bucket)]):
+                    handles[bucket[start]].write(events[start:stop].tobytes())
+    finally:
+        for h in handles:
+            h.close()
+    return paths
+
+
+def _reduce_bucket(events: np.ndarray, stats: dict[str, np.ndarray]) -> None:
+    """
+    Sorted-group reductions over one bucket of events, written into the per-vertex stat arrays.
+    """
+    if len(events) == 0:
+        return
+
+    order = np.lexsort((events["ts"], events["vid"]))
+    vid = events["vid"][order].astype(np.int64)
+    ts = events["ts"][order]
+
+    new_vid = np.r_[True, vid[1:] != vid[:-1]]
+    starts = np.flatnonzero(new_vid)
+    ends = np.r_[starts[1:], len(vid)] - 1
+    gv = vid[starts]
+
+    # First / last activity
+    stats["first_activity_timestamp"][gv] = ts[starts]
+    stats["last_activity_timestamp"][gv] = ts[ends]
+
+    # Active days: number of (vertex, day) runs
+    day = ts // SECONDS_PER_DAY
+    new_day = new_vid | np.r_[True, day[1:] != day[:-1]]
+    stats["active_day_count"][gv] = np.add.reduceat(new_day.astype(np.int64), starts)
+
+    # Max transfers per hour: longest (vertex, hour) run per vertex
+    hour = ts // SECONDS_PER_HOUR
+    run_starts = np.flatnonzero(new_vid | np.r_[True, hour[1:] != hour[:-1]])
+    run_len = np.diff(np.r_[run_starts, len(vid)])
+    run_group_starts = np.flatnonzero(new_vid[run_starts])
+    stats["max_transfers_per_hour"][gv] = np.maximum.reduceat(run_len, run_group_starts)
+
+    # Inter-arrival gaps within each vertex
+    same = ~new_vid[1:]
+    if not same.any():
+        return
+    gaps = np.diff(ts)[same].astype(np.float64)
+    gap_vid = vid[1:][same]
+    gap_starts = np.flatnonzero(np.r_[True, gap_vid[1:] != gap_vid[:-1]])
+    gap_gv = gap_vid[gap_starts]
+    gap_count = np.diff(np.r_[gap_starts, len(gaps)])
+
+    mean = np.add.reduceat(gaps, gap_starts) / gap_count
+    var = np.maximum(np.add.reduceat(gaps * gaps, gap_starts) / gap_count - mean * mean, 0.0)
+    std = np.sqrt(var)
+
+    stats["interarrival_mean_sec"][gap_gv] = mean
+    stats["interarrival_std_sec"][gap_gv] = std
+    stats["interarrival_min_sec"][gap_gv] = np.minimum.reduceat(gaps, gap_starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stats["burstiness"][gap_gv] = np.where(std + mean > 0, (std - mean) / (std + mean), 0.0)
+
+
+def compute_temporal_stats(ctx: GraphContext, edgelist_path: str = None,
+                           memory_budget: int = TEMPORAL_MEMORY_BUDGET_BYTES) -> dict[str, np.ndarray]:
+    """
+    Per-vertex temporal statistics from the filtered edgelist, in one streaming pass.
+
+    Events are spilled to vertex-range buckets sized to the memory budget, then each bucket
+    is sorted by (vertex, timestamp) and reduced with vectorized group operations — no per-node
+    Python lists, and at most one bucket of events in memory at a time.
+
+    Returns:
+        dict of per-vertex arrays (NaN where undefined)
+    """
+    edgelist_path = edgelist_path or get_edgelist_path(ctx)
+    if not os.path.exists(edgelist_path):
+        raise FileNotFoundError(f"Filtered edgelist not found: {edgelist_path}")
+
+    stats = {col: np.full(ctx.n, np.nan) for col in TEMPORAL_FEATURE_SCHEMA}
+    boundaries = _plan_buckets(ctx, memory_budget)
+
+    spill_dir = tempfile.mkdtemp(prefix="temporal_spill_", dir=os.path.dirname(edgelist_path))
+    try:
+        paths = _spill_events(ctx, edgelist_path, boundaries, spill_dir)
+        for path in tqdm(paths, desc="⏱️ Reducing temporal buckets"):
+            _reduce_bucket(np.fromfile(path, dtype=EVENT_DTYPE), stats)
+            os.remove(path)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    return stats
+
+
+TEMPORAL_FEATURE_SCHEMA = {
+    "first_activity_timestamp": pa.int64(),
+    "last_activity_timestamp": pa.int64(),
+    "active_day_count": pa.int16(),
+    "max_transfers_per_hour": pa.int32(),
+    "interarrival_mean_sec": pa.float32(),
+    "interarrival_std_sec": pa.float32(),
+    "interarrival_min_sec": pa.float32(),
+    "burstiness": pa.float32(),
+}
+
+
+@register_feature_family("temporal", version=1, description="⏱️ temporal", schema=TEMPORAL_FEATURE_SCHEMA)
+def extract_temporal_features(ctx: GraphContext, vids: np.ndarray = None) -> pd.DataFrame:
+    """
+    Extract temporal burstiness features from the time-sorted transfer stream
+    (the aggregated graph only keeps first_timestamp per edge).
+
+    Parameters:
+        ctx (GraphContext): Shared per-graph context (graph_path locates the filtered edgelist)
+        vids (np.ndarray): Vertex IDs to compute (default: all vertices)
+
+    Returns:
+        pd.DataFrame: Temporal features indexed by node ID
+
+    Definitions (over all transfers sent or received by the node):
+      - first/last_activity_timestamp: earliest / latest transfer timestamp (unix seconds)
+      - active_day_count: number of distinct UTC days with at least one transfer
+      - max_transfers_per_hour: largest number of transfers within one UTC clock hour
+      - interarrival_mean/std/min_sec: statistics of gaps between consecutive transfers
+        (null with fewer than 2 transfers; std is the population std)
+      - burstiness: (std - mean) / (std + mean) of the gaps, in [-1, 1]
+        (-1 periodic, 0 Poisson-like, → 1 bursty)
+    """
+    vids = ctx.vertex_ids(vids)
+    stats = ctx.cached("temporal_stats", compute_temporal_stats)
+
+    df = pd.DataFrame(
+        {col: stats[col][vids] for col in TEMPORAL_FEATURE_SCHEMA},
+        index=pd.Index(vids, name="node")
+    )
+
+    # Whitelisted nodes: NaN for every feature
+    df.loc[ctx.skip_mask[vids]] = np.nan
+
+    return df
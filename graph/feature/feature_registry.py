@@ -0,0 +1,85 @@
+from typing import Callable
+
+import pandas as pd
+import pyarrow as pa
+
+# Registered feature families in registration order: name -> FeatureFamily
+FEATURE_FAMILIES: dict[str, "FeatureFamily"] = {}
+# Execution / column order of the built-in families. Fixed here rather than taken from the
+# registration order, which depends on which module happens to import an extractor first;
+# other registered families follow in registration order.
+FAMILY_ORDER = ["node", "motif", "egonet", "khop", "temporal", "kcycle", "centrality"]
+
+
+class FeatureFamily:
+    """
+    A pluggable group of node features computed from a GraphContext.
+
+    Attributes:
+        name (str): Family name (e.g. "node", "motif", "egonet")
+        extractor (Callable[[GraphContext, np.ndarray | None], pd.DataFrame]): Returns features
+            indexed by node ID for the given vertex IDs (None = all vertices)
+        version (int): Bump whenever the family's definitions change
+        description (str): Short label for progress messages
+        schema (dict[str, pa.DataType]): Declared Parquet type per output column
+            (all columns are nullable: whitelisted rows carry nulls)
+        persist (Callable[[GraphContext, pd.DataFrame], None] | None): Writes per-month side
+            outputs from the family's full feature frame; the runner calls it whether the frame
+            was computed or loaded from the feature store
+    """
+
+    def __init__(self, name: str, extractor: Callable, version: int = 1, description: str = None,
+                 schema: dict[str, pa.DataType] = None, persist: Callable = None):
+        self.name = name
+        self.extractor = extractor
+        self.version = version
+        self.description = description or name
+        self.schema = schema or {}
+        self.persist = persist
+
+    def extract(self, ctx, vids=None) -> pd.DataFrame:
+        return self.extractor(ctx, vids=vids)
+
+
+def register_feature_family(name: str, version: int = 1, description: str = None,
+                            schema: dict[str, pa.DataType] = None, persist: Callable = None):
+    """
+    Decorator registering an extractor `fn(ctx, vids=None) -> pd.DataFrame` as a feature family.
+
+    Extractors must return rows for exactly the requested vertex IDs, so the runner can
+    process the graph in vertex chunks; graph-wide precomputation goes through `ctx.cached`.
+    Side outputs (e.g. state seeding the next month) belong in `persist(ctx, df)`, not in the
+    extractor, since cached families are not re-extracted.
+
+    Example:
+        @register_feature_family("egonet", version=1, schema={"egonet_density": pa.float32(), ...})
+        def extract_egonet_features(ctx, vids=None): ...
+    """
+    def decorator(fn: Callable) -> Callable:
+        FEATURE_FAMILIES[name] = FeatureFamily(name, fn, version=version, description=description, schema=schema,
+                                               persist=persist)
+        return fn
+    return decorator
+
+
+def get_feature_families(names: list[str] = None) -> list[FeatureFamily]:
+    """
+    Return registered feature families in FAMILY_ORDER, or the families `names` in that order.
+    """
+    # Importing the extractor modules registers the built-in families
+    import graph.feature.extract_node_features  # noqa: F401
+    import graph.feature.extract_motif_features  # noqa: F401
+    import graph.feature.extract_egonet_features  # noqa: F401
+    import graph.feature.extract_khop_features  # noqa: F401
+    import graph.feature.extract_temporal_features  # noqa: F401
+    import graph.feature.extract_kcycle_features  # noqa: F401
+    import graph.feature.extract_centrality_features  # noqa: F401
+
+    if names is None:
+        names = [n for n in FAMILY_ORDER if n in FEATURE_FAMILIES] + \
+                [n for n in FEATURE_FAMILIES if n not in FAMILY_ORDER]
+
+    unknown = [n for n in names if n not in FEATURE_FAMILIES]
+    if unknown:
+        raise ValueError(f"Unknown feature families: {unknown}. Available: {list(FEATURE_FAMILIES)}")
+    return [FEATURE_FAMILIES[n] for n in names]
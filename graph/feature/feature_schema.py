@@ -0,0 +1,57 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Identifier / metadata columns leading every feature table
+METADATA_SCHEMA = {
+    "node": pa.int32(),
+    "address": pa.string(),
+    "is_infra": pa.int8(),
+    "chain_id": pa.int32(),
+    "year": pa.int16(),
+    "month": pa.int8(),
+}
+
+
+def build_feature_schema(families: list, columns: list[str]) -> pa.Schema:
+    """
+    Build the Parquet schema of the monthly feature table from the metadata columns
+    and each family's declared column types. Undeclared columns fall back to float64.
+
+    Parameters:
+        families (list[FeatureFamily]): Feature families contributing columns
+        columns (list[str]): Column order of the table to write
+    """
+    declared = dict(METADATA_SCHEMA)
+    for family in families:
+        declared.update(family.schema)
+    return pa.schema([pa.field(col, declared.get(col, pa.float64()), nullable=True) for col in columns])
+
+
+def declared_feature_columns(families: list) -> list[str]:
+    """
+    Columns of a feature table built from `families`, as declared: metadata first, then
+    each family's columns (used where no computed frame is available, e.g. an empty graph).
+    """
+    return list(METADATA_SCHEMA) + [col for family in families for col in family.schema]
+
+
+def to_feature_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """
+    Cast a feature DataFrame to its declared schema.
+
+    Whitelisted rows carry NaN in the DataFrame and become nulls in the typed columns;
+    exact wei amounts (Python ints beyond int64) are converted to float64 first.
+    """
+    df = df.copy()
+    for field in schema:
+        if pa.types.is_floating(field.type) and df[field.name].dtype == object:
+            df[field.name] = df[field.name].astype("float64")
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def write_feature_table(df: pd.DataFrame, path: str, schema: pa.Schema) -> None:
+    """
+    Write the monthly feature table as a typed, zstd-compressed Parquet file.
+    """
+    pq.write_table(to_feature_table(df, schema), path, compression="zstd")
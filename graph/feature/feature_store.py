@@ -0,0 +1,128 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Parquet schema metadata key holding the cache key of a stored feature family
+STORE_KEY = b"feature_store_key"
+# Parquet schema metadata key listing object columns stored as strings (exact big integers)
+STORE_EXACT_COLS = b"feature_store_exact_columns"
+
+
+def file_fingerprint(path: str, chunk_size: int = 8 * 1024 * 1024) -> str:
+    """
+    SHA-256 of a file's content, streamed in chunks.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def whitelist_fingerprint(whitelist: set[str]) -> str:
+    """
+    SHA-256 of the normalized (sorted, lowercased) whitelist addresses.
+    """
+    return hashlib.sha256("\n".join(sorted(whitelist)).encode("utf-8")).hexdigest()
+
+
+def build_cache_key(graph_fp: str, whitelist_fp: str, family) -> dict:
+    """
+    Cache key of one feature family artifact.
+
+    Parameters:
+        graph_fp (str): Fingerprint of the graph artifact
+        whitelist_fp (str): Fingerprint of the whitelist
+        family (FeatureFamily): Registered family (name + extractor version)
+    """
+    return {
+        "graph": graph_fp,
+        "whitelist": whitelist_fp,
+        "family": family.name,
+        "version": family.version,
+    }
+
+
+class FeatureStore:
+    """
+    Per-month store of feature family artifacts, one Parquet file per family.
+
+    Layout:
+        <month_dir>/feature_store/<chain>__features_<family>__YYYY_MM.parquet
+
+    Each file carries its cache key in the Parquet schema metadata, so a lookup
+    only needs to read the footer to decide whether the artifact is still valid.
+    """
+
+    def __init__(self, month_dir: str, chain: str, year: int, month: int):
+        self.store_dir = os.path.join(month_dir, "feature_store")
+        self.chain = chain
+        self.year = year
+        self.month = month
+
+    def artifact_path(self, family_name: str) -> str:
+        return os.path.join(
+            self.store_dir,
+            f"{self.chain}__features_{family_name}__{self.year}_{self.month:02d}.parquet"
+        )
+
+    def stored_key(self, family_name: str) -> dict | None:
+        """
+        Return the cache key stored with a family artifact (None if missing/unreadable).
+        """
+        path = self.artifact_path(family_name)
+        if not os.path.exists(path):
+            return None
+        try:
+            metadata = pq.read_schema(path).metadata or {}
+        except (OSError, pa.ArrowInvalid):
+            return None
+        raw = metadata.get(STORE_KEY)
+        return json.loads(raw) if raw else None
+
+    def load(self, family_name: str, key: dict) -> pd.DataFrame | None:
+        """
+        Load a family's features if its stored key matches `key`, else None.
+        """
+        if self.stored_key(family_name) != key:
+            return None
+
+        table = pq.read_table(self.artifact_path(family_name))
+        exact_cols = json.loads((table.schema.metadata or {}).get(STORE_EXACT_COLS, b"[]"))
+        df = table.to_pandas()
+
+        # Restore exact big integers stored as strings
+        for col in exact_cols:
+            df[col] = np.array([int(x) if x is not None else np.nan for x in df[col]], dtype=object)
+        return df
+
+    def save(self, family_name: str, key: dict, df: pd.DataFrame) -> str:
+        """
+        Persist a family's features (indexed by node) together with its cache key.
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+
+        # Object columns hold exact wei integers (may exceed int64): store them as strings,
+        # same convention as the filtered edgelist's 'amount' column.
+        exact_cols = [c for c in df.columns if df[c].dtype == object]
+        out = df.copy() if exact_cols else df
+        for col in exact_cols:
+            out[col] = [None if pd.isna(x) else str(x) for x in out[col]]
+
+        table = pa.Table.from_pandas(out, preserve_index=True)
+        metadata = dict(table.schema.metadata or {})
+        metadata[STORE_KEY] = json.dumps(key).encode("utf-8")
+        metadata[STORE_EXACT_COLS] = json.dumps(exact_cols).encode("utf-8")
+        table = table.replace_schema_metadata(metadata)
+
+        # Write to a temp file first so an interrupted run never leaves a half-written artifact
+        path = self.artifact_path(family_name)
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        return path
@@ -0,0 +1,232 @@
+import os
+
+import numpy as np
+from igraph import Graph
+from graph.feature.graph_utils import load_whitelist_addresses
+
+
+class GraphContext:
+    """
+    Per-graph precomputation shared by all feature extractors.
+
+    Built once per monthly graph so that extractors no longer reload the whitelist,
+    rebuild address → vertex maps or re-derive neighbor sets on their own.
+
+    Attributes:
+        g (igraph.Graph): The aggregated token transfer graph
+        graph_path (str | None): Path of the graph artifact the context was built from
+        chain / year / month: Period of the graph (None if unknown)
+        n (int): Number of vertices
+        addresses (np.ndarray): Pure lowercase address per vertex ID
+        whitelist (set[str]): Lowercased whitelist addresses
+        skip_mask (np.ndarray[bool]): True for whitelisted (infra) vertices
+        edge_src / edge_dst (np.ndarray[int64]): Endpoints per edge ID
+        edge_amount (np.ndarray[float64]): Aggregated amount per edge ID
+        edge_amount_exact (np.ndarray[object]): Aggregated amount per edge ID as exact Python ints
+        edge_count (np.ndarray[int64]): Number of transfers per edge ID
+        out_indptr / out_indices / out_eids: CSR of outgoing edges (neighbor, edge ID)
+        in_indptr / in_indices / in_eids: CSR of incoming edges (neighbor, edge ID)
+    """
+
+    def __init__(self, g: Graph, whitelist: set[str], graph_path: str = None,
+                 chain: str = None, year: int = None, month: int = None):
+        self.g = g
+        self.graph_path = graph_path
+        self.chain = chain
+        self.year = year
+        self.month = month
+        self.n = g.vcount()
+
+        # === Vertex arrays
+        self.addresses = np.array([name.split("_")[-1].lower() for name in g.vs["name"]], dtype=object)
+        self.whitelist = whitelist
+        self.skip_mask = np.fromiter((a in whitelist for a in self.addresses), dtype=bool, count=self.n)
+
+        # === Edge arrays (indexed by igraph edge ID)
+        edges = np.array(g.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+        self.edge_src = edges[:, 0]
+        self.edge_dst = edges[:, 1]
+        self.edge_amount_exact = np.array(g.es["amount"], dtype=object) if g.ecount() else np.empty(0, dtype=object)
+        self.edge_amount = self.edge_amount_exact.astype(np.float64)
+        self.edge_count = np.asarray(g.es["count"], dtype=np.int64) if g.ecount() else np.empty(0, dtype=np.int64)
+
+        # === CSR adjacency in both directions
+        self.out_indptr, self.out_indices, self.out_eids = _build_csr(self.edge_src, self.edge_dst, self.n)
+        self.in_indptr, self.in_indices, self.in_eids = _build_csr(self.edge_dst, self.edge_src, self.n)
+
+        # === Edge-ID index: sorted (src * n + dst) keys for vectorized (u, v) → eid lookups
+        keys = self.edge_src * self.n + self.edge_dst
+        order = np.argsort(keys, kind="stable")
+        self._edge_keys = keys[order]
+        self._edge_key_eids = order
+
+        # Graph-level precomputations shared across feature families / vertex chunks
+        self._cache = {}
+        # Optional directory persisting array-dict precomputations (set by checkpointed runs)
+        self.cache_dir = None
+        # Worker processes for families that split their work into independent component units
+        self.n_jobs = 1
+
+    def cached(self, key: str, factory):
+        """
+        Return a graph-level precomputation, building it with `factory(ctx)` on first use.
+        Lets a family compute global state (e.g. cycle lists) once and reuse it per vertex chunk.
+
+        When `cache_dir` is set, dict-of-array results are also saved as `<key>.npz`
+        and reloaded on restart instead of being recomputed.
+        """
+        if key in self._cache:
+            return self._cache[key]
+
+        path = os.path.join(self.cache_dir, f"{key}.npz") if self.cache_dir else None
+        if path and os.path.exists(path):
+            with np.load(path) as data:
+                self._cache[key] = {k: data[k] for k in data.files}
+            return self._cache[key]
+
+        value = factory(self)
+        if path and isinstance(value, dict):
+            tmp_path = path.replace(".npz", ".tmp.npz")
+            np.savez(tmp_path, **value)
+            os.replace(tmp_path, path)
+        self._cache[key] = value
+        return value
+
+    def vertex_ids(self, vids=None) -> np.ndarray:
+        """Normalize an optional vertex selection (None = all vertices) to an int64 array."""
+        return np.arange(self.n, dtype=np.int64) if vids is None else np.asarray(vids, dtype=np.int64)
+
+    @property
+    def skip_vids(self) -> np.ndarray:
+        """Vertex IDs of whitelisted (infra) vertices."""
+        return np.flatnonzero(self.skip_mask)
+
+    def edge_ids(self, src, dst) -> np.ndarray:
+        """
+        Vectorized lookup of directed edge IDs.
+
+        Parameters:
+            src, dst (array-like of int): Edge endpoints
+
+        Returns:
+            np.ndarray[int64]: Edge ID per (src, dst) pair, -1 where the edge does not exist.
+        """
+        keys = np.asarray(src, dtype=np.int64) * self.n + np.asarray(dst, dtype=np.int64)
+        if len(self._edge_keys) == 0:
+            return np.full(keys.shape, -1, dtype=np.int64)
+
+        pos = np.minimum(np.searchsorted(self._edge_keys, keys), len(self._edge_keys) - 1)
+        return np.where(self._edge_keys[pos] == keys, self._edge_key_eids[pos], -1)
+
+    def successors(self, v: int) -> np.ndarray:
+        """Out-neighbors of v as a CSR slice."""
+        return self.out_indices[self.out_indptr[v]:self.out_indptr[v + 1]]
+
+    def predecessors(self, v: int) -> np.ndarray:
+        """In-neighbors of v as a CSR slice."""
+        return self.in_indices[self.in_indptr[v]:self.in_indptr[v + 1]]
+
+    def neighbor_sets(self, vids, mode: str = "out", filtered: bool = False) -> dict[int, set[int]]:
+        """
+        Neighbor sets of a vertex subset only, built from the CSR slices.
+
+        Parameters:
+            vids (array-like of int): Vertices to build sets for
+            mode (str): "out", "in" or "all" (in + out)
+            filtered (bool): Drop whitelisted neighbors (whitelisted vertices get empty sets)
+
+        Returns:
+            dict[int, set[int]]: vertex ID -> neighbor set
+        """
+        vids = np.asarray(vids, dtype=np.int64)
+        csrs = []
+        if mode != "in":
+            csrs.append((self.out_indptr, self.out_indices))
+        if mode != "out":
+            csrs.append((self.in_indptr, self.in_indices))
+
+        # (owner position, neighbor) pairs of all selected vertices, grouped by owner
+        owners, neighbors = [], []
+        for indptr, indices in csrs:
+            lengths, pos = gather_segments(indptr, vids)
+            owners.append(np.repeat(np.arange(len(vids)), lengths))
+            neighbors.append(indices[pos])
+        owner, neighbor = np.concatenate(owners), np.concatenate(neighbors)
+
+        if filtered:
+            keep = ~self.skip_mask[neighbor] & ~self.skip_mask[vids[owner]]
+            owner, neighbor = owner[keep], neighbor[keep]
+
+        order = np.argsort(owner, kind="stable")
+        bounds = np.searchsorted(owner[order], np.arange(len(vids) + 1)).tolist()
+        flat = neighbor[order].tolist()
+        return {v: set(flat[bounds[i]:bounds[i + 1]]) for i, v in enumerate(vids.tolist())}
+
+
+def group_by_vertex(vertex_ids: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Group item positions by vertex (CSR layout).
+
+    Returns:
+        indptr (n + 1,), order: items of vertex v are order[indptr[v]:indptr[v + 1]]
+    """
+    order = np.argsort(vertex_ids, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(vertex_ids, minlength=n), out=indptr[1:])
+    return indptr, order.astype(np.int64)
+
+
+def gather_segments(indptr: np.ndarray, vids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Concatenate the CSR segments of the selected vertices.
+
+    Returns:
+        lengths: segment length per selected vertex
+        positions: positions into the CSR value arrays, segment after segment
+    """
+    starts = indptr[vids]
+    lengths = indptr[vids + 1] - starts
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return lengths, offsets + np.arange(lengths.sum(), dtype=np.int64)
+
+
+def segment_sums(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Sum consecutive segments of `values` with the given lengths (empty segments sum to 0).
+    Works for object arrays too, which keeps wei amounts exact.
+    """
+    out = np.zeros(len(lengths), dtype=values.dtype)
+    if len(values) == 0:
+        return out
+    non_empty = lengths > 0
+    starts = np.cumsum(lengths) - lengths
+    out[non_empty] = np.add.reduceat(values, starts[non_empty])
+    return out
+
+
+def _build_csr(src: np.ndarray, dst: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build a CSR adjacency (indptr, neighbor indices, edge IDs) grouped by `src`.
+    """
+    indptr, order = group_by_vertex(src, n)
+    return indptr, dst[order], order
+
+
+def build_graph_context(g: Graph, whitelist_path: str = None, graph_path: str = None,
+                        chain: str = None, year: int = None, month: int = None) -> GraphContext:
+    """
+    Build the shared GraphContext for a graph, loading the whitelist exactly once.
+
+    Parameters:
+        g (igraph.Graph): Directed igraph object
+        whitelist_path (str): Path to CSV file with whitelist addresses
+        graph_path (str): Path of the graph artifact (kept for downstream bookkeeping)
+        chain, year, month: Period of the graph (lets families find neighbouring months' artifacts)
+
+    Returns:
+        GraphContext
+    """
+    whitelist_set = load_whitelist_addresses(whitelist_path) if whitelist_path else set()
+    ctx = GraphContext(g, whitelist_set, graph_path=graph_path, chain=chain, year=year, month=month)
+    print(f"✅ Whitelist match: {int(ctx.skip_mask.sum())} / {len(whitelist_set)} addresses found in graph")
+    return ctx
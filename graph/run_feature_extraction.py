@@ -1,11 +1,15 @@
 import os
 import argparse
 import pickle
-import pandas as pd
+import numpy as np
+from tqdm import tqdm
 
-from graph.feature.extract_node_features import extract_node_features
-from graph.feature.extract_motif_features import extract_motif_features
-from graph.feature.extract_egonet_features import extract_egonet_features
+from graph.feature.graph_context import build_graph_context
+from graph.feature.feature_registry import get_feature_families
+from graph.feature.feature_store import FeatureStore, file_fingerprint, whitelist_fingerprint, build_cache_key
+from graph.feature.feature_schema import build_feature_schema, write_feature_table, declared_feature_columns
+from graph.feature.checkpoint import ExtractionCheckpoint
+from graph.feature.cycle_index import write_cycle_index
 
 def get_graph_path(base_dir, chain, year, month):
     """
@@ -16,14 +20,99 @@ def get_graph_path(base_dir, chain, year, month):
         f"{chain}__token_transfer_graph__{year}_{month:02d}.pkl"
     )
 
-def run_feature_extraction(graph_path: str, year: int, month: int):
+def assemble_feature_frame(frames: list, ctx, year: int, month: int):
+    """
+    Merge per-family frames (indexed by node) and add address / metadata columns
+    (is_infra, chain_id, year, month), metadata first.
+    """
+    assert all(
+        df.index.equals(frames[0].index) for df in frames
+    ), "❌ Index mismatch: One of the feature sets is missing nodes."
+
+    df_features = frames[0].join(frames[1:], how="left")
+
+    # === Reset index so node becomes a column
+    df_features = df_features.reset_index()  # index → column 'node'
+
+    # === Add address and is_infra flag from the context
+    df_features["address"] = ctx.addresses[df_features["node"].to_numpy()]
+    df_features["is_infra"] = ctx.skip_mask[df_features["node"].to_numpy()].astype(int)
+
+    # === Add chain_id, year, month
+    df_features["chain_id"] = 1
+    df_features["year"] = year
+    df_features["month"] = month
+
+    # === Reorder columns for readability: metadata first, then features ===
+    front_cols = ["node", "address", "is_infra", "chain_id", "year", "month"]
+    cols = front_cols + [col for col in df_features.columns if col not in front_cols]
+    return df_features[cols]
+
+def extract_features_streaming(ctx, families: list, output_path: str, year: int, month: int, chunk_size: int,
+                               checkpoint: ExtractionCheckpoint):
+    """
+    Streaming mode: compute all feature families for one fixed-size vertex range at a time
+    and write it as its own Parquet part / row group.
+
+    Peak memory is the graph (+ graph-level caches such as motif memberships) plus one chunk,
+    instead of several full per-node tables. Every finished range is checkpointed, so a
+    restarted run skips the ranges already on disk.
+    """
+    completed = checkpoint.open()
+    if completed:
+        print(f"⏩ Resuming from checkpoint: {len(completed)} vertex ranges already done")
+
+    # Graph-level precomputations (e.g. motif memberships) are checkpointed as well
+    ctx.cache_dir = checkpoint.precompute_dir
+
+    for start in tqdm(range(0, ctx.n, chunk_size), desc="🧱 Extracting features by vertex range"):
+        if start in completed:
+            continue
+
+        stop = min(start + chunk_size, ctx.n)
+        vids = np.arange(start, stop, dtype=np.int64)
+        frames = [family.extract(ctx, vids) for family in families]
+        df_chunk = assemble_feature_frame(frames, ctx, year, month)
+
+        part_path = checkpoint.part_path(start)
+        write_feature_table(df_chunk, part_path + ".tmp", build_feature_schema(families, list(df_chunk.columns)))
+        os.replace(part_path + ".tmp", part_path)
+        checkpoint.mark_done(start, stop)
+
+    # Side outputs need a family's full frame (graph-level state is cached in the context)
+    for family in families:
+        if family.persist:
+            family.persist(ctx, family.extract(ctx))
+
+    checkpoint.finalize(output_path, build_feature_schema(families, declared_feature_columns(families)))
+
+def run_feature_extraction(graph_path: str, year: int, month: int, chain: str = "ethereum", use_cache: bool = True,
+                           write_csv: bool = False, chunk_size: int = None, n_jobs: int = 1,
+                           cycle_index: bool = False):
     """
     End-to-end feature extraction pipeline:
       1) Load aggregated graph pickle (g, account_to_idx).
-      2) Compute node-level, motif-level, and egonet-level features (whitelist-respecting).
-      3) Merge all features by node id.
-      4) Add address / metadata columns (is_infra, chain_id, year, month).
-      5) Save a single CSV per (chain, year, month).
+      2) Build the shared GraphContext once (CSR adjacency, edge arrays, whitelist mask).
+      3) For every registered feature family (node, motif, egonet, ...), reuse the cached
+         artifact from the month's feature store if its key (graph fingerprint, whitelist hash,
+         extractor version) still matches; otherwise recompute it and refresh the cache.
+      4) Merge all features by node id.
+      5) Add address / metadata columns (is_infra, chain_id, year, month).
+      6) Save a single typed Parquet file per (chain, year, month) (+ optional CSV copy).
+
+    With `chunk_size`, steps 3–6 run in streaming mode instead: vertex ranges of `chunk_size`
+    are computed for all families and appended as Parquet row groups (the feature store and
+    the CSV copy are skipped, since both need the full table in memory).
+
+    Crash safety: in the default mode each finished family is persisted to the feature store
+    right away; in streaming mode each finished vertex range is checkpointed with a manifest.
+    Either way a restart resumes as long as the graph and whitelist fingerprints still match.
+
+    Motif and egonet work is split by weakly connected component (after whitelist removal):
+    star components use closed forms, the rest runs as independent units on `n_jobs` processes.
+
+    With `cycle_index`, the two-node loops and triangles behind the motif features are also
+    written as a cycle table + participant index (see graph/feature/cycle_index.py).
     """
     print(f"📥 Loading graph from {graph_path} ...")
     with open(graph_path, "rb") as f:
@@ -31,54 +120,71 @@ def run_feature_extraction(graph_path: str, year: int, month: int):
 
     # === Build output path ===
     folder = os.path.dirname(graph_path)
-    filename = os.path.basename(graph_path).replace("token_transfer_graph", "features").replace(".pkl", ".csv")
-    output_csv_path = os.path.join(folder, filename)
+    filename = os.path.basename(graph_path).replace("token_transfer_graph", "features").replace(".pkl", ".parquet")
+    output_path = os.path.join(folder, filename)
 
     # === Whitelist path ===
     whitelist_path = os.path.join(os.path.dirname(__file__), "infra_whitelist.csv")
 
-    # === Feature extraction ===
-    print("📊 Extracting node-level features...")
-    df_node = extract_node_features(g, whitelist_path=whitelist_path)
-
-    print("🔺 Extracting motif-level features...")
-    df_motif = extract_motif_features(g, whitelist_path=whitelist_path)
-
-    print("🕸️ Extracting egonet-level features...")
-    df_egonet = extract_egonet_features(g, whitelist_path=whitelist_path)
+    # === Shared graph context (whitelist loaded once) ===
+    print("🧩 Building graph context...")
+    ctx = build_graph_context(g, whitelist_path=whitelist_path, graph_path=graph_path,
+                              chain=chain, year=year, month=month)
+    ctx.n_jobs = n_jobs
+    families = get_feature_families()
+
+    graph_fp = file_fingerprint(graph_path)
+    whitelist_fp = whitelist_fingerprint(ctx.whitelist)
+
+    if chunk_size:
+        print(f"🌊 Streaming feature extraction in chunks of {chunk_size:,} vertices")
+        checkpoint = ExtractionCheckpoint(folder, fingerprint={
+            "graph": graph_fp,
+            "whitelist": whitelist_fp,
+            "families": {family.name: family.version for family in families},
+            "chunk_size": chunk_size,
+        })
+        extract_features_streaming(ctx, families, output_path, year, month, chunk_size, checkpoint)
+        print(f"💾 Saved to {output_path}")
+        if cycle_index:
+            write_cycle_index(ctx, folder, chain, year, month)
+        print("✅ Done.")
+        return
+
+    # === Feature store keyed by graph fingerprint + whitelist hash + extractor version ===
+    store = FeatureStore(folder, chain, year, month)
+
+    # === Feature extraction (recompute only families whose key changed) ===
+    frames = []
+    for family in families:
+        key = build_cache_key(graph_fp, whitelist_fp, family)
+        df_family = store.load(family.name, key) if use_cache else None
+
+        if df_family is not None:
+            print(f"♻️ Reusing cached {family.name} features (v{family.version})")
+        else:
+            print(f"{family.description}: extracting {family.name} features...")
+            df_family = family.extract(ctx)
+            store.save(family.name, key, df_family)
+
+        if family.persist:
+            family.persist(ctx, df_family)
+        frames.append(df_family)
 
     # === Merge all ===
     print("🔗 Merging all features...")
-    assert (
-    df_node.index.equals(df_motif.index) and df_node.index.equals(df_egonet.index)
-), "❌ Index mismatch: One of the feature sets is missing nodes."
-    
-    df_features = df_node.join(df_motif, how="left").join(df_egonet, how="left")
-
-    # === Reset index so node becomes a column
-    df_features = df_features.reset_index()  # index → column 'node'
-
-    # === Add address from g.vs["name"]
-    df_features["address"] = df_features["node"].map(lambda i: g.vs[i]["name"])
-    df_features["address"] = df_features["address"].str.split("_").str[-1].str.lower()
-
-    # === Add is_infra flag from whitelist
-    whitelist_df = pd.read_csv(whitelist_path)
-    whitelist_set = set(whitelist_df["address"].str.strip().str.lower())
-    df_features["is_infra"] = df_features["address"].apply(lambda addr: 1 if addr in whitelist_set else 0)
+    df_final = assemble_feature_frame(frames, ctx, year, month)
 
-    # === Add chain_id, year, month
-    df_features["chain_id"] = 1
-    df_features["year"] = year
-    df_features["month"] = month
+    print(f"💾 Saving to {output_path}")
+    write_feature_table(df_final, output_path, build_feature_schema(families, list(df_final.columns)))
 
-    # === Reorder columns for readability: metadata first, then features ===
-    front_cols = ["node", "address", "is_infra", "chain_id", "year", "month"]
-    cols = front_cols + [col for col in df_features.columns if col not in front_cols]
-    df_final = df_features[cols]
+    if write_csv:
+        output_csv_path = output_path.replace(".parquet", ".csv")
+        print(f"💾 Saving CSV copy to {output_csv_path}")
+        df_final.to_csv(output_csv_path, index=False)
 
-    print(f"💾 Saving to {output_csv_path}")
-    df_final.to_csv(output_csv_path, index=False)
+    if cycle_index:
+        write_cycle_index(ctx, folder, chain, year, month)
     print("✅ Done.")
 
 if __name__ == "__main__":
@@ -86,6 +192,14 @@ if __name__ == "__main__":
     parser.add_argument("--chain", type=str, default="ethereum")
     parser.add_argument("--year", type=int, required=True)
     parser.add_argument("--month", type=int, required=True)
+    parser.add_argument("--no-cache", action="store_true", help="Recompute every feature family, ignoring the feature store")
+    parser.add_argument("--csv", action="store_true", help="Also write a CSV copy of the feature table")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Streaming mode: process vertices in ranges of this size, one Parquet row group each")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Worker processes for component-partitioned families (motif, egonet)")
+    parser.add_argument("--cycle-index", action="store_true",
+                        help="Also write the cycle table + participant index used for loop lookups by address")
     args = parser.parse_args()
 
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -94,4 +208,6 @@ if __name__ == "__main__":
     if not os.path.exists(graph_path):
         raise FileNotFoundError(f"Graph file not found: {graph_path}")
 
-    run_feature_extraction(graph_path, args.year, args.month)
\ No newline at end of file
+    run_feature_extraction(graph_path, args.year, args.month, chain=args.chain, use_cache=not args.no_cache,
+                           write_csv=args.csv, chunk_size=args.chunk_size, n_jobs=args.jobs,
+                           cycle_index=args.cycle_index)
\ No newline at end of file
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import networkx as nx
+import pytest
+
+from graph.construction.build_token_transfer_graph import build_igraph_from_edgelist
+from graph.feature.graph_context import GraphContext
+
+# Unix time of 2023-01-01, start of the synthetic transfer streams
+MONTH_START = 1_672_531_200
+
+
+def random_transfers(seed: int, n_accounts: int = 60, n_transfers: int = 400, n_days: int = 30) -> pd.DataFrame:
+    """
+    Random token transfers between `n_accounts` synthetic addresses, in the abstract edgelist
+    layout (address_sid = "1_0x<40 hex>"); repeated pairs, self-loops and same-hour bursts occur.
+    """
+    rng = np.random.default_rng(seed)
+    sids = np.array([f"1_0x{i:040x}" for i in range(n_accounts)])
+    return pd.DataFrame({
+        "from_address_sid": sids[rng.integers(0, n_accounts, n_transfers)],
+        "to_address_sid": sids[rng.integers(0, n_accounts, n_transfers)],
+        "amount": [int(a) * 10**15 for a in rng.integers(1, 10**6, n_transfers)],
+        "transfer_sid": np.arange(n_transfers),
+        "timestamp": MONTH_START + rng.integers(0, n_days * 86400, n_transfers),
+        "token_sid": 1,
+    })
+
+
+def build_context(transfers: pd.DataFrame, whitelist: set[str] = frozenset(), **kwargs) -> GraphContext:
+    """GraphContext of the aggregated graph of `transfers` (whitelist: lowercase pure addresses)."""
+    g, _ = build_igraph_from_edgelist(transfers)
+    return GraphContext(g, set(whitelist), **kwargs)
+
+
+def to_networkx(ctx: GraphContext, filtered: bool = True) -> nx.DiGraph:
+    """
+    Reference networkx graph of a context (vertex IDs as nodes, edge attributes amount / count);
+    `filtered` drops whitelisted vertices, as the feature families do.
+    """
+    G = nx.DiGraph()
+    keep = ~ctx.skip_mask if filtered else np.ones(ctx.n, dtype=bool)
+    G.add_nodes_from(np.flatnonzero(keep).tolist())
+    for u, v, amount, count in zip(ctx.edge_src, ctx.edge_dst, ctx.edge_amount_exact, ctx.edge_count):
+        if keep[u] and keep[v]:
+            G.add_edge(int(u), int(v), amount=amount, count=int(count))
+    return G
+
+
+@pytest.fixture(params=[0, 1, 2])
+def seed(request):
+    return request.param
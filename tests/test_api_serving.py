@@ -0,0 +1,139 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from analysis.scoring import serving_table
+from analysis.scoring.scoring import SCORE_COMPONENTS
+from analysis.scoring.serving_table import (
+    build_serving_table, write_serving_table, build_top_table, write_top_table, get_serving_path
+)
+from api import utils
+from api.app import app
+from api.utils import load_address_index, lookup_address, read_top_rows
+
+N_ROWS = 50
+ROW_GROUP_SIZE = 8
+TOP_K = 10
+# Addresses are even offsets from ADDRESS_BASE, so odd offsets fall between stored addresses
+ADDRESS_BASE = 0xabc000
+COLUMNS = ["address", "in_degree", "rule_flags", "final_score_0_100"]
+
+
+def address(offset: int) -> str:
+    return f"0x{ADDRESS_BASE + offset:040x}"
+
+
+def result_frame(seed: int = 0) -> pd.DataFrame:
+    """Analysis result rows (mixed-case addresses, shuffled) with distinct scores and two infra rows."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"address": [address(2 * i).upper().replace("0X", "0x") for i in rng.permutation(N_ROWS)]})
+    for col in serving_table.SERVING_SCHEMA.names[1:]:
+        df[col] = rng.integers(0, 100, N_ROWS).astype(float)
+    df["is_infra"] = 0
+    df["rule_flags"] = rng.integers(0, 64, N_ROWS)
+    for col in SCORE_COMPONENTS + ["final_score_0_100"]:
+        df[col] = rng.permutation(N_ROWS) * 100.0 / N_ROWS
+    df.loc[:1, "is_infra"] = 1
+    df.loc[:1, SCORE_COMPONENTS + ["final_score_0_100", "final_score_top_percent"]] = np.nan
+    return df
+
+
+@pytest.fixture
+def serving_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(serving_table, "SERVING_ROW_GROUP_SIZE", ROW_GROUP_SIZE)
+    monkeypatch.setattr(serving_table, "TOP_ROW_GROUP_SIZE", 3)
+    monkeypatch.setattr(utils, "_ADDRESS_INDEXES", {})
+    path = get_serving_path(str(tmp_path), "ethereum", 2023, 1)
+    os.makedirs(os.path.dirname(path))
+    write_serving_table(build_serving_table(result_frame(), "ethereum", 2023, 1), path)
+    return path
+
+
+def test_lookup_address_hits_every_row(serving_path):
+    expected = pq.read_table(serving_path, columns=COLUMNS).to_pylist()
+
+    index = load_address_index(serving_path)
+
+    assert len(index["min"]) == -(-N_ROWS // ROW_GROUP_SIZE) and "file" not in index
+    for row in expected:
+        assert lookup_address(index, row["address"], COLUMNS) == row
+
+
+@pytest.mark.parametrize("offset", [
+    2 * ROW_GROUP_SIZE - 1,  # between the last address of group 0 and the first of group 1
+    2 * ROW_GROUP_SIZE + 3,  # inside the range of group 1, but not stored
+    -1,                      # before the first group
+    2 * N_ROWS,              # after the last group
+])
+def test_lookup_address_misses(serving_path, offset):
+    assert lookup_address(load_address_index(serving_path), address(offset), COLUMNS) is None
+
+
+def test_address_index_is_cached_until_the_file_changes(serving_path):
+    index = load_address_index(serving_path)
+    assert load_address_index(serving_path) is index
+
+    # No handle is held: the pipeline can replace the file, and the next lookup sees the new rows
+    df = result_frame(seed=1)
+    write_serving_table(build_serving_table(df, "ethereum", 2023, 1), serving_path)
+    os.utime(serving_path, (index["mtime"] + 10, index["mtime"] + 10))
+
+    rebuilt = load_address_index(serving_path)
+    assert rebuilt is not index
+    row = lookup_address(rebuilt, address(2 * 10), ["in_degree"])
+    assert row["in_degree"] == df.loc[df["address"].str.lower() == address(2 * 10), "in_degree"].item()
+
+
+def write_top(serving_path: str, k: int) -> str:
+    path = serving_path.replace("analysis_serving", "analysis_top")
+    write_top_table(build_top_table(pq.read_table(serving_path), k=k), path)
+    return path
+
+
+def test_read_top_rows_slices_the_ranking(serving_path):
+    ranked = pq.read_table(serving_path).to_pandas().sort_values("final_score_0_100", ascending=False)
+    path = write_top(serving_path, TOP_K)
+
+    df = read_top_rows(path, 5, ["ranking", "address", "final_score_0_100"])
+
+    assert df["ranking"].tolist() == [1, 2, 3, 4, 5]
+    assert df["address"].tolist() == ranked["address"].iloc[:5].tolist()
+    assert read_top_rows(path, 0, ["ranking"]).empty
+
+
+def test_read_top_rows_falls_back_beyond_k(serving_path):
+    path = write_top(serving_path, TOP_K)
+
+    assert read_top_rows(path, TOP_K, ["ranking"]) is not None
+    # More ranks than stored, with the month larger than K: the caller must scan
+    assert read_top_rows(path, TOP_K + 1, ["ranking"]) is None
+    assert read_top_rows(path + ".missing", 5, ["ranking"]) is None
+
+
+def test_read_top_rows_complete_ranking_serves_any_n(serving_path):
+    path = write_top(serving_path, N_ROWS + 10)
+
+    df = read_top_rows(path, N_ROWS + 100, ["ranking", "final_score_0_100"])
+
+    assert df["ranking"].tolist() == list(range(1, N_ROWS + 1))
+    # Unscored infra rows rank last
+    assert df["final_score_0_100"].iloc[-2:].isna().all()
+
+
+@pytest.mark.parametrize("n", [5, TOP_K + 5])
+def test_top_endpoint_same_with_and_without_top_table(serving_path, monkeypatch, n):
+    base_dir = serving_path[:serving_path.index(os.sep + "data" + os.sep)]
+    monkeypatch.setattr(utils, "BASE_DIR", base_dir)
+    client = app.test_client()
+    url = f"/v1/top?chain=ethereum&year=2023&month=1&n={n}"
+
+    scanned = client.get(url)
+    write_top(serving_path, TOP_K)
+    served = client.get(url)
+
+    assert scanned.status_code == served.status_code == 200
+    assert served.get_json() == scanned.get_json()
+    assert [r["ranking"] for r in served.get_json()] == list(range(1, n + 1))
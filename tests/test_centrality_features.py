@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from conftest import random_transfers, build_context
+from graph.feature import extract_centrality_features as centrality
+from graph.feature.feature_registry import get_feature_families
+from graph.feature.feature_store import FeatureStore
+
+
+def month_context(transfers: pd.DataFrame, root, month: int):
+    month_dir = os.path.join(root, "ethereum", "2023", f"{month:02d}")
+    os.makedirs(month_dir, exist_ok=True)
+    graph_path = os.path.join(month_dir, f"ethereum__token_transfer_graph__2023_{month:02d}.pkl")
+    return build_context(transfers, graph_path=graph_path, chain="ethereum", year=2023, month=month)
+
+
+def next_month_transfers(transfers: pd.DataFrame, seed: int, new_component: bool = True) -> pd.DataFrame:
+    """
+    Last month's transfers, slightly perturbed, plus (with `new_component`) a new disconnected
+    component of unseen addresses moving far larger amounts (it dominates HITS, but has no
+    warm-start state).
+    """
+    rng = np.random.default_rng(seed + 100)
+    kept = transfers.sample(frac=0.95, random_state=seed).copy()
+    kept["amount"] = [a * int(rng.integers(90, 111)) // 100 for a in kept["amount"]]
+    if not new_component:
+        return kept
+    new = [f"1_0x{0xff00 + i:040x}" for i in range(4)]
+    extra = pd.DataFrame({
+        "from_address_sid": [new[0], new[0], new[1], new[2]],
+        "to_address_sid": [new[1], new[2], new[3], new[3]],
+        "amount": [10**30, 3 * 10**29, 10**29, 2 * 10**29],
+        "transfer_sid": np.arange(4) + len(transfers),
+        "timestamp": kept["timestamp"].iloc[:4].to_numpy(),
+        "token_sid": 1,
+    })
+    return pd.concat([kept, extra], ignore_index=True)
+
+
+@pytest.mark.parametrize("new_component", [True, False])
+def test_warm_start_converges_to_cold_start(seed, new_component, tmp_path):
+    transfers = random_transfers(seed, n_accounts=80, n_transfers=500)
+    ctx_prev = month_context(transfers, tmp_path, 1)
+    centrality.write_centrality_state(ctx_prev, centrality.extract_centrality_features(ctx_prev))
+
+    ctx = month_context(next_month_transfers(transfers, seed, new_component), tmp_path, 2)
+    init = centrality.load_warm_start(ctx, centrality.get_previous_state_path(ctx))
+    assert init is not None
+
+    warm = centrality.compute_centrality(ctx, warm_start=True)
+    cold = centrality.compute_centrality(ctx, warm_start=False)
+    for key in ("pagerank", "hub", "authority"):
+        np.testing.assert_allclose(warm[key], cold[key], rtol=0, atol=1e-8, err_msg=key)
+
+    W, active = centrality.build_weighted_adjacency(ctx), ~ctx.skip_mask
+    assert centrality.pagerank(W, active, x0=init["pagerank"])[1] < centrality.pagerank(W, active)[1]
+    warm_hits, cold_hits = centrality.hits(W, active, h0=init["hub"])[2], centrality.hits(W, active)[2]
+    # A new dominant component has no state: its HITS mass grows from the uniform share either way
+    assert warm_hits <= cold_hits if new_component else warm_hits < cold_hits
+
+
+def test_state_written_for_cached_features(tmp_path):
+    ctx = month_context(random_transfers(0), tmp_path, 1)
+    family = get_feature_families(["centrality"])[0]
+    store = FeatureStore(os.path.dirname(ctx.graph_path), "ethereum", 2023, 1)
+    store.save(family.name, {"version": family.version}, family.extract(ctx))
+
+    # A month served from the feature store still leaves its state behind for the next month
+    family.persist(ctx, store.load(family.name, {"version": family.version}))
+
+    state = pq.read_table(centrality.get_centrality_state_path(os.path.dirname(ctx.graph_path), "ethereum", 2023, 1))
+    assert state.num_rows == int((~ctx.skip_mask).sum())
+    np.testing.assert_allclose(np.sum(state.column("pagerank").to_numpy()), 1.0)
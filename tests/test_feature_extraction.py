@@ -0,0 +1,152 @@
+import os
+import pickle
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from conftest import random_transfers
+from graph.construction.build_token_transfer_graph import build_igraph_from_edgelist
+from graph.feature import graph_context
+from graph.feature.feature_registry import get_feature_families
+from graph.run_feature_extraction import run_feature_extraction
+
+CHUNK_SIZE = 7
+# Vertex range on which the failing family raises
+FAILING_START = 2 * CHUNK_SIZE
+# Non-whitelisted account of the synthetic month, whitelisted to change the whitelist hash
+EXTRA_INFRA = f"0x{5:040x}"
+
+
+@pytest.fixture
+def graph_path(tmp_path):
+    """Graph pickle + edgelist of a synthetic month (one whitelisted address) in a month folder."""
+    transfers = random_transfers(0, n_accounts=40, n_transfers=200)
+    whitelist = pd.read_csv(os.path.join(os.path.dirname(__file__), "..", "graph", "infra_whitelist.csv"))
+    transfers.loc[:9, "to_address_sid"] = f"1_{whitelist['address'].iloc[0].lower()}"
+
+    month_dir = tmp_path / "ethereum" / "2023" / "01"
+    month_dir.mkdir(parents=True)
+    transfers.assign(amount=transfers["amount"].astype(str)).to_parquet(
+        month_dir / "ethereum__token_transfer_edgelist__2023_01.parquet", index=False
+    )
+    path = month_dir / "ethereum__token_transfer_graph__2023_01.pkl"
+    with open(path, "wb") as f:
+        pickle.dump(build_igraph_from_edgelist(transfers), f)
+    return str(path)
+
+
+def output_path(graph_path: str) -> str:
+    return graph_path.replace("token_transfer_graph", "features").replace(".pkl", ".parquet")
+
+
+def record_ranges(monkeypatch, family_name: str, fail_at: int = None) -> list[int]:
+    """Wrap one family's extractor: record the vertex ranges it computes, raise on `fail_at`."""
+    family = get_feature_families([family_name])[0]
+    extractor = family.extractor
+    starts = []
+
+    def wrapped(ctx, vids=None):
+        if vids is not None:
+            if int(vids[0]) == fail_at:
+                raise RuntimeError(f"failure injected at vertex {fail_at}")
+            starts.append(int(vids[0]))
+        return extractor(ctx, vids=vids)
+
+    monkeypatch.setattr(family, "extractor", wrapped)
+    return starts
+
+
+def record_extractions(monkeypatch) -> list[str]:
+    """Wrap every family's extractor: record the families computed over the whole graph."""
+    computed = []
+    for family in get_feature_families():
+        def wrapped(ctx, vids=None, name=family.name, extractor=family.extractor):
+            if vids is None:
+                computed.append(name)
+            return extractor(ctx, vids=vids)
+        monkeypatch.setattr(family, "extractor", wrapped)
+    return computed
+
+
+def in_memory_features(graph_path: str) -> pd.DataFrame:
+    run_feature_extraction(graph_path, 2023, 1, use_cache=False)
+    df = pd.read_parquet(output_path(graph_path))
+    os.remove(output_path(graph_path))
+    return df
+
+
+def test_streaming_matches_in_memory(graph_path):
+    expected = in_memory_features(graph_path)
+    assert expected["is_infra"].sum() == 1
+
+    run_feature_extraction(graph_path, 2023, 1, chunk_size=CHUNK_SIZE)
+
+    assert pq.ParquetFile(output_path(graph_path)).num_row_groups == -(-len(expected) // CHUNK_SIZE)
+    pd.testing.assert_frame_equal(pd.read_parquet(output_path(graph_path)), expected)
+    assert not os.path.exists(os.path.join(os.path.dirname(graph_path), "feature_checkpoint"))
+
+
+def test_streaming_resumes_unfinished_ranges(graph_path, monkeypatch):
+    expected = in_memory_features(graph_path)
+    all_starts = list(range(0, len(expected), CHUNK_SIZE))
+
+    with monkeypatch.context() as m:
+        record_ranges(m, "egonet", fail_at=FAILING_START)
+        with pytest.raises(RuntimeError, match="failure injected"):
+            run_feature_extraction(graph_path, 2023, 1, chunk_size=CHUNK_SIZE)
+    assert not os.path.exists(output_path(graph_path))
+
+    computed = record_ranges(monkeypatch, "egonet")
+    run_feature_extraction(graph_path, 2023, 1, chunk_size=CHUNK_SIZE)
+
+    assert computed == [s for s in all_starts if s >= FAILING_START]
+    pd.testing.assert_frame_equal(pd.read_parquet(output_path(graph_path)), expected)
+    assert not os.path.exists(os.path.join(os.path.dirname(graph_path), "feature_checkpoint"))
+
+
+@pytest.mark.parametrize("change", ["chunk_size", "family_version"])
+def test_changed_fingerprint_discards_checkpoint(graph_path, change, monkeypatch):
+    expected = in_memory_features(graph_path)
+
+    with monkeypatch.context() as m:
+        record_ranges(m, "egonet", fail_at=FAILING_START)
+        with pytest.raises(RuntimeError, match="failure injected"):
+            run_feature_extraction(graph_path, 2023, 1, chunk_size=CHUNK_SIZE)
+
+    # A new chunk size or family version changes the fingerprint: no range of the old run is reused
+    chunk_size = CHUNK_SIZE + 1 if change == "chunk_size" else CHUNK_SIZE
+    if change == "family_version":
+        family = get_feature_families(["node"])[0]
+        monkeypatch.setattr(family, "version", family.version + 1)
+    computed = record_ranges(monkeypatch, "egonet")
+    run_feature_extraction(graph_path, 2023, 1, chunk_size=chunk_size)
+
+    assert computed == list(range(0, len(expected), chunk_size))
+    pd.testing.assert_frame_equal(pd.read_parquet(output_path(graph_path)), expected)
+
+
+@pytest.mark.parametrize("change", [None, "family_version", "whitelist"])
+def test_feature_store_recomputes_only_invalidated_families(graph_path, change, monkeypatch):
+    run_feature_extraction(graph_path, 2023, 1)
+    families = [family.name for family in get_feature_families()]
+
+    # A version bump invalidates one family; the whitelist hash is part of every family's key
+    if change == "family_version":
+        family = get_feature_families(["khop"])[0]
+        monkeypatch.setattr(family, "version", family.version + 1)
+        expected_computed = ["khop"]
+    elif change == "whitelist":
+        load_whitelist = graph_context.load_whitelist_addresses
+        monkeypatch.setattr(graph_context, "load_whitelist_addresses", lambda path: load_whitelist(path) | {EXTRA_INFRA})
+        expected_computed = families
+    else:
+        expected_computed = []
+    with monkeypatch.context() as m:
+        computed = record_extractions(m)
+        run_feature_extraction(graph_path, 2023, 1)
+    cached = pd.read_parquet(output_path(graph_path))
+
+    assert computed == expected_computed
+    assert cached["is_infra"].sum() == (2 if change == "whitelist" else 1)
+    pd.testing.assert_frame_equal(cached, in_memory_features(graph_path))
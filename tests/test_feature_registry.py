@@ -0,0 +1,12 @@
+import graph.feature.cycle_index  # noqa: F401  (registers the motif family before node, as the runner did)
+from graph.feature.feature_registry import get_feature_families, FAMILY_ORDER
+from graph.feature.feature_schema import declared_feature_columns
+
+
+def test_family_order_independent_of_imports():
+    assert [family.name for family in get_feature_families()] == FAMILY_ORDER
+
+
+def test_feature_columns_start_with_node_features():
+    columns = declared_feature_columns(get_feature_families())
+    assert columns[6:9] == ["in_degree", "out_degree", "in_transfer_count"]
@@ -0,0 +1,59 @@
+from collections import defaultdict
+
+import numpy as np
+import networkx as nx
+import pytest
+
+from conftest import random_transfers, build_context, to_networkx
+from graph.feature import extract_kcycle_features as kcycle
+
+
+def reference_cycle_stats(G: nx.DiGraph) -> dict:
+    """Per-node count / amount / tx_count of the directed 4- and 5-cycles, by enumeration."""
+    stats = defaultdict(float)
+    for cycle in nx.simple_cycles(G, length_bound=5):
+        k = len(cycle)
+        if k not in kcycle.KCYCLE_LENGTHS:
+            continue
+        edges = list(zip(cycle, cycle[1:] + cycle[:1]))
+        amount = sum(float(G.edges[e]["amount"]) for e in edges)
+        tx_count = sum(G.edges[e]["count"] for e in edges)
+        name = kcycle.LENGTH_NAMES[k]
+        for v in cycle:
+            stats[v, f"{name}_node_loop_count"] += 1
+            stats[v, f"{name}_node_loop_amount"] += amount
+            stats[v, f"{name}_node_loop_tx_count"] += tx_count
+    return stats
+
+
+@pytest.mark.parametrize("batch_paths", [kcycle.MAX_PATHS_PER_BATCH, 40])
+def test_kcycles_match_enumeration(seed, batch_paths, monkeypatch):
+    monkeypatch.setattr(kcycle, "MAX_PATHS_PER_BATCH", batch_paths)
+    transfers = random_transfers(seed, n_accounts=30, n_transfers=150)
+    whitelist = {transfers["from_address_sid"].iloc[0].split("_")[1]}
+    ctx = build_context(transfers, whitelist)
+    G = to_networkx(ctx)
+
+    df = kcycle.extract_kcycle_features(ctx)
+
+    expected = reference_cycle_stats(G)
+    assert expected, "synthetic graph should contain 4-/5-cycles"
+    for v in G.nodes:
+        assert df.at[v, "k_cycle_budget_exhausted"] == 0
+        for col in kcycle.KCYCLE_FEATURE_SCHEMA:
+            if col != "k_cycle_budget_exhausted":
+                assert np.isclose(df.at[v, col], expected[v, col], rtol=1e-12), (v, col)
+    assert df.loc[ctx.skip_mask].isna().all(axis=None)
+
+
+def test_exhausted_budget_gives_lower_bounds(monkeypatch):
+    monkeypatch.setattr(kcycle._cycles_from_roots, "__defaults__", (max(kcycle.KCYCLE_LENGTHS), 30))
+    ctx = build_context(random_transfers(0, n_accounts=30, n_transfers=150))
+
+    df = kcycle.extract_kcycle_features(ctx)
+
+    expected = reference_cycle_stats(to_networkx(ctx))
+    assert df["k_cycle_budget_exhausted"].sum() > 0
+    for v in range(ctx.n):
+        for name in ("four", "five"):
+            assert df.at[v, f"{name}_node_loop_count"] <= expected[v, f"{name}_node_loop_count"]
@@ -0,0 +1,69 @@
+import numpy as np
+import networkx as nx
+
+from conftest import random_transfers, build_context, to_networkx
+from graph.feature import extract_khop_features as khop
+
+
+def test_two_hop_reach_matches_bfs(seed, monkeypatch):
+    # Small batches, so the batched expansion path is exercised
+    monkeypatch.setattr(khop, "MAX_PAIRS_PER_BATCH", 50)
+    transfers = random_transfers(seed)
+    whitelist = {transfers["to_address_sid"].iloc[0].split("_")[1]}
+    ctx = build_context(transfers, whitelist)
+    G = to_networkx(ctx)
+
+    df = khop.extract_khop_features(ctx)
+
+    for v in G.nodes:
+        reach = nx.single_source_shortest_path_length(G, v, cutoff=2)
+        assert df.at[v, "two_hop_reach_count"] == len(reach) - 1
+        assert df.at[v, "two_hop_reach_capped"] == 0
+    assert df.loc[ctx.skip_mask].isna().all(axis=None)
+
+
+def test_two_hop_inflow_matches_senders(seed):
+    ctx = build_context(random_transfers(seed))
+    G = to_networkx(ctx)
+
+    df = khop.extract_khop_features(ctx)
+
+    for v in G.nodes:
+        inflow = sum(
+            float(G.edges[w, u]["amount"]) for u in G.predecessors(v) for w in G.predecessors(u)
+        )
+        assert np.isclose(df.at[v, "two_hop_inflow_amount"], inflow, rtol=1e-12)
+
+
+def test_infra_distance_matches_undirected_bfs(seed):
+    transfers = random_transfers(seed, n_accounts=200, n_transfers=250)
+    whitelist = {sid.split("_")[1] for sid in transfers["from_address_sid"].iloc[:2]}
+    ctx = build_context(transfers, whitelist)
+    U = to_networkx(ctx, filtered=False).to_undirected()
+
+    distance = khop.compute_infra_distance(ctx)
+
+    reference = nx.multi_source_dijkstra_path_length(U, set(ctx.skip_vids.tolist()), cutoff=khop.INFRA_MAX_HOPS)
+    expected = np.full(ctx.n, np.nan)
+    expected[list(reference)] = list(reference.values())
+    np.testing.assert_array_equal(distance, expected)
+
+
+def test_capped_reach_is_a_lower_bound(seed, monkeypatch):
+    monkeypatch.setattr(khop, "MAX_FRONTIER_PER_VERTEX", 40)
+    transfers = random_transfers(seed)
+    whitelist = {transfers["to_address_sid"].iloc[0].split("_")[1]}
+    ctx = build_context(transfers, whitelist)
+    G = to_networkx(ctx)
+
+    df = khop.extract_khop_features(ctx)
+
+    capped = df["two_hop_reach_capped"] == 1
+    assert capped.sum() > 0 and (~capped & ~ctx.skip_mask).sum() > 0
+    for v in G.nodes:
+        reach = len(nx.single_source_shortest_path_length(G, v, cutoff=2)) - 1
+        if capped[v]:
+            # Never above the true reach, never below the hop-1 targets it always covers
+            assert len(set(G.successors(v)) - {v}) <= df.at[v, "two_hop_reach_count"] <= reach
+        else:
+            assert df.at[v, "two_hop_reach_count"] == reach
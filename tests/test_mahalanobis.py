@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from scipy.spatial.distance import mahalanobis
+
+from analysis.detectors.statistical_anomaly_detection import (
+    factor_covariance, mahalanobis_distances, mahalanobis_squared, score_mahalanobis, SHRINKAGE_ALPHA
+)
+
+FEATURES = ["a", "b", "c", "d"]
+
+
+def correlated_sample(seed: int, n: int = 300) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    mixing = rng.normal(size=(len(FEATURES), len(FEATURES)))
+    return rng.standard_t(df=4, size=(n, len(FEATURES))) @ mixing + rng.normal(size=len(FEATURES))
+
+
+def rank_deficient_sample(seed: int) -> np.ndarray:
+    """Last column = sum of the first two (like collinear log in/out features): singular covariance."""
+    data = correlated_sample(seed)
+    data[:, 3] = data[:, 0] + data[:, 1]
+    return data
+
+
+def test_cholesky_matches_scipy(seed):
+    data = correlated_sample(seed)
+    mean, cov = data.mean(axis=0), np.cov(data, rowvar=False)
+
+    method, _ = factor_covariance(cov)
+    distances = mahalanobis_distances(data, FEATURES)
+
+    assert method == "cholesky"
+    expected = [mahalanobis(row, mean, np.linalg.inv(cov)) for row in data]
+    np.testing.assert_allclose(distances, expected, rtol=1e-9)
+
+
+def test_pinv_fallback_on_singular_covariance(seed):
+    data = rank_deficient_sample(seed)
+    mean, cov = data.mean(axis=0), np.cov(data, rowvar=False)
+
+    method, factor = factor_covariance(cov, singular="pinv")
+    d2 = mahalanobis_squared(data, mean, method, factor)
+
+    assert method == "pinv" and factor.shape == (3, len(FEATURES))
+    centered = data - mean
+    expected = np.einsum("ij,jk,ik->i", centered, np.linalg.pinv(cov, rcond=1e-10, hermitian=True), centered)
+    np.testing.assert_allclose(d2, expected, rtol=1e-7)
+
+
+def test_shrinkage_fallback_on_singular_covariance(seed):
+    data = rank_deficient_sample(seed)
+    mean, cov = data.mean(axis=0), np.cov(data, rowvar=False)
+
+    method, factor = factor_covariance(cov, singular="shrinkage")
+    d2 = mahalanobis_squared(data, mean, method, factor)
+
+    assert method == "cholesky"
+    p = len(FEATURES)
+    shrunk = (1 - SHRINKAGE_ALPHA) * cov + SHRINKAGE_ALPHA * np.trace(cov) / p * np.eye(p)
+    expected = [mahalanobis(row, mean, np.linalg.inv(shrunk)) ** 2 for row in data]
+    np.testing.assert_allclose(d2, expected, rtol=1e-9)
+
+
+@pytest.mark.parametrize("singular", ["pinv", "shrinkage"])
+@pytest.mark.parametrize("make_sample", [correlated_sample, rank_deficient_sample])
+def test_chunking_does_not_change_distances(make_sample, singular):
+    data = make_sample(0)
+
+    full, model = mahalanobis_distances(data, FEATURES, singular=singular, return_model=True)
+    chunked = mahalanobis_distances(data, FEATURES, singular=singular, chunk_rows=7)
+
+    np.testing.assert_allclose(chunked, full, rtol=1e-12)
+    np.testing.assert_allclose(score_mahalanobis(data, model, chunk_rows=11), full, rtol=1e-12)
+
+
+def test_constant_features_are_dropped():
+    data = correlated_sample(0)
+    data[:, 2] = 5.0
+    data[:, 1] = np.nan
+
+    distances, model = mahalanobis_distances(data, FEATURES, return_model=True)
+
+    np.testing.assert_array_equal(model["keep"], [True, False, False, True])
+    np.testing.assert_allclose(distances, mahalanobis_distances(data[:, [0, 3]], ["a", "d"]), rtol=1e-12)
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import networkx as nx
+import pytest
+
+from conftest import random_transfers, build_context, to_networkx, MONTH_START
+from graph.feature import components
+from graph.feature.extract_motif_features import extract_motif_features
+from graph.feature.extract_egonet_features import extract_egonet_features
+
+# Pure address of the hub the spoke accounts send to (whitelisted in some tests)
+HUB = f"0x{0xaaaa:040x}"
+
+
+def component_transfers(seed: int) -> pd.DataFrame:
+    """
+    A random sparse core plus explicit star, pair and isolated-self-loop components, and a hub
+    that links 20 otherwise isolated accounts (whitelisting it turns them into isolated vertices).
+    """
+    core = random_transfers(seed, n_accounts=60, n_transfers=150)
+    sid = lambda i: f"1_0x{0xff000 + i:040x}"
+    src, dst = [], []
+    # Star: center 0 → 1..5, with one spoke sending back (mutual pair inside a star)
+    src += [sid(0)] * 5 + [sid(1)]
+    dst += [sid(i) for i in range(1, 6)] + [sid(0)]
+    # Isolated pairs (one mutual) and a lone self-loop
+    src += [sid(10), sid(12), sid(13), sid(14)]
+    dst += [sid(11), sid(13), sid(12), sid(14)]
+    # Hub spokes, including one core account so the hub also touches the core
+    spokes = [sid(100 + i) for i in range(20)] + [core["from_address_sid"].iloc[0]]
+    src += spokes
+    dst += [f"1_{HUB}"] * len(spokes)
+
+    extra = pd.DataFrame({
+        "from_address_sid": src,
+        "to_address_sid": dst,
+        "amount": [10**18 * (i + 1) for i in range(len(src))],
+        "transfer_sid": np.arange(len(src)) + len(core),
+        "timestamp": MONTH_START + np.arange(len(src)),
+        "token_sid": 1,
+    })
+    return pd.concat([core, extra], ignore_index=True)
+
+
+def reference_motif_features(G: nx.DiGraph) -> pd.DataFrame:
+    """
+    Motif features by brute force over the filtered graph. Like the original extractor, a
+    triangle is the rotation u -> w -> v -> u with u < w < v, and a self-loop is its own
+    mutual pair.
+    """
+    rows = {v: dict.fromkeys(["self_loop_count", "two_node_loop_count", "two_node_loop_amount",
+                              "two_node_loop_tx_count", "triangle_loop_count", "triangle_loop_amount",
+                              "triangle_loop_tx_count"], 0.0) for v in G.nodes}
+    amount = lambda u, v: float(G.edges[u, v]["amount"])
+    count = lambda u, v: G.edges[u, v]["count"]
+    for u, v in G.edges:
+        if u == v:
+            rows[u]["self_loop_count"] = 1
+        if G.has_edge(v, u):
+            rows[u]["two_node_loop_count"] += 1
+            rows[u]["two_node_loop_amount"] += amount(u, v) + amount(v, u)
+            rows[u]["two_node_loop_tx_count"] += count(u, v) + count(v, u)
+    for u, w in G.edges:
+        for v in G.successors(w):
+            if u < w < v and G.has_edge(v, u):
+                edges = [(u, w), (w, v), (v, u)]
+                for node in (u, w, v):
+                    rows[node]["triangle_loop_count"] += 1
+                    rows[node]["triangle_loop_amount"] += sum(amount(*e) for e in edges)
+                    rows[node]["triangle_loop_tx_count"] += sum(count(*e) for e in edges)
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def reference_egonet_features(G: nx.DiGraph) -> pd.DataFrame:
+    """Egonet node / edge counts and density: ego(v) = v and its filtered in/out neighbors."""
+    rows = {}
+    for v in G.nodes:
+        ego = {v} | set(G.predecessors(v)) | set(G.successors(v))
+        m = sum(1 for a, b in G.subgraph(ego).edges if a != b)
+        n = len(ego)
+        rows[v] = {"egonet_node_count": n, "egonet_edge_count": m,
+                   "egonet_density": m / (n * (n - 1)) if n > 1 else 0.0}
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+@pytest.mark.parametrize("n_jobs", [1, 3])
+@pytest.mark.parametrize("whitelist_hub", [False, True])
+def test_component_units_match_reference(seed, n_jobs, whitelist_hub, monkeypatch):
+    # Small units, so the giant component is split and small components are packed together
+    monkeypatch.setattr(components, "UNIT_MAX_VERTICES", 7)
+    ctx = build_context(component_transfers(seed), {HUB} if whitelist_hub else frozenset())
+    ctx.n_jobs = n_jobs
+    G = to_networkx(ctx)
+
+    plan = components.get_component_plan(ctx)
+    assert plan["trivial"].sum() >= 11 and plan["unit"].max() >= 2
+    assert not plan["trivial"][ctx.skip_mask].any() and (plan["unit"][ctx.skip_mask] == -1).all()
+
+    motif = extract_motif_features(ctx)
+    egonet = extract_egonet_features(ctx)
+
+    nodes = list(G.nodes)
+    for df, expected in ((motif, reference_motif_features(G)), (egonet, reference_egonet_features(G))):
+        for col in expected.columns:
+            np.testing.assert_allclose(df.loc[nodes, col].to_numpy(dtype=float), expected.loc[nodes, col].to_numpy(dtype=float),
+                                       rtol=1e-12, err_msg=col)
+        assert df.loc[ctx.skip_mask].isna().all(axis=None)
+
+
+def test_vertex_subsets_match_full_run(monkeypatch):
+    monkeypatch.setattr(components, "UNIT_MAX_VERTICES", 7)
+    ctx = build_context(component_transfers(0), {HUB})
+    full = extract_egonet_features(ctx)
+
+    parts = [extract_egonet_features(ctx, vids) for vids in np.array_split(np.arange(ctx.n), 5)]
+
+    pd.testing.assert_frame_equal(pd.concat(parts), full)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.detectors.quantile_sketch import KLLSketch, save_sketches, load_sketches, merge_sketches
+
+K = 200
+# Normalized rank error of KLL is ~1.7 / k; allow a 2x margin over that
+RANK_TOLERANCE = 3.4 / K
+QUANTILES = [0.01, 0.25, 0.5, 0.9, 0.99]
+
+
+def rank_error(values: np.ndarray, x: float, q: float) -> float:
+    """Distance of q from the exact rank interval of x (ties span an interval)."""
+    values = np.sort(values)
+    low = np.searchsorted(values, x, side="left") / len(values)
+    high = np.searchsorted(values, x, side="right") / len(values)
+    return max(low - q, q - high, 0.0)
+
+
+@pytest.fixture
+def values():
+    # Heavy-tailed with ties at zero, like the loop amount / count columns
+    rng = np.random.default_rng(7)
+    v = rng.lognormal(10, 3, 300_000)
+    v[rng.random(len(v)) < 0.3] = 0
+    return v
+
+
+def test_exact_below_k():
+    v = np.random.default_rng(0).normal(size=K)
+    sketch = KLLSketch(k=K).update(np.r_[v, np.nan])
+    assert sketch.n == K
+    for q in QUANTILES:
+        assert sketch.quantile(q) == pd.Series(v).quantile(q)
+
+
+def test_rank_error_within_bound(values):
+    sketch = KLLSketch(k=K)
+    for chunk in np.array_split(values, 37):
+        sketch.update(chunk)
+
+    assert sketch.n == len(values)
+    assert sum(len(level) for level in sketch.levels) < 4 * K
+    for q in QUANTILES:
+        assert rank_error(values, sketch.quantile(q), q) <= RANK_TOLERANCE, q
+
+
+def test_merge_and_roundtrip_within_bound(values, tmp_path):
+    parts = []
+    for i, chunk in enumerate(np.array_split(values, 3)):
+        path = tmp_path / f"sketches_{i}.json"
+        save_sketches(str(path), {"amount": KLLSketch(k=K, random_state=i).update(chunk)})
+        parts.append(load_sketches(str(path)))
+
+    merged = merge_sketches(parts)["amount"]
+
+    assert merged.n == len(values)
+    for q in QUANTILES:
+        assert rank_error(values, merged.quantile(q), q) <= RANK_TOLERANCE, q
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.detectors.rule_based_anomaly_detection import (
+    apply_all_rules, compile_rules, describe_rule_flags, rule_catalog, RULE_SPECS
+)
+
+NAN = np.nan
+COLUMNS = [
+    "in_degree", "out_degree", "total_input_amount", "total_output_amount",
+    "two_node_loop_count", "two_node_loop_amount", "two_node_loop_tx_count",
+    "triangle_loop_count", "triangle_loop_amount", "triangle_loop_tx_count",
+]
+THRESHOLDS = {
+    "in_degree": 10, "out_degree": 10,
+    "two_node_loop_amount": 100, "two_node_loop_tx_count": 5,
+    "triangle_loop_amount": 300, "triangle_loop_tx_count": 6,
+}
+
+# (features in COLUMNS order, expected rules)
+CASES = [
+    # H1 exactly at the thresholds: in_degree == q99, out_degree == 3, retention 5 / 100 == 0.05
+    ((10, 3, 100, 95, 0, 0, 0, 0, 0, 0), {"H1"}),
+    # Zero input amount: retention ratio undefined, no H1
+    ((12, 2, 0, 0, 0, 0, 0, 0, 0, 0), set()),
+    # Zero outflow: H2 only (retention 1 is far above 0.05)
+    ((10, 0, 50, 0, 0, 0, 0, 0, 0, 0), {"H2"}),
+    # Single inflow, out_degree at the threshold
+    ((1, 10, 5, 5, 0, 0, 0, 0, 0, 0), {"H3"}),
+    # Both degrees high with 4% retention; out_degree > 3 rules out H1
+    ((20, 15, 1000, 960, 0, 0, 0, 0, 0, 0), {"H4"}),
+    # Missing in_degree: every comparison with NaN is False
+    ((NAN, 0, 50, 0, 0, 0, 0, 0, 0, 0), set()),
+    # Two-node loop through the tx-count threshold (tie)
+    ((0, 0, 0, 0, 1, 10, 5, 0, 0, 0), {"H5"}),
+    # Loop amounts without any loop do not count
+    ((0, 0, 0, 0, 0, 10**9, 99, 0, 10**9, 99), set()),
+    # Both loop rules, through the amount thresholds (ties)
+    ((0, 0, 0, 0, 1, 100, 0, 2, 300, 0), {"H5", "H6"}),
+    # Missing triangle amount: the tx-count branch of the "any" still flags H6
+    ((0, 0, 0, 0, 0, 0, 0, 1, NAN, 6), {"H6"}),
+    # Just below every threshold
+    ((9, 9, 100, 94, 1, 99, 4, 1, 299, 5), set()),
+]
+
+
+def case_frame() -> pd.DataFrame:
+    return pd.DataFrame([features for features, _ in CASES], columns=COLUMNS, dtype=np.float64)
+
+
+def expected_flags() -> pd.DataFrame:
+    return pd.DataFrame(
+        [[int(spec["id"] in rules) for spec in RULE_SPECS] for _, rules in CASES],
+        columns=[f"{spec['id']}_flag" for spec in RULE_SPECS], dtype=np.int8
+    )
+
+
+def test_rule_flags_on_handcrafted_rows():
+    df = apply_all_rules(case_frame(), THRESHOLDS)
+
+    pd.testing.assert_frame_equal(df[expected_flags().columns], expected_flags())
+    packed = sum(df[f"{spec['id']}_flag"].to_numpy(dtype=np.int64) << spec["bit"] for spec in RULE_SPECS)
+    np.testing.assert_array_equal(df["rule_flags"].to_numpy(), packed)
+    assert df["rule_flags"].dtype == np.uint8
+
+
+def test_missing_threshold_flags_nothing():
+    thresholds = {**THRESHOLDS, "in_degree": NAN}
+
+    _, flags = compile_rules()(case_frame(), thresholds)
+
+    assert not flags["H1"].any() and not flags["H2"].any() and not flags["H4"].any()
+    assert flags["H3"].sum() == 1
+
+
+def test_rows_subset_leaves_other_rows_unflagged():
+    rows = np.array([0, 2, 8])
+
+    df = apply_all_rules(case_frame(), THRESHOLDS, rows=rows)
+
+    expected = expected_flags()
+    for col in expected.columns:
+        np.testing.assert_array_equal(df[col].to_numpy()[rows], expected[col].to_numpy()[rows])
+        assert df[col].drop(index=rows).isna().all()
+    assert (df["rule_flags"].drop(index=rows) == 0).all()
+
+
+def test_describe_rule_flags_matches_catalog():
+    df = apply_all_rules(case_frame(), THRESHOLDS)
+    catalog = {r["id"]: r for r in rule_catalog()}
+
+    for flags, (_, rules) in zip(df["rule_flags"], CASES):
+        described = describe_rule_flags(flags)
+        assert [d["rule"] for d in described] == [spec["id"] for spec in RULE_SPECS if spec["id"] in rules]
+        assert all(d["description"] == catalog[d["rule"]]["description"] for d in described)
+    assert [r["bit"] for r in rule_catalog()] == [spec["bit"] for spec in RULE_SPECS]
+
+
+def test_invalid_specs_are_rejected():
+    with pytest.raises(ValueError, match="Duplicate rule bits"):
+        compile_rules(RULE_SPECS + [{**RULE_SPECS[0], "id": "H7"}])
+    with pytest.raises(ValueError, match="unknown comparison"):
+        compile_rules([{**RULE_SPECS[0], "when": [("in_degree", "=>", 1)]}])
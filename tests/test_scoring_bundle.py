@@ -0,0 +1,58 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.run_anomaly_analysis_pipeline import (
+    run_anomaly_analysis_pipeline, get_input_path, get_output_path, load_features
+)
+from analysis.detectors.model_registry import get_registry_dir
+from analysis.scoring.scoring import RULE_FLAG_COLUMNS, score_columns
+from analysis.scoring.scoring_bundle import ScoringBundle, get_bundle_path
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_MONTH = ("ethereum", 2023, 1)
+
+
+@pytest.fixture(scope="module")
+def sample_run(tmp_path_factory):
+    """The analysis pipeline run on a copy of the sample month's feature table."""
+    base_dir = str(tmp_path_factory.mktemp("repo"))
+    source = get_input_path(REPO_ROOT, *SAMPLE_MONTH)
+    target = os.path.join(base_dir, os.path.relpath(source, REPO_ROOT))
+    os.makedirs(os.path.dirname(target))
+    shutil.copy(source, target)
+
+    run_anomaly_analysis_pipeline(*SAMPLE_MONTH, base_dir=base_dir)
+    bundle = ScoringBundle.load(get_bundle_path(base_dir, *SAMPLE_MONTH), get_registry_dir(base_dir, "ethereum"))
+    result = pd.read_parquet(get_output_path(base_dir, *SAMPLE_MONTH).replace(".csv", ".parquet"))
+    return bundle, load_features(target), result
+
+
+def test_score_batch_matches_pipeline(sample_run):
+    bundle, features, result = sample_run
+
+    scored = bundle.score_batch(features)
+
+    assert (scored["address"].to_numpy() == result["address"].to_numpy()).all()
+    np.testing.assert_array_equal(scored["rule_flags"].to_numpy(), result["rule_flags"].to_numpy())
+    numeric = [col for col in RULE_FLAG_COLUMNS + score_columns() if col != "final_score_top_percent_display"]
+    for col in numeric:
+        np.testing.assert_allclose(scored[col].to_numpy(dtype=float), result[col].to_numpy(dtype=float),
+                                   rtol=1e-9, atol=1e-12, err_msg=col)
+    evaluated = result["is_infra"].to_numpy() == 0
+    assert (scored["final_score_top_percent_display"][evaluated] == result["final_score_top_percent_display"][evaluated]).all()
+
+
+def test_score_batch_leaves_infra_unscored(sample_run):
+    bundle, features, _ = sample_run
+    batch = features.iloc[:20].copy()
+    batch["is_infra"] = 1
+
+    scored = bundle.score_batch(batch)
+
+    assert (scored["rule_flags"] == 0).all()
+    assert scored[score_columns()].isna().all(axis=None)
+    pd.testing.assert_frame_equal(batch, features.iloc[:20].assign(is_infra=1))
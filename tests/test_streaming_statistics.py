@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.detectors.streaming_statistics import MomentAccumulator, merge_moments, zscore_covariance
+
+COLUMNS = ["a", "b", "c"]
+
+
+def sample_with_nans(seed: int, n: int = 500) -> np.ndarray:
+    """Correlated, shifted columns (large mean vs. spread) with ~5% NaN per column."""
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(n, len(COLUMNS))) @ rng.normal(size=(len(COLUMNS), len(COLUMNS))) + [1e6, -3.0, 0.0]
+    data[rng.random(data.shape) < 0.05] = np.nan
+    return data
+
+
+def split(data: np.ndarray, seed: int) -> list[np.ndarray]:
+    """Uneven consecutive parts, including an empty one and a single row."""
+    rng = np.random.default_rng(seed)
+    cuts = np.sort(rng.choice(np.arange(2, len(data) - 1), size=4, replace=False))
+    return np.split(data, [0, 1, *cuts])
+
+
+def assert_matches_full_data(moments: MomentAccumulator, data: np.ndarray):
+    frame = pd.DataFrame(data, columns=COLUMNS)
+    complete = data[~np.isnan(data).any(axis=1)]
+
+    np.testing.assert_array_equal(moments.col_count, frame.count().to_numpy())
+    np.testing.assert_allclose(moments.col_mean, frame.mean().to_numpy(), rtol=1e-12)
+    np.testing.assert_allclose(moments.column_std(), frame.std().to_numpy(), rtol=1e-10)
+    assert moments.count == len(complete)
+    np.testing.assert_allclose(moments.mean, complete.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(moments.covariance(), np.cov(complete, rowvar=False), rtol=1e-8)
+
+
+def test_chunked_updates_match_full_data(seed):
+    data = sample_with_nans(seed)
+    moments = MomentAccumulator(COLUMNS)
+
+    for part in split(data, seed):
+        moments.update(part)
+
+    assert_matches_full_data(moments, data)
+
+
+def test_merged_parts_match_full_data(seed, tmp_path):
+    data = sample_with_nans(seed)
+    parts = [MomentAccumulator.from_array(COLUMNS, part) for part in split(data, seed)]
+    assert parts[0].count == 0 and parts[0].col_count.sum() == 0
+
+    # Parts go through a save / load round trip, like per-month moments of a window
+    for i, part in enumerate(parts):
+        part.save(str(tmp_path / f"part_{i}.json"))
+    loaded = [MomentAccumulator.load(str(tmp_path / f"part_{i}.json")) for i in range(len(parts))]
+
+    assert_matches_full_data(merge_moments(loaded), data)
+    assert_matches_full_data(merge_moments(loaded[::-1]), data)
+
+
+def test_zscore_covariance_matches_zscored_data(seed):
+    data = sample_with_nans(seed)
+    moments = merge_moments([MomentAccumulator.from_array(COLUMNS, part) for part in split(data, seed)])
+
+    _, _, z_mean, z_cov = zscore_covariance(moments)
+
+    frame = pd.DataFrame(data, columns=COLUMNS)
+    z = ((frame - frame.mean()) / frame.std()).to_numpy()
+    complete = z[~np.isnan(z).any(axis=1)]
+    np.testing.assert_allclose(z_mean, complete.mean(axis=0), atol=1e-12)
+    np.testing.assert_allclose(z_cov, np.cov(complete, rowvar=False), rtol=1e-8)
+
+
+def test_all_nan_and_single_value_columns():
+    data = np.array([[1.0, np.nan, 5.0], [2.0, np.nan, np.nan], [4.0, np.nan, np.nan]])
+
+    moments = merge_moments([MomentAccumulator.from_array(COLUMNS, data[:1]),
+                             MomentAccumulator.from_array(COLUMNS, data[1:])])
+
+    np.testing.assert_array_equal(moments.col_count, [3, 0, 1])
+    np.testing.assert_allclose(moments.col_mean[[0, 2]], [7 / 3, 5.0])
+    assert np.isnan(moments.column_std()[1:]).all()
+    assert moments.count == 0 and np.isnan(moments.covariance()).all()
+
+
+def test_merge_rejects_other_columns():
+    with pytest.raises(ValueError, match="different columns"):
+        MomentAccumulator(COLUMNS).merge(MomentAccumulator(COLUMNS[::-1]))
+    with pytest.raises(ValueError, match="No moments"):
+        merge_moments([])
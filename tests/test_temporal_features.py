@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from conftest import random_transfers, build_context
+from graph.feature import extract_temporal_features as temporal
+
+
+def reference_temporal_stats(transfers: pd.DataFrame, whitelist: set[str]) -> pd.DataFrame:
+    """Per-address temporal statistics by a plain pandas groupby over sender + receiver events."""
+    events = pd.concat([
+        transfers[["from_address_sid", "timestamp"]].set_axis(["sid", "ts"], axis=1),
+        transfers[["to_address_sid", "timestamp"]].set_axis(["sid", "ts"], axis=1),
+    ])
+    events = events[~events["sid"].str.split("_").str[1].isin(whitelist)].sort_values(["sid", "ts"])
+
+    rows = {}
+    for sid, ts in events.groupby("sid")["ts"]:
+        ts = ts.to_numpy()
+        gaps = np.diff(ts).astype(np.float64)
+        row = {
+            "first_activity_timestamp": ts.min(),
+            "last_activity_timestamp": ts.max(),
+            "active_day_count": len(np.unique(ts // 86400)),
+            "max_transfers_per_hour": np.unique(ts // 3600, return_counts=True)[1].max(),
+        }
+        if len(gaps):
+            mean, std = gaps.mean(), gaps.std()
+            row.update({
+                "interarrival_mean_sec": mean,
+                "interarrival_std_sec": std,
+                "interarrival_min_sec": gaps.min(),
+                "burstiness": (std - mean) / (std + mean) if std + mean > 0 else 0.0,
+            })
+        rows[sid] = row
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def test_temporal_stats_match_groupby(seed, tmp_path):
+    transfers = random_transfers(seed, n_accounts=40, n_transfers=600, n_days=5)
+    whitelist = {transfers["from_address_sid"].iloc[0].split("_")[1]}
+    ctx = build_context(transfers, whitelist)
+    edgelist_path = tmp_path / "edgelist.parquet"
+    transfers[["from_address_sid", "to_address_sid", "timestamp"]].to_parquet(edgelist_path)
+
+    # A tiny memory budget splits the vertices over many spill buckets
+    stats = temporal.compute_temporal_stats(ctx, str(edgelist_path), memory_budget=temporal.BYTES_PER_EVENT * 50)
+
+    expected = reference_temporal_stats(transfers, whitelist)
+    names = np.array(ctx.g.vs["name"])
+    for col in temporal.TEMPORAL_FEATURE_SCHEMA:
+        actual = pd.Series(stats[col], index=names)
+        np.testing.assert_allclose(
+            actual.reindex(expected.index).to_numpy(dtype=float), expected[col].to_numpy(dtype=float),
+            rtol=1e-9, err_msg=col
+        )
+        assert actual[ctx.skip_mask].isna().all()